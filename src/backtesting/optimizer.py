@@ -0,0 +1,205 @@
+import itertools
+import json
+import logging
+import multiprocessing
+import os
+import random
+from multiprocessing import shared_memory
+from typing import Dict, List, Optional, Union
+
+import numpy as np
+
+from backtesting.vectorized import CANDLE_COLUMNS, candles_to_arrays, run_backtest
+from helpers.Strategies import Strategies
+
+logger = logging.getLogger()
+
+STRATEGY_PARAMS = {
+    Strategies.technical: ("rsi_length", "ema_fast", "ema_slow", "ema_signal"),
+    Strategies.breakout: ("min_volume",),
+}
+BASE_PARAMS = ("take_profit", "stop_loss")
+
+LOWER_IS_BETTER = {"max_drawdown_pct"}
+
+_worker_memory: Optional[shared_memory.SharedMemory] = None
+_worker_candles: Dict[str, np.ndarray] = dict()
+_worker_settings: Dict = dict()
+
+
+def _init_worker(memory_name: str, length: int, settings: Dict):
+    global _worker_memory
+
+    # The candles are only mapped, every worker reads the same block of memory
+    _worker_memory = shared_memory.SharedMemory(name=memory_name)
+    block = np.ndarray((len(CANDLE_COLUMNS), length), dtype=np.float64, buffer=_worker_memory.buf)
+
+    for row, column in enumerate(CANDLE_COLUMNS):
+        _worker_candles[column] = block[row].astype(np.int64) if column == "timestamp" else block[row]
+
+    _worker_settings.update(settings)
+
+
+def _run_combination(params: Dict) -> Dict:
+    other_params = {k: v for k, v in params.items() if k not in BASE_PARAMS}
+
+    result = run_backtest(
+        Strategies(_worker_settings["strategy"]),
+        _worker_candles,
+        params.get("take_profit"),
+        params.get("stop_loss"),
+        other_params,
+        balance_pct=_worker_settings["balance_pct"],
+        initial_balance=_worker_settings["initial_balance"],
+        fee_pct=_worker_settings["fee_pct"],
+    )
+
+    return {"params": params, "metrics": result.metrics}
+
+
+def _check_param_space(strategy: Strategies, param_space: Dict[str, List]):
+    accepted = set(STRATEGY_PARAMS[strategy]) | set(BASE_PARAMS)
+
+    unknown = set(param_space) - accepted
+    if len(unknown) > 0:
+        raise ValueError(f"Unknown parameters for {strategy.value} strategy: {sorted(unknown)}")
+
+    missing = set(STRATEGY_PARAMS[strategy]) - set(param_space)
+    if len(missing) > 0:
+        raise ValueError(f"Missing parameters for {strategy.value} strategy: {sorted(missing)}")
+
+
+def _native_param_space(param_space: Dict[str, List]) -> Dict[str, List]:
+    # Values from numpy ranges are numpy scalars, json can't write them to the results file
+    return {
+        name: [v.item() if isinstance(v, np.generic) else v for v in values] for name, values in param_space.items()
+    }
+
+
+def grid_combinations(param_space: Dict[str, List]) -> List[Dict]:
+    names = sorted(param_space)
+    return [dict(zip(names, values)) for values in itertools.product(*(param_space[n] for n in names))]
+
+
+def random_combinations(param_space: Dict[str, List], n_iter: int, seed: int = 0) -> List[Dict]:
+    names = sorted(param_space)
+    sizes = [len(param_space[n]) for n in names]
+    total = int(np.prod(sizes))
+
+    # Combinations are drawn as indexes in the grid so large spaces are never materialized, a fixed seed
+    # keeps the same draw across runs which is what makes a sweep resumable
+    rng = random.Random(seed)
+    indexes = rng.sample(range(total), min(n_iter, total))
+
+    combinations = []
+    for index in indexes:
+        combination = dict()
+        for name, size in zip(reversed(names), reversed(sizes)):
+            index, position = divmod(index, size)
+            combination[name] = param_space[name][position]
+        combinations.append({n: combination[n] for n in names})
+
+    return combinations
+
+
+def rank_results(results: List[Dict], sort_by: Union[str, List[str]] = "total_pnl") -> List[Dict]:
+    if isinstance(sort_by, str):
+        sort_by = [sort_by]
+
+    def sort_key(result: Dict):
+        key = []
+        for metric in sort_by:
+            value = result["metrics"][metric]
+            key.append(value if metric in LOWER_IS_BETTER else -value)
+        return key
+
+    return sorted(results, key=sort_key)
+
+
+def _combination_key(params: Dict) -> str:
+    return json.dumps(params, sort_keys=True)
+
+
+def _load_results(results_path: str) -> List[Dict]:
+    results = []
+    if results_path is None or not os.path.exists(results_path):
+        return results
+
+    with open(results_path) as f:
+        for line in f:
+            # A sweep killed mid-write can leave a truncated last line behind
+            try:
+                results.append(json.loads(line))
+            except json.JSONDecodeError:
+                logger.warning("Ignoring corrupted line in %s", results_path)
+
+    return results
+
+
+def optimize(
+    strategy: Strategies,
+    candles: Union[List, Dict[str, np.ndarray]],
+    param_space: Dict[str, List],
+    sort_by: Union[str, List[str]] = "total_pnl",
+    n_iter: Optional[int] = None,
+    seed: int = 0,
+    processes: Optional[int] = None,
+    results_path: Optional[str] = None,
+    balance_pct: float = 100,
+    initial_balance: float = 1000,
+    fee_pct: float = 0,
+) -> List[Dict]:
+    _check_param_space(strategy, param_space)
+    param_space = _native_param_space(param_space)
+
+    if isinstance(candles, list):
+        candles = candles_to_arrays(candles)
+
+    if n_iter is None:
+        combinations = grid_combinations(param_space)
+    else:
+        combinations = random_combinations(param_space, n_iter, seed)
+
+    # Only results of the current parameter space are kept, the file may come from a wider sweep
+    wanted = {_combination_key(c) for c in combinations}
+    results = [r for r in _load_results(results_path) if _combination_key(r["params"]) in wanted]
+    done = {_combination_key(r["params"]) for r in results}
+    pending = [c for c in combinations if _combination_key(c) not in done]
+
+    logger.info("%s optimization: %s combinations, %s already computed", strategy.value, len(combinations), len(done))
+
+    if len(pending) > 0:
+        length = len(candles["close"])
+        memory = shared_memory.SharedMemory(create=True, size=len(CANDLE_COLUMNS) * length * 8)
+
+        block = np.ndarray((len(CANDLE_COLUMNS), length), dtype=np.float64, buffer=memory.buf)
+        for row, column in enumerate(CANDLE_COLUMNS):
+            block[row] = candles[column]
+        del block
+
+        try:
+            settings = {
+                "strategy": strategy.value,
+                "balance_pct": balance_pct,
+                "initial_balance": initial_balance,
+                "fee_pct": fee_pct,
+            }
+
+            results_file = open(results_path, "a") if results_path is not None else None
+            try:
+                with multiprocessing.Pool(
+                    processes=processes, initializer=_init_worker, initargs=(memory.name, length, settings)
+                ) as pool:
+                    for result in pool.imap_unordered(_run_combination, pending):
+                        results.append(result)
+                        if results_file is not None:
+                            results_file.write(json.dumps(result) + "\n")
+                            results_file.flush()
+            finally:
+                if results_file is not None:
+                    results_file.close()
+        finally:
+            memory.close()
+            memory.unlink()
+
+    return rank_results(results, sort_by)
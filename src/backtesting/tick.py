@@ -0,0 +1,423 @@
+import collections
+import itertools
+import logging
+from typing import Any, Deque, Dict, Iterable, Iterator, List, Optional, Tuple, Union
+
+import numpy as np
+import pandas as pd
+
+from backtesting.vectorized import BacktestResult
+from connectors.binance_futures import BinanceFuturesClient
+from connectors.bitmex import BitmexClient
+from constants import BACKTEST_TRADES_CHUNK_SIZE, BACKTEST_WARMUP_CANDLES
+from helpers.clock import SimulatedClock
+from helpers.Exchange import Exchange
+from helpers.Strategies import Strategies
+from mock_exchange.matching import MARKET, STOP_MARKET, TAKE_PROFIT_MARKET, MatchingEngine, MockOrder, OrderRejected
+from models.Balance import Balance, BITMEX_MULTIPLIER
+from models.Candle import Candle
+from models.Contract import Contract
+from models.OrderStatus import OrderStatus
+from strategies.BreakoutStrategy import BreakoutStrategy
+from strategies.TechnicalStrategy import TechnicalStrategy
+
+logger = logging.getLogger()
+
+# (timestamps in ms, prices, sizes)
+TradeChunk = Tuple[np.ndarray, np.ndarray, np.ndarray]
+
+# Timestamp, price and quantity columns of the Binance aggTrades dumps
+AGG_TRADES_COLUMNS = (5, 1, 2)
+
+STRATEGY_CLASSES = {Strategies.technical: TechnicalStrategy, Strategies.breakout: BreakoutStrategy}
+EXCHANGE_NAMES = {Exchange.binance: "Binance", Exchange.bitmex: "Bitmex"}
+BALANCE_ASSETS = {Exchange.binance: "USDT", Exchange.bitmex: "XBt"}
+
+# The trade sizes are computed by the connector code itself, so the quantities are the live ones
+TRADE_SIZES = {Exchange.binance: BinanceFuturesClient.get_trade_size, Exchange.bitmex: BitmexClient.get_trade_size}
+
+EXIT_REASONS = {TAKE_PROFIT_MARKET: "take_profit", STOP_MARKET: "stop_loss", MARKET: "market"}
+
+
+def trade_chunks(
+    timestamps: np.ndarray, prices: np.ndarray, sizes: np.ndarray, chunk_size: int = BACKTEST_TRADES_CHUNK_SIZE
+) -> Iterator[TradeChunk]:
+    for start in range(0, len(timestamps), chunk_size):
+        end = start + chunk_size
+        yield timestamps[start:end], prices[start:end], sizes[start:end]
+
+
+def read_trades_csv(
+    path: str, columns: Tuple[int, int, int] = AGG_TRADES_COLUMNS, chunk_size: int = BACKTEST_TRADES_CHUNK_SIZE
+) -> Iterator[TradeChunk]:
+    # The file is streamed, tens of millions of trades never have to fit in memory at once. Compressed files are
+    # read as they are, the header line of the recent dumps is skipped
+    first_row = pd.read_csv(path, header=None, nrows=1)
+    has_header = not pd.api.types.is_number(first_row.iloc[0, columns[0]])
+
+    reader = pd.read_csv(
+        path, header=None, skiprows=1 if has_header else 0, usecols=list(columns), chunksize=chunk_size
+    )
+    for chunk in reader:
+        yield (
+            chunk[columns[0]].to_numpy(dtype=np.int64),
+            chunk[columns[1]].to_numpy(dtype=np.float64),
+            chunk[columns[2]].to_numpy(dtype=np.float64),
+        )
+
+
+class BacktestClient:
+    def __init__(
+        self,
+        contracts: Dict[str, Contract],
+        initial_balance: float,
+        fee_pct: float = 0,
+        slippage_pct: float = 0,
+        latency: float = 0.0,
+        clock: Optional[SimulatedClock] = None,
+    ):
+        # Stands in for a connector: orders go to the matching engine of the mock exchange, the fills are pushed to
+        # the strategies like the private streams do. Orders and cancels reach the engine `latency` seconds after
+        # they were sent, market orders are then filled at the first trade from that time
+        self.contracts = contracts
+        self.exchange = next(iter(contracts.values())).exchange
+        self.clock = clock if clock is not None else SimulatedClock()
+        self.latency = latency
+
+        self.engine = MatchingEngine(
+            initial_balance,
+            self._pnl,
+            self._notional,
+            fee_pct / 100,
+            on_order=self._on_order,
+            on_fill=self._on_fill,
+            slippage=slippage_pct / 100,
+        )
+
+        self.private_ws_connected = True
+        self.balances: Dict[str, Balance] = dict()
+        self.get_balances()
+
+        self.strategies: Dict[int, Union[TechnicalStrategy, BreakoutStrategy]] = dict()
+        self._symbol_strategies: Dict[str, Tuple[Union[TechnicalStrategy, BreakoutStrategy], ...]] = dict()
+        self.logs = []
+
+        self._order_ids = itertools.count(1)
+        # Orders sent but not at the engine yet: symbol and scheduled submit
+        self._in_flight: Dict[int, Tuple[str, Any]] = dict()
+        self._rejected: Dict[int, str] = dict()
+
+        # Order updates are delivered before the next trade, never from inside a strategy call, like the
+        # private stream messages that are processed on their own
+        self._updates: Deque[Tuple[str, OrderStatus]] = collections.deque()
+
+        # Round trips of the positions, closed ones and the one open on every symbol
+        self.trades: List[Dict] = []
+        self._open_trades: Dict[str, Dict] = dict()
+        self._settled_balance = initial_balance
+        self._exit_reason: Optional[str] = None
+
+    def _pnl(self, symbol: str, quantity: float, entry: float, exit_price: float) -> float:
+        contract = self.contracts[symbol]
+        if self.exchange == Exchange.bitmex and contract.inverse:
+            return quantity * contract.multiplier * (1 / entry - 1 / exit_price)
+        elif self.exchange == Exchange.bitmex:
+            return quantity * contract.multiplier * (exit_price - entry)
+        return quantity * (exit_price - entry)
+
+    def _notional(self, symbol: str, quantity: float, price: float) -> float:
+        contract = self.contracts[symbol]
+        if self.exchange == Exchange.bitmex and contract.inverse:
+            return abs(quantity * contract.multiplier / price)
+        elif self.exchange == Exchange.bitmex:
+            return abs(quantity * contract.multiplier * price)
+        return abs(quantity * price)
+
+    def add_strategy(self, b_index: int, strategy: Union[TechnicalStrategy, BreakoutStrategy]):
+        self.strategies[b_index] = strategy
+        symbol = strategy.contract.symbol
+        self._symbol_strategies[symbol] = tuple(s for s in self.strategies.values() if s.contract.symbol == symbol)
+
+    def get_balances(self) -> Dict[str, Balance]:
+        balance = self.engine.balance
+        unrealized_pnl = self.engine.unrealized_pnl()
+
+        if self.exchange == Exchange.binance:
+            info = {
+                "initialMargin": 0,
+                "maintMargin": 0,
+                "marginBalance": balance + unrealized_pnl,
+                "walletBalance": balance,
+                "unrealizedProfit": unrealized_pnl,
+            }
+        else:
+            info = {
+                "initMargin": 0,
+                "maintMargin": 0,
+                "marginBalance": (balance + unrealized_pnl) / BITMEX_MULTIPLIER,
+                "walletBalance": balance / BITMEX_MULTIPLIER,
+                "unrealisedPnl": unrealized_pnl / BITMEX_MULTIPLIER,
+            }
+
+        self.balances = {BALANCE_ASSETS[self.exchange]: Balance(info, self.exchange)}
+        return self.balances
+
+    def get_trade_size(self, contract: Contract, price: float, balance_pct: float):
+        return TRADE_SIZES[self.exchange](self, contract, price, balance_pct)
+
+    def _order_status(self, order_id: int, status: str, avg_price: float) -> OrderStatus:
+        if self.exchange == Exchange.binance:
+            return OrderStatus({"orderId": order_id, "status": status, "avgPrice": avg_price}, Exchange.binance)
+        return OrderStatus({"orderID": order_id, "ordStatus": status, "avgPx": avg_price}, Exchange.bitmex)
+
+    def place_order(
+        self,
+        contract: Contract,
+        order_type: str,
+        quantity: float,
+        side: str,
+        price=None,
+        time_in_force=None,
+        stop_price=None,
+        reduce_only: bool = False,
+    ) -> Optional[OrderStatus]:
+        # Rounded like the connectors round them before sending the order
+        quantity = round(round(quantity / contract.lot_size) * contract.lot_size, 8)
+        if price is not None:
+            price = round(round(price / contract.tick_size) * contract.tick_size, 8)
+        if stop_price is not None:
+            stop_price = round(round(stop_price / contract.tick_size) * contract.tick_size, 8)
+
+        order_id = next(self._order_ids)
+        order = (contract.symbol, side.lower(), order_type, quantity, price, stop_price, reduce_only, order_id)
+
+        if self.latency <= 0:
+            if not self._submit(*order):
+                # Rejected synchronously, the connectors return None when the exchange answers with an error
+                return None
+            submitted = self.engine.orders[order_id]
+            return self._order_status(order_id, submitted.status, submitted.avg_price)
+
+        call = self.clock.call_later(self.latency, lambda: self._submit(*order))
+        self._in_flight[order_id] = (contract.symbol, call)
+        return self._order_status(order_id, "new", 0.0)
+
+    def _submit(
+        self,
+        symbol: str,
+        side: str,
+        order_type: str,
+        quantity: float,
+        price: Optional[float],
+        stop_price: Optional[float],
+        reduce_only: bool,
+        order_id: int,
+    ) -> bool:
+        self._in_flight.pop(order_id, None)
+        try:
+            self.engine.submit(
+                symbol, side, order_type, quantity, self.clock.time_ms(), price, stop_price, reduce_only, order_id
+            )
+            return True
+        except OrderRejected as e:
+            logger.info("Backtest order %s %s %s rejected: %s", order_id, side, order_type, e)
+            self._rejected[order_id] = symbol
+            if self.latency > 0:
+                self._updates.append((symbol, self._order_status(order_id, "rejected", 0.0)))
+            return False
+
+    def cancel_order(self, contract: Contract, order_id: int) -> Optional[OrderStatus]:
+        if self.latency <= 0:
+            order = self._cancel(order_id)
+        else:
+            # Sent after the order itself, so it always reaches the engine once the order is there
+            self.clock.call_later(self.latency, lambda: self._cancel(order_id))
+            order = self.engine.orders.get(order_id)
+
+        if order is None:
+            return None
+        return self._order_status(order_id, order.status, order.avg_price)
+
+    def _cancel(self, order_id: int) -> Optional[MockOrder]:
+        return self.engine.cancel(order_id, self.clock.time_ms())
+
+    def get_order_status(self, contract: Contract, order_id: int) -> Optional[OrderStatus]:
+        order = self.engine.orders.get(order_id)
+        if order is not None:
+            return self._order_status(order_id, order.status, order.avg_price)
+        if order_id in self._in_flight:
+            return self._order_status(order_id, "new", 0.0)
+        if order_id in self._rejected:
+            return self._order_status(order_id, "rejected", 0.0)
+        return None
+
+    def _on_order(self, order: MockOrder):
+        self._updates.append((order.symbol, self._order_status(order.order_id, order.status, order.avg_price)))
+
+    def _on_fill(self, order: MockOrder, quantity: float, price: float):
+        position = self.engine.positions[order.symbol].quantity
+        trade = self._open_trades.get(order.symbol)
+
+        if trade is not None and (position == 0 or (position > 0) != (trade["side"] == "long")):
+            # When the position is flipped, the fees of the whole fill are put on the closed trade
+            pnl = self.engine.balance - trade["balance"]
+
+            self.trades.append(
+                {
+                    "entry_time": trade["entry_time"],
+                    "exit_time": order.update_time,
+                    "side": trade["side"],
+                    "entry_price": trade["entry_price"],
+                    "exit_price": price,
+                    "quantity": trade["quantity"],
+                    "pnl": pnl,
+                    "return_pct": pnl / trade["balance"] * 100,
+                    "exit_reason": self._exit_reason or EXIT_REASONS.get(order.order_type, "market"),
+                }
+            )
+            self._open_trades.pop(order.symbol)
+            self._settled_balance = self.engine.balance
+            trade = None
+
+        if position != 0:
+            if trade is None:
+                self._open_trades[order.symbol] = {
+                    "entry_time": order.update_time,
+                    "side": "long" if position > 0 else "short",
+                    "entry_price": price,
+                    "quantity": abs(position),
+                    "balance": self._settled_balance,
+                }
+            else:
+                trade["entry_price"] = self.engine.positions[order.symbol].entry_price
+                trade["quantity"] = abs(position)
+
+        self._settled_balance = self.engine.balance
+        self.get_balances()
+
+    def process_trade(self, symbol: str, price: float, size: float, timestamp: int, check: bool = True):
+        # The exchange sees the trade first: resting orders are triggered, then the orders and cancels due by
+        # then arrive, market ones being filled at this price
+        self.engine.update_trade(symbol, price, timestamp)
+        self.clock.advance(timestamp / 1000)
+
+        updates = self._updates
+        while updates:
+            update_symbol, order_status = updates.popleft()
+            for strategy in self._symbol_strategies.get(update_symbol, ()):
+                strategy.on_order_update(order_status)
+
+        # Same path as the connectors' trade messages
+        for strategy in self._symbol_strategies.get(symbol, ()):
+            res = strategy.parse_trades(price, size, timestamp)
+            if check:
+                strategy.check_trade(res)
+
+    def close_positions(self, timestamp: int) -> List[int]:
+        # Orders sent less than the latency before the end of the data never reach the engine, they are canceled
+        # and their ids returned so that the result can report them
+        canceled = list(self._in_flight)
+        for _, call in self._in_flight.values():
+            call.cancel()
+        self._in_flight.clear()
+
+        # Whatever is still open at the end of the data is closed at the last price, like the vectorized backtest
+        self._exit_reason = "end_of_data"
+        for symbol, position in list(self.engine.positions.items()):
+            if position.quantity != 0:
+                side = "sell" if position.quantity > 0 else "buy"
+                self.engine.submit(
+                    symbol,
+                    side,
+                    MARKET,
+                    abs(position.quantity),
+                    timestamp,
+                    reduce_only=True,
+                    order_id=next(self._order_ids),
+                )
+        self._exit_reason = None
+
+        return canceled
+
+
+def run_tick_backtest(
+    strategy: Strategies,
+    contract: Contract,
+    timeframe: str,
+    trades: Iterable[TradeChunk],
+    take_profit: Optional[float],
+    stop_loss: Optional[float],
+    other_params: Dict,
+    balance_pct: float = 100,
+    initial_balance: float = 1000,
+    fee_pct: float = 0,
+    slippage_pct: float = 0,
+    latency: float = 0.0,
+    history: Optional[List[Candle]] = None,
+    warmup_candles: int = BACKTEST_WARMUP_CANDLES,
+) -> BacktestResult:
+    # The live strategy classes run unmodified on the trades, on a simulated clock. The first `warmup_candles`
+    # candles (counting the given history) are only built, no position is opened on them. Balances are in USDT
+    # for Binance and XBT for Bitmex
+    if strategy not in STRATEGY_CLASSES:
+        raise ValueError(f"Accepted strategies are {Strategies.all()}")
+
+    client = BacktestClient({contract.symbol: contract}, initial_balance, fee_pct, slippage_pct, latency)
+    live_strategy = STRATEGY_CLASSES[strategy](
+        client,
+        contract,
+        EXCHANGE_NAMES[contract.exchange],
+        timeframe,
+        balance_pct,
+        take_profit,
+        stop_loss,
+        other_params,
+    )
+    if history is not None:
+        live_strategy.candles.extend(history)
+    client.add_strategy(0, live_strategy)
+
+    symbol = contract.symbol
+    candles = live_strategy.candles
+    process_trade = client.process_trade
+
+    count = 0
+    timestamp = None
+    notes = []
+    warm = len(candles) > warmup_candles
+
+    for timestamps, prices, sizes in trades:
+        if len(timestamps) == 0:
+            continue
+
+        if len(candles) == 0:
+            # Without history, the first candle is opened by the first trade
+            first = int(timestamps[0])
+            open_time = first - first % live_strategy.tf_equiv
+            candles.append(open_time, float(prices[0]), float(prices[0]), float(prices[0]), float(prices[0]), 0)
+
+        for timestamp, price, size in zip(timestamps.tolist(), prices.tolist(), sizes.tolist()):
+            process_trade(symbol, price, size, timestamp, warm)
+            if not warm:
+                warm = len(candles) > warmup_candles
+
+        count += len(timestamps)
+
+    if timestamp is not None:
+        canceled = client.close_positions(timestamp)
+        if len(canceled) > 0:
+            notes.append(f"Orders {canceled} were still in flight at the end of the data and were canceled")
+            logger.warning("Tick backtest: %s", notes[-1])
+
+    pnl = np.array([t["pnl"] for t in client.trades], dtype=np.float64)
+    equity_curve = initial_balance + np.concatenate(([0.0], np.cumsum(pnl)))
+
+    logger.info(
+        "%s tick backtest over %s trades: %s trades, PnL %s",
+        strategy.value,
+        count,
+        len(client.trades),
+        client.engine.balance - initial_balance,
+    )
+
+    return BacktestResult(client.trades, equity_curve, initial_balance, notes)
@@ -0,0 +1,259 @@
+import logging
+from typing import Dict, List, Optional, Tuple, Union
+
+import numpy as np
+import pandas as pd
+
+from helpers.Strategies import Strategies
+from models.Candle import Candle
+
+logger = logging.getLogger()
+
+CANDLE_COLUMNS = ("timestamp", "open", "high", "low", "close", "volume")
+
+# What candles can't tell, reported with every result
+CANDLE_ASSUMPTIONS = [
+    "When the take profit and the stop loss are both within the range of a candle, the stop loss is assumed hit first",
+    "Breakout entries are taken on the candles closing past the previous high (low), filled at that level or at the"
+    " open, and their take profit and stop loss are only checked from the next candle",
+    "The equity curve marks the open positions at the candle closes, lower prices reached within a candle are not"
+    " counted in the drawdown",
+]
+
+
+def candles_to_arrays(candles: List[Candle]) -> Dict[str, np.ndarray]:
+    arrays = dict()
+    for column in CANDLE_COLUMNS:
+        dtype = np.int64 if column == "timestamp" else np.float64
+        arrays[column] = np.fromiter((getattr(c, column) for c in candles), dtype=dtype, count=len(candles))
+
+    return arrays
+
+
+def technical_signals(closes: np.ndarray, ema_fast: int, ema_slow: int, ema_signal: int, rsi_length: int) -> np.ndarray:
+    closes = pd.Series(closes)
+
+    delta = closes.diff()
+    up = delta.clip(lower=0)
+    down = (-delta).clip(lower=0)
+
+    avg_gain = up.iloc[1:].ewm(com=(rsi_length - 1), min_periods=rsi_length).mean()
+    avg_loss = down.iloc[1:].ewm(com=(rsi_length - 1), min_periods=rsi_length).mean()
+
+    rsi = (100 - 100 / (1 + avg_gain / avg_loss)).round(2).reindex(closes.index)
+
+    macd_line = closes.ewm(span=ema_fast).mean() - closes.ewm(span=ema_slow).mean()
+    macd_signal = macd_line.ewm(span=ema_signal).mean()
+
+    rsi = rsi.to_numpy()
+    macd_line = macd_line.to_numpy()
+    macd_signal = macd_signal.to_numpy()
+
+    signals = np.zeros(len(closes), dtype=np.int8)
+    signals[(rsi < 30) & (macd_line > macd_signal)] = 1
+    signals[(rsi > 70) & (macd_line < macd_signal)] = -1
+
+    return signals
+
+
+def breakout_signals(
+    highs: np.ndarray, lows: np.ndarray, closes: np.ndarray, volumes: np.ndarray, min_volume: float
+) -> np.ndarray:
+    signals = np.zeros(len(closes), dtype=np.int8)
+
+    enough_volume = volumes[1:] > min_volume
+    signals[1:][(closes[1:] > highs[:-1]) & enough_volume] = 1
+    signals[1:][(closes[1:] < lows[:-1]) & enough_volume] = -1
+
+    return signals
+
+
+def _entries(strategy: Strategies, candles: Dict[str, np.ndarray], other_params: Dict) -> Tuple[np.ndarray, ...]:
+    if strategy == Strategies.technical:
+        signals = technical_signals(
+            candles["close"],
+            other_params["ema_fast"],
+            other_params["ema_slow"],
+            other_params["ema_signal"],
+            other_params["rsi_length"],
+        )
+
+        # Live, the signal is computed on the candle that just closed when the first trade of the next one
+        # arrives, so the position is opened at the next candle open
+        signal_index = np.flatnonzero(signals[:-1])
+        entry_index = signal_index + 1
+        entry_price = candles["open"][entry_index]
+        first_exit_index = entry_index
+
+    elif strategy == Strategies.breakout:
+        signals = breakout_signals(
+            candles["high"], candles["low"], candles["close"], candles["volume"], other_params["min_volume"]
+        )
+
+        # Live, the breakout is checked on every trade of the running candle, so the position is opened as soon as
+        # the previous high (low) is crossed: at that level, or at the open when the candle gaps past it. The close
+        # of the candle would only be known at its end
+        signal_index = np.flatnonzero(signals)
+        entry_index = signal_index
+        previous_high = candles["high"][entry_index - 1]
+        previous_low = candles["low"][entry_index - 1]
+        opens = candles["open"][entry_index]
+        entry_price = np.where(
+            signals[signal_index] == 1, np.maximum(opens, previous_high), np.minimum(opens, previous_low)
+        )
+        first_exit_index = entry_index + 1
+
+    else:
+        raise ValueError(f"Accepted strategies are {Strategies.all()}")
+
+    return entry_index, signals[signal_index].astype(np.int64), entry_price, first_exit_index
+
+
+def _find_exit(
+    highs: np.ndarray, lows: np.ndarray, start: int, side: int, tp_price: float, sl_price: float
+) -> Tuple[Optional[int], float, str]:
+    chunk = 256
+    while start < len(highs):
+        h = highs[start : start + chunk]
+        lo = lows[start : start + chunk]
+
+        if side == 1:
+            sl_hit = lo <= sl_price
+            tp_hit = h >= tp_price
+        else:
+            sl_hit = h >= sl_price
+            tp_hit = lo <= tp_price
+
+        hit = sl_hit | tp_hit
+        if hit.any():
+            j = int(hit.argmax())
+            # Candles don't tell which level was crossed first, assume the stop loss
+            if sl_hit[j]:
+                return start + j, sl_price, "stop_loss"
+            return start + j, tp_price, "take_profit"
+
+        start += chunk
+        chunk *= 2
+
+    return None, np.nan, "end_of_data"
+
+
+class BacktestResult:
+    def __init__(
+        self, trades: List[Dict], equity_curve: np.ndarray, initial_balance: float, notes: Optional[List[str]] = None
+    ):
+        # The notes tell what the figures don't account for, e.g. the orders a backtest had to drop
+        self.trades = trades
+        self.equity_curve = equity_curve
+        self.initial_balance = initial_balance
+        self.notes = notes if notes is not None else []
+
+        self.metrics = self._compute_metrics()
+
+    def _compute_metrics(self) -> Dict[str, float]:
+        pnl = np.array([t["pnl"] for t in self.trades], dtype=np.float64)
+        returns = np.array([t["return_pct"] for t in self.trades], dtype=np.float64)
+
+        peak = np.maximum.accumulate(self.equity_curve) if len(self.equity_curve) > 0 else np.array([])
+        drawdown = (peak - self.equity_curve) / peak if len(peak) > 0 else np.array([0.0])
+
+        gross_profit = pnl[pnl > 0].sum()
+        gross_loss = -pnl[pnl < 0].sum()
+
+        return {
+            "trades": len(self.trades),
+            "total_pnl": float(pnl.sum()),
+            "return_pct": float(pnl.sum() / self.initial_balance * 100),
+            "win_rate": float((pnl > 0).mean() * 100) if len(pnl) > 0 else 0.0,
+            "profit_factor": float(gross_profit / gross_loss) if gross_loss > 0 else np.inf,
+            "max_drawdown_pct": float(drawdown.max() * 100) if len(drawdown) > 0 else 0.0,
+            "sharpe": (
+                float(returns.mean() / returns.std() * np.sqrt(len(returns)))
+                if len(returns) > 1 and returns.std() > 0
+                else 0.0
+            ),
+        }
+
+
+def run_backtest(
+    strategy: Strategies,
+    candles: Union[List[Candle], Dict[str, np.ndarray]],
+    take_profit: Optional[float],
+    stop_loss: Optional[float],
+    other_params: Dict,
+    balance_pct: float = 100,
+    initial_balance: float = 1000,
+    fee_pct: float = 0,
+) -> BacktestResult:
+    if isinstance(candles, list):
+        candles = candles_to_arrays(candles)
+
+    highs = candles["high"]
+    lows = candles["low"]
+    closes = candles["close"]
+    timestamps = candles["timestamp"]
+
+    entry_index, sides, entry_prices, first_exit_index = _entries(strategy, candles, other_params)
+
+    tp_pct = take_profit / 100 if take_profit is not None else np.inf
+    sl_pct = stop_loss / 100 if stop_loss is not None else np.inf
+
+    trades = []
+    realized = np.zeros(len(closes), dtype=np.float64)
+    # PnL of the open position at the candle closes, the entry fees included
+    unrealized = np.zeros(len(closes), dtype=np.float64)
+    equity = initial_balance
+
+    # Only one position is open at a time, so the next candidate entry is searched after the last exit
+    k = 0
+    while k < len(entry_index):
+        side = int(sides[k])
+        entry_price = float(entry_prices[k])
+
+        tp_price = entry_price * (1 + side * tp_pct)
+        sl_price = entry_price * (1 - side * sl_pct)
+
+        exit_index, exit_price, exit_reason = _find_exit(
+            highs, lows, int(first_exit_index[k]), side, tp_price, sl_price
+        )
+        if exit_index is None:
+            exit_index = len(closes) - 1
+            exit_price = float(closes[-1])
+
+        quantity = equity * balance_pct / 100 / entry_price
+        fees = (entry_price + exit_price) * quantity * fee_pct / 100
+        pnl = side * (exit_price - entry_price) * quantity - fees
+
+        trades.append(
+            {
+                "entry_time": int(timestamps[entry_index[k]]),
+                "exit_time": int(timestamps[exit_index]),
+                "side": "long" if side == 1 else "short",
+                "entry_price": entry_price,
+                "exit_price": exit_price,
+                "quantity": quantity,
+                "pnl": pnl,
+                "return_pct": pnl / equity * 100,
+                "exit_reason": exit_reason,
+            }
+        )
+
+        equity += pnl
+        realized[exit_index] += pnl
+
+        held = slice(int(entry_index[k]), exit_index)
+        unrealized[held] = side * (closes[held] - entry_price) * quantity - entry_price * quantity * fee_pct / 100
+
+        k = int(np.searchsorted(entry_index, exit_index + 1))
+
+    equity_curve = initial_balance + np.cumsum(realized) + unrealized
+
+    logger.info(
+        "%s backtest over %s candles: %s trades, PnL %s",
+        strategy.value,
+        len(closes),
+        len(trades),
+        equity - initial_balance,
+    )
+
+    return BacktestResult(trades, equity_curve, initial_balance, list(CANDLE_ASSUMPTIONS))
@@ -0,0 +1,102 @@
+import datetime
+import json
+import timeit
+
+import dateutil.parser
+
+from connectors.decoders import JSON_BACKEND, IsoTimestampParser, WsDecoder
+
+# Run from the src directory: python -m benchmarks.decoders
+
+
+def _bitmex_trade_message(rows: int) -> str:
+    start = datetime.datetime(2021, 1, 1, tzinfo=datetime.timezone.utc)
+    data = []
+    for i in range(rows):
+        ts = start + datetime.timedelta(milliseconds=37 * i)
+        data.append(
+            {
+                "timestamp": ts.strftime("%Y-%m-%dT%H:%M:%S.") + f"{ts.microsecond // 1000:03d}Z",
+                "symbol": "XBTUSD",
+                "side": "Buy" if i % 2 == 0 else "Sell",
+                "size": 100 + i,
+                "price": 30000.5 + i % 50,
+                "tickDirection": "PlusTick",
+                "trdMatchID": "00000000-0000-0000-0000-000000000000",
+                "grossValue": 333333,
+                "homeNotional": 0.00333333,
+                "foreignNotional": 100,
+            }
+        )
+    return json.dumps({"table": "trade", "action": "insert", "data": data})
+
+
+def _binance_book_ticker_message() -> str:
+    return json.dumps(
+        {
+            "e": "bookTicker",
+            "u": 400900217,
+            "E": 1568014460893,
+            "T": 1568014460891,
+            "s": "BTCUSDT",
+            "b": "25.35190000",
+            "B": "31.21000000",
+            "a": "25.36520000",
+            "A": "40.66000000",
+        }
+    )
+
+
+def _report(name: str, baseline: float, optimized: float, unit: str):
+    print(
+        f"{name:<40} {baseline * 1e6:>10.2f} us {optimized * 1e6:>10.2f} us {baseline / optimized:>8.1f}x  per {unit}"
+    )
+
+
+def main(number: int = 2000):
+    print(f"JSON backend: {JSON_BACKEND}")
+    print(f"{'':<40} {'current':>13} {'fast path':>13} {'speedup':>9}")
+
+    decoder = WsDecoder()
+
+    msg = _binance_book_ticker_message()
+    baseline = timeit.timeit(lambda: json.loads(msg), number=number * 10) / (number * 10)
+    optimized = timeit.timeit(lambda: decoder.loads(msg), number=number * 10) / (number * 10)
+    _report("Binance bookTicker decoding", baseline, optimized, "message")
+
+    msg = _bitmex_trade_message(100)
+    baseline = timeit.timeit(lambda: json.loads(msg), number=number) / number
+    optimized = timeit.timeit(lambda: decoder.loads(msg), number=number) / number
+    _report("Bitmex 100 trades JSON decoding", baseline, optimized, "message")
+
+    rows = json.loads(msg)["data"]
+    timestamps = [r["timestamp"] for r in rows]
+    parser = IsoTimestampParser()
+
+    def current_timestamps():
+        return [int(dateutil.parser.isoparse(t).timestamp() * 1000) for t in timestamps]
+
+    assert current_timestamps() == [parser(t) for t in timestamps]
+
+    baseline = timeit.timeit(current_timestamps, number=number // 10) / (number // 10) / len(rows)
+    optimized = timeit.timeit(lambda: [parser(t) for t in timestamps], number=number) / number / len(rows)
+    _report("ISO-8601 timestamp parsing", baseline, optimized, "timestamp")
+
+    def current_trades():
+        return [
+            (
+                d["symbol"],
+                float(d["price"]),
+                float(d["size"]),
+                int(dateutil.parser.isoparse(d["timestamp"]).timestamp() * 1000),
+            )
+            for d in rows
+        ]
+
+    baseline = timeit.timeit(current_trades, number=number // 10) / (number // 10)
+    optimized = timeit.timeit(lambda: decoder.bitmex_trades(rows), number=number) / number
+    _report("Bitmex 100 trades row decoding", baseline, optimized, "message")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+import json
+import sys
+import tempfile
+import time
+
+from connectors.binance_futures import BinanceFuturesClient
+from connectors.bitmex import BitmexClient
+from helpers.clock import ReplayClock
+from helpers.Exchange import Exchange
+from models.Contract import Contract
+from recording.recorder import MarketDataRecorder
+from recording.replay import ReplayEngine, iter_frames
+from strategies.BreakoutStrategy import BreakoutStrategy
+
+# Run from the src directory: python -m benchmarks.replay [recording directory]
+# Without a directory, synthetic Binance and Bitmex frames are recorded first and replayed as fast as possible.
+# The strategies never get a signal (their minimum volume can't be reached): orders would need an exchange.
+
+# Milliseconds between the trade time of the synthetic frames and their receive time
+RECEIVE_DELAY = 5
+
+BINANCE_CONTRACT = {
+    "symbol": "BTCUSDT",
+    "baseAsset": "BTC",
+    "quoteAsset": "USDT",
+    "pricePrecision": 2,
+    "quantityPrecision": 3,
+}
+BITMEX_CONTRACT = {
+    "symbol": "XBTUSD",
+    "rootSymbol": "XBT",
+    "quoteCurrency": "USD",
+    "tickSize": 0.5,
+    "lotSize": 100,
+    "isQuanto": False,
+    "isInverse": True,
+    "multiplier": -100000000,
+}
+
+
+def _record_synthetic_frames(directory: str, frames: int, start: int):
+    recorder = MarketDataRecorder(directory)
+
+    for i in range(frames):
+        timestamp = start + i * 10
+        price = 30000 + (i % 200) * 0.5
+        # Received shortly after the trade, like a live feed, so the replay clock runs right at the trade times
+        received = timestamp + RECEIVE_DELAY
+
+        if i % 4 == 0:
+            recorder.record(
+                "binance",
+                json.dumps({"e": "bookTicker", "s": "BTCUSDT", "b": str(price - 0.5), "a": str(price), "T": timestamp}),
+                received,
+            )
+        elif i % 4 in (1, 2):
+            recorder.record(
+                "binance",
+                json.dumps(
+                    {"e": "aggTrade", "s": "BTCUSDT", "a": i, "p": str(price), "q": "0.010", "T": timestamp, "m": True}
+                ),
+                received,
+            )
+        else:
+            iso = time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(timestamp // 1000)) + f".{timestamp % 1000:03d}Z"
+            rows = [
+                {"timestamp": iso, "symbol": "XBTUSD", "side": "Buy", "size": 100, "price": price + j * 0.5}
+                for j in range(10)
+            ]
+            recorder.record("bitmex", json.dumps({"table": "trade", "action": "insert", "data": rows}), received)
+
+        # The benchmark is about the replay, the recording is not allowed to drop frames
+        while recorder.metrics["queued"] > 50000:
+            time.sleep(0.01)
+
+    recorder.stop()
+
+
+def _add_strategy(client, contract: Contract, exchange: str, start: int):
+    strategy = BreakoutStrategy(client, contract, exchange, "1m", 10, None, None, {"min_volume": float("inf")})
+    minute = start - start % 60000
+    strategy.candles.append(minute - 60000, 30000, 30000, 30000, 30000, 0)
+    strategy.candles.append(minute, 30000, 30000, 30000, 30000, 0)
+    client.add_strategy(len(client.strategies), strategy)
+
+
+def main(directory: str = None, frames: int = 200000):
+    start = int(time.time() * 1000)
+    if directory is None:
+        directory = tempfile.mkdtemp()
+        _record_synthetic_frames(directory, frames, start)
+
+    binance_contract = Contract(BINANCE_CONTRACT, Exchange.binance)
+    bitmex_contract = Contract(BITMEX_CONTRACT, Exchange.bitmex)
+    clock = ReplayClock()
+    binance = BinanceFuturesClient(
+        None, None, testnet=True, contracts={binance_contract.symbol: binance_contract}, connect=False, clock=clock
+    )
+    bitmex = BitmexClient(
+        None, None, testnet=True, contracts={bitmex_contract.symbol: bitmex_contract}, connect=False, clock=clock
+    )
+
+    first = next(iter_frames(directory), None)
+    if first is None:
+        print(f"No frame recorded in {directory}")
+        return
+    _add_strategy(binance, binance_contract, "Binance", first[0])
+    _add_strategy(bitmex, bitmex_contract, "Bitmex", first[0])
+
+    engine = ReplayEngine({"binance": binance, "bitmex": bitmex}, speed=None, clock=clock)
+    report = engine.run(iter_frames(directory))
+
+    print(f"Replayed {report['frames']} frames in {report['seconds']} s: {report['messages_per_second']} messages/s")
+    print(f"Skipped {report['skipped']} frames, {report['errors']} errors")
+    for source, metrics in report["ingest"].items():
+        print(f"{source} ingest: {metrics['processed']} trades processed, {metrics['errors']} errors")
+
+
+if __name__ == "__main__":
+    main(sys.argv[1] if len(sys.argv) > 1 else None)
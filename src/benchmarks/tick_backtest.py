@@ -0,0 +1,57 @@
+import sys
+import time
+
+import numpy as np
+
+from backtesting.tick import read_trades_csv, run_tick_backtest, trade_chunks
+from helpers.Exchange import Exchange
+from helpers.Strategies import Strategies
+from models.Contract import Contract
+
+# Run from the src directory: python -m benchmarks.tick_backtest [Binance aggTrades csv]
+# Without a file, a random walk of synthetic BTCUSDT trades is generated first.
+
+BINANCE_CONTRACT = {
+    "symbol": "BTCUSDT",
+    "baseAsset": "BTC",
+    "quoteAsset": "USDT",
+    "pricePrecision": 1,
+    "quantityPrecision": 3,
+}
+
+
+def _synthetic_trades(count: int):
+    rng = np.random.default_rng(0)
+    timestamps = 1700000000000 + np.cumsum(rng.integers(0, 120, count))
+    prices = np.round(30000 * np.exp(np.cumsum(rng.normal(0, 0.0002, count))), 1)
+    sizes = rng.exponential(0.05, count).round(3)
+    return trade_chunks(timestamps, prices, sizes)
+
+
+def main(path: str = None, trades: int = 2000000):
+    contract = Contract(BINANCE_CONTRACT, Exchange.binance)
+    chunks = read_trades_csv(path) if path is not None else _synthetic_trades(trades)
+
+    start = time.perf_counter()
+    result = run_tick_backtest(
+        Strategies.breakout,
+        contract,
+        "1m",
+        chunks,
+        1.0,
+        0.5,
+        {"min_volume": 20},
+        fee_pct=0.04,
+        slippage_pct=0.01,
+        latency=0.05,
+    )
+    seconds = time.perf_counter() - start
+
+    print(f"Backtested {'the file' if path is not None else f'{trades} trades'} in {seconds:.1f} s")
+    print(result.metrics)
+    for note in result.notes:
+        print(note)
+
+
+if __name__ == "__main__":
+    main(sys.argv[1] if len(sys.argv) > 1 else None)
@@ -1,15 +1,22 @@
+import collections
 import hashlib
 import hmac
-import json
 import logging
 import threading
 import time
-from typing import Dict, Optional, List, Union
+from typing import Dict, Optional, List, Union, Tuple
 from urllib.parse import urlencode
 
 import requests
 import websocket
 
+from connectors.decoders import WsDecoder
+from connectors.history import fetch_candles_range
+from connectors.ingest import IngestQueue
+from connectors.rate_limiter import RateLimiter
+from connectors.subscriptions import SubscriptionManager
+from connectors.transport import HttpTransport
+from connectors.ws_pool import ShardedWebsocket
 from constants import (
     BINANCE_TESTNET_BASE_URL,
     BINANCE_BASE_URL,
@@ -18,15 +25,26 @@ from constants import (
     BINANCE_BID_ASK_URL,
     BINANCE_ORDER_URL,
     BINANCE_ACCOUNT_URL,
+    BINANCE_LISTEN_KEY_URL,
+    BINANCE_LISTEN_KEY_KEEPALIVE,
+    BINANCE_ORDERS_CACHE_SIZE,
     BINANCE_TESTNET_WS_URL,
     BINANCE_WS_URL,
+    BINANCE_CANDLES_PAGE_SIZE,
+    BINANCE_HISTORY_WORKERS,
+    BINANCE_WEIGHT_LIMIT,
+    BINANCE_WEIGHT_WINDOW,
+    BINANCE_REQUEST_WEIGHTS,
 )
+from helpers.clock import Clock, WallClock
 from helpers.Exchange import Exchange
 from helpers.Methods import Methods
 from models.Balance import Balance
 from models.Candle import Candle
 from models.Contract import Contract
 from models.OrderStatus import OrderStatus
+from models.PriceBoard import PriceBoard, Quote
+from recording.recorder import MarketDataRecorder
 from strategies.BreakoutStrategy import BreakoutStrategy
 from strategies.TechnicalStrategy import TechnicalStrategy
 
@@ -34,7 +52,18 @@ logger = logging.getLogger()
 
 
 class BinanceFuturesClient:
-    def __init__(self, public_key: str, private_key: str, testnet: bool) -> None:
+    def __init__(
+        self,
+        public_key: str,
+        private_key: str,
+        testnet: bool,
+        base_url: Optional[str] = None,
+        wss_url: Optional[str] = None,
+        recorder: Optional[MarketDataRecorder] = None,
+        contracts: Optional[Dict[str, Contract]] = None,
+        connect: bool = True,
+        clock: Optional[Clock] = None,
+    ) -> None:
         if testnet:
             self._base_url = BINANCE_TESTNET_BASE_URL
             self._wss_url = BINANCE_TESTNET_WS_URL
@@ -42,27 +71,64 @@ class BinanceFuturesClient:
             self._base_url = BINANCE_BASE_URL
             self._wss_url = BINANCE_WS_URL
 
+        # Explicit urls take precedence, to point the client at a local server
+        if base_url is not None:
+            self._base_url = base_url
+        if wss_url is not None:
+            self._wss_url = wss_url
+
+        # Replays and simulations give their own clock, request signatures and timers follow it
+        self.clock = clock if clock is not None else WallClock()
+
         self._public_key = public_key
         self._private_key = private_key
 
         self._headers = {"X-MBX-APIKEY": self._public_key}
+        self._transport = HttpTransport(self._base_url, self._headers)
+        self.rate_limiter = RateLimiter("Binance", BINANCE_WEIGHT_LIMIT, BINANCE_WEIGHT_WINDOW)
 
-        self.contracts = self.get_contracts()
-        self.balances = self.get_balances()
+        # Without a connection the client is only fed by a replay of recorded frames, the contracts are then given
+        # and no websocket is opened
+        self.contracts = contracts if contracts is not None else self.get_contracts()
+        self.balances = self.get_balances() if connect else dict()
 
-        self.prices = dict()
+        self.prices = PriceBoard()
         self.strategies: Dict[int, Union[TechnicalStrategy, BreakoutStrategy]] = dict()
+        self._symbol_strategies: Dict[str, Tuple[Union[TechnicalStrategy, BreakoutStrategy], ...]] = dict()
 
         self.logs = []
 
-        self._ws_id = 1
-        self.ws: websocket.WebSocketApp
+        self.ingest = IngestQueue("Binance")
+        self.decoder = WsDecoder()
+
+        # Raw frames are only recorded when a recorder is given
+        self.recorder = recorder
+
         self.reconnect = True
-        self.ws_connected = False
-        self.ws_subscriptions = {"bookTicker": [], "aggTrade": []}
 
-        t = threading.Thread(target=self._start_ws)
-        t.start()
+        # Orders and balances kept up to date by the user data stream. Only the last updated orders are kept, the
+        # status of an older one is asked to the exchange
+        self.orders: Dict[int, OrderStatus] = collections.OrderedDict()
+        self._orders_lock = threading.Lock()
+        self._listen_key: Optional[str] = None
+        self._user_ws: websocket.WebSocketApp
+        self.private_ws_connected = False
+
+        # Market data streams are sharded over as many connections as needed, they are subscribed again by the
+        # connection they belong to when it reconnects
+        self.ws: Optional[ShardedWebsocket] = None
+        if connect:
+            self.ws = ShardedWebsocket("Binance", self._wss_url, self._on_message)
+        self.subscriptions = SubscriptionManager("Binance", self._send_subscription)
+        if "BTCUSDT" in self.contracts:
+            self.subscriptions.replace("default", [self.stream_name("BTCUSDT", "bookTicker")])
+
+        if connect:
+            t = threading.Thread(target=self._start_user_ws, daemon=True)
+            t.start()
+
+            t = threading.Thread(target=self._keep_listen_key_alive, daemon=True)
+            t.start()
 
         logger.info("Binance futures client successfully initialized")
 
@@ -70,6 +136,30 @@ class BinanceFuturesClient:
         logger.info("%s", msg)
         self.logs.append({"log": msg, "displayed": False})
 
+    def add_strategy(self, b_index: int, strategy: Union[TechnicalStrategy, BreakoutStrategy]):
+        self.strategies[b_index] = strategy
+        self._index_symbol_strategies(strategy.contract.symbol)
+
+        symbol = strategy.contract.symbol
+        self.subscriptions.replace(
+            ("strategy", b_index), [self.stream_name(symbol, "aggTrade"), self.stream_name(symbol, "bookTicker")]
+        )
+
+    def remove_strategy(self, b_index: int):
+        strategy = self.strategies.pop(b_index)
+        self._index_symbol_strategies(strategy.contract.symbol)
+
+        self.subscriptions.replace(("strategy", b_index), [])
+
+    def _index_symbol_strategies(self, symbol: str):
+        # The tuple is rebuilt and swapped in one assignment so the websocket thread never iterates over
+        # a collection the UI thread is mutating
+        symbol_strategies = tuple(s for s in self.strategies.values() if s.contract.symbol == symbol)
+        if len(symbol_strategies) > 0:
+            self._symbol_strategies[symbol] = symbol_strategies
+        else:
+            self._symbol_strategies.pop(symbol, None)
+
     def _generate_signature(self, data: Dict) -> str:
         return hmac.new(
             self._private_key.encode(),
@@ -77,54 +167,31 @@ class BinanceFuturesClient:
             hashlib.sha256,
         ).hexdigest()
 
-    def _make_request(self, method: Methods, endpoint: str, data: Optional[Dict]):
-        if method == Methods.GET:
-            try:
-                response = requests.get(
-                    f"{self._base_url}{endpoint}",
-                    params=data,
-                    headers=self._headers,
-                )
-            except Exception as e:
-                logger.error(
-                    "Connection error while making %s request to %s: %s",
-                    method,
-                    endpoint,
-                    e,
-                )
-                return None
-        elif method == Methods.POST:
-            try:
-                response = requests.post(
-                    f"{self._base_url}{endpoint}",
-                    params=data,
-                    headers=self._headers,
-                )
-            except Exception as e:
-                logger.error(
-                    "Connection error while making %s request to %s: %s",
-                    method,
-                    endpoint,
-                    e,
-                )
-                return None
-        elif method == Methods.DELETE:
-            try:
-                response = requests.delete(
-                    f"{self._base_url}{endpoint}",
-                    params=data,
-                    headers=self._headers,
-                )
-            except Exception as e:
-                logger.error(
-                    "Connection error while making %s request to %s: %s",
-                    method,
-                    endpoint,
-                    e,
-                )
-                return None
-        else:
-            raise ValueError(f"Accepted methods are {Methods.all()}")
+    def _make_request(self, method: Methods, endpoint: str, data: Optional[Dict], blocking: bool = True):
+        if not self.rate_limiter.acquire(
+            BINANCE_REQUEST_WEIGHTS.get(endpoint, 1), priority=endpoint == BINANCE_ORDER_URL, blocking=blocking
+        ):
+            logger.warning("Skipped %s request to %s, not enough request weight left", method, endpoint)
+            return None
+
+        try:
+            response = self._transport.request(method, endpoint, data)
+        except requests.RequestException as e:
+            logger.error(
+                "Connection error while making %s request to %s: %s",
+                method,
+                endpoint,
+                e,
+            )
+            return None
+
+        used_weight = response.headers.get("X-MBX-USED-WEIGHT-1M")
+        if used_weight is not None:
+            self.rate_limiter.sync(used=int(used_weight))
+
+        # 429 is a warning, 418 an IP ban, both tell how long to back off for
+        if response.status_code in (418, 429):
+            self.rate_limiter.block(float(response.headers.get("Retry-After", BINANCE_WEIGHT_WINDOW)))
 
         if response.status_code == 200:
             return response.json()
@@ -145,36 +212,50 @@ class BinanceFuturesClient:
 
         return contracts
 
-    def get_historical_candles(self, contract: Contract, interval: str) -> List[Candle]:
-        data = {"symbol": contract.symbol, "interval": interval, "limit": 1000}
+    def get_historical_candles(
+        self, contract: Contract, interval: str, start_time: Optional[int] = None, end_time: Optional[int] = None
+    ) -> Optional[List[Candle]]:
+        data = {"symbol": contract.symbol, "interval": interval, "limit": BINANCE_CANDLES_PAGE_SIZE}
+        if start_time is not None:
+            data["startTime"] = start_time
+        if end_time is not None:
+            data["endTime"] = end_time
 
         raw_candles = self._make_request(Methods.GET, BINANCE_HISTORIC_CANDLES_URL, data)
+        # A failed request is told apart from a range without candles, the range fetch retries it
+        if raw_candles is None:
+            return None
 
         candles = []
-        if raw_candles is not None:
-            for c in raw_candles:
-                candles.append(Candle(c, interval, Exchange.binance))
+        for c in raw_candles:
+            candles.append(Candle(c, interval, Exchange.binance))
 
         return candles
 
-    def get_bid_ask(self, contract: Contract) -> Dict[str, float]:
+    def get_historical_candles_range(
+        self, contract: Contract, interval: str, start: int, end: int
+    ) -> Optional[List[Candle]]:
+        return fetch_candles_range(
+            lambda start_time, end_time: self.get_historical_candles(contract, interval, start_time, end_time),
+            interval,
+            start,
+            end,
+            BINANCE_CANDLES_PAGE_SIZE,
+            BINANCE_HISTORY_WORKERS,
+        )
+
+    def get_bid_ask(self, contract: Contract) -> Quote:
         data = {"symbol": contract.symbol}
-        ob_data = self._make_request(Methods.GET, BINANCE_BID_ASK_URL, data)
+        # Not worth waiting for, the bookTicker stream updates the prices anyway
+        ob_data = self._make_request(Methods.GET, BINANCE_BID_ASK_URL, data, blocking=False)
         if ob_data is not None:
-            if contract.symbol not in self.prices:
-                self.prices[contract.symbol] = {
-                    "bid": float(ob_data["bidPrice"]),
-                    "ask": float(ob_data["askPrice"]),
-                }
-            else:
-                self.prices[contract.symbol]["bid"] = float(ob_data["bidPrice"])
-                self.prices[contract.symbol]["ask"] = float(ob_data["askPrice"])
-
-            return self.prices[contract.symbol]
+            return self.prices.update(
+                contract.symbol, float(ob_data["bidPrice"]), float(ob_data["askPrice"]), ob_data.get("time")
+            )
 
     def get_balances(self) -> Dict[str, Balance]:
         data = dict()
-        data["timestamp"] = int(time.time() * 1000)
+        data["timestamp"] = self.clock.time_ms()
         data["signature"] = self._generate_signature(data)
 
         balances = dict()
@@ -193,6 +274,8 @@ class BinanceFuturesClient:
         side: str,
         price=None,
         time_in_force=None,
+        stop_price=None,
+        reduce_only: bool = False,
     ) -> OrderStatus:
         data = dict()
         data["symbol"] = contract.symbol
@@ -203,7 +286,11 @@ class BinanceFuturesClient:
             data["price"] = round(round(price / contract.tick_size) * contract.tick_size, 8)
         if time_in_force is not None:
             data["timeInForce"] = time_in_force
-        data["timestamp"] = int(time.time() * 1000)
+        if stop_price is not None:
+            data["stopPrice"] = round(round(stop_price / contract.tick_size) * contract.tick_size, 8)
+        if reduce_only:
+            data["reduceOnly"] = "true"
+        data["timestamp"] = self.clock.time_ms()
         data["signature"] = self._generate_signature(data)
 
         order_status = self._make_request(Methods.POST, BINANCE_ORDER_URL, data)
@@ -216,7 +303,7 @@ class BinanceFuturesClient:
         data = dict()
         data["orderId"] = order_id
         data["symbol"] = contract.symbol
-        data["timestamp"] = int(time.time() * 1000)
+        data["timestamp"] = self.clock.time_ms()
         data["signature"] = self._generate_signature(data)
 
         order_status = self._make_request(Methods.DELETE, BINANCE_ORDER_URL, data)
@@ -226,10 +313,19 @@ class BinanceFuturesClient:
         return order_status
 
     def get_order_status(self, contract: Contract, order_id: str) -> OrderStatus:
+        if self.private_ws_connected:
+            with self._orders_lock:
+                order_status = self.orders.get(order_id)
+            if order_status is not None:
+                return order_status
+
+        return self._query_order_status(contract, order_id)
+
+    def _query_order_status(self, contract: Contract, order_id: str) -> OrderStatus:
         data = dict()
-        data["timestamp"] = int(time.time() * 1000)
+        data["timestamp"] = self.clock.time_ms()
         data["symbol"] = contract.symbol
-        data["order_id"] = order_id
+        data["orderId"] = order_id
         data["signature"] = self._generate_signature(data)
 
         order_status = self._make_request(Methods.GET, BINANCE_ORDER_URL, data)
@@ -238,118 +334,145 @@ class BinanceFuturesClient:
 
         return order_status
 
-    def _start_ws(self):
-        self.ws = websocket.WebSocketApp(
-            self._wss_url,
-            on_open=self._on_open,
-            on_close=self._on_close,
-            on_error=self._on_error,
-            on_message=self._on_message,
-        )
-        while True:
-            try:
-                if self.reconnect:
-                    self.ws.run_forever()
-                else:
-                    break
-            except Exception as e:
-                logger.error("Binance error in run_forever() method: %s", e)
-            time.sleep(2)
-
-    def _on_open(self, ws):
-        logger.info("Binance connection opened")
-
-        self.ws_connected = True
-
-        for channel in ["bookTicker", "aggTrade"]:
-            for symbol in self.ws_subscriptions[channel]:
-                self.subscribe_channel([self.contracts[symbol]], channel)
-
-        if "BTCUSDT" not in self.ws_subscriptions["bookTicker"]:
-            self.subscribe_channel([self.contracts["BTCUSDT"]], "bookTicker")
-
-    def _on_close(self, ws):
-        logger.warning("Binance Websocket connection closed")
-        self.ws_connected = False
-
     def _on_error(self, ws, msg: str):
         logger.error("Binance connection error: %s", msg)
 
     def _on_message(self, ws, msg: str):
-        data = json.loads(msg)
+        if self.recorder is not None:
+            self.recorder.record("binance", msg)
+
+        data = self.decoder.loads(msg)
         if "e" in data:
             if data["e"] == "bookTicker":
-                symbol = data["s"]
-                if symbol not in self.prices:
-                    self.prices[symbol] = {
-                        "bid": float(data["b"]),
-                        "ask": float(data["a"]),
-                    }
-                else:
-                    self.prices[symbol]["bid"] = float(data["b"])
-                    self.prices[symbol]["ask"] = float(data["a"])
-
-                # PNL Calculation
-                try:
-                    for b_index, strategy in self.strategies.items():
-                        if strategy.contract.symbol == symbol:
-                            for trade in strategy.trades:
-                                if trade.status == "open" and trade.entry_price is not None:
-                                    if trade.side == "long":
-                                        trade.pnl = (self.prices[symbol]["bid"] - trade.entry_price) * trade.quantity
-                                    elif trade.side == "short":
-                                        trade.pnl = (trade.entry_price - self.prices[symbol]["ask"]) * trade.quantity
-                except RuntimeError as e:
-                    logger.error("Error while looping through the Binance strategies: %s", e)
+                self.prices.update(data["s"], float(data["b"]), float(data["a"]), data.get("T"))
 
             elif data["e"] == "aggTrade":
                 symbol = data["s"]
-                for key, strategy in self.strategies.items():
-                    if strategy.contract.symbol == symbol:
-                        res = strategy.parse_trades(float(data["p"]), float(data["q"]), data["T"])
-                        strategy.check_trade(res)
-
-    def subscribe_channel(self, contracts: List[Contract], channel: str):
-        if len(contracts) > 200:
-            logger.warning("Subscribing to more then 200 symbols will most likely fail."
-                           "Consider subscribing only when adding a symbol to your watchlist or when"
-                           "starting a strategy for a symbol")
-
-        data = {
-            "method": "SUBSCRIBE",
-            "params": [],
-            "id": self._ws_id,
-        }
-
-        if len(contracts) == 0:
-            data["params"].append(channel)
-        else:
-            for contract in contracts:
-                if contract.symbol not in self.ws_subscriptions[channel]:
-                    data["params"].append(contract.symbol.lower() + "@" + channel)
-                    self.ws_subscriptions[channel].append(contract.symbol)
-
-            if len(data["params"]) == 0:
-                return
-
-        data["id"] = self._ws_id
+                self.ingest.put(symbol, self._process_trade, symbol, float(data["p"]), float(data["q"]), data["T"])
+
+    def _process_trade(self, symbol: str, price: float, size: float, timestamp: int):
+        for strategy in self._symbol_strategies.get(symbol, ()):
+            res = strategy.parse_trades(price, size, timestamp)
+            strategy.check_trade(res)
+
+    def _create_listen_key(self) -> Optional[str]:
+        data = self._make_request(Methods.POST, BINANCE_LISTEN_KEY_URL, None)
+        if data is not None:
+            return data["listenKey"]
+
+    def _keep_listen_key_alive(self):
+        while self.reconnect:
+            time.sleep(BINANCE_LISTEN_KEY_KEEPALIVE)
+            if self._listen_key is None:
+                continue
+
+            if self._make_request(Methods.PUT, BINANCE_LISTEN_KEY_URL, None) is None:
+                logger.warning("Binance listen key keepalive failed, restarting the user data stream")
+                self._user_ws.close()
+
+    def _start_user_ws(self):
+        while self.reconnect:
+            # A new key is asked for on every connection, the previous one may have expired while disconnected
+            self._listen_key = self._create_listen_key()
+            if self._listen_key is not None:
+                self._user_ws = websocket.WebSocketApp(
+                    f"{self._wss_url}/{self._listen_key}",
+                    on_open=self._on_user_open,
+                    on_close=self._on_user_close,
+                    on_error=self._on_error,
+                    on_message=self._on_user_message,
+                )
+                try:
+                    self._user_ws.run_forever()
+                except Exception as e:
+                    logger.error("Binance error in the user data stream run_forever() method: %s", e)
+            time.sleep(2)
 
-        try:
-            self.ws.send(json.dumps(data))
-            logger.info("Binance: subscribing to: %s", ','.join(data["params"]))
-        except Exception as e:
-            logger.error(
-                "Connection error while subscribing to %s %s updates: %s",
-                len(contracts),
-                channel,
-                e,
-            )
-            return None
+    def _on_user_open(self, ws):
+        logger.info("Binance user data stream opened")
 
-        self._ws_id += 1
+        # Events may have been missed while disconnected
+        self.balances = self.get_balances()
+        self.private_ws_connected = True
+        self._reconcile_orders()
+
+    def _reconcile_orders(self):
+        # The open entries and protective orders are asked to the exchange, a fill missed while disconnected is then
+        # handled like the update the stream would have sent. It runs before the stream messages are read, so a
+        # newer update still comes after it
+        for symbol, strategies in list(self._symbol_strategies.items()):
+            for strategy in strategies:
+                for trade in list(strategy.trades):
+                    if trade.status != "open":
+                        continue
+
+                    order_ids = list(trade.protective_ids.values())
+                    if trade.entry_price is None:
+                        order_ids.append(trade.entry_id)
+
+                    for order_id in order_ids:
+                        order_status = self._query_order_status(strategy.contract, order_id)
+                        if order_status is not None:
+                            self._cache_order(order_status)
+                            self.ingest.put(symbol, self._process_order_update, symbol, order_status)
+
+    def _cache_order(self, order_status: OrderStatus):
+        # Strategies read the cache from their own threads while the stream updates it
+        with self._orders_lock:
+            self.orders[order_status.order_id] = order_status
+            self.orders.move_to_end(order_status.order_id)
+            while len(self.orders) > BINANCE_ORDERS_CACHE_SIZE:
+                self.orders.popitem(last=False)
+
+    def _on_user_close(self, ws, *args):
+        logger.warning("Binance user data stream closed")
+        self.private_ws_connected = False
+
+    def _on_user_message(self, ws, msg: str):
+        data = self.decoder.loads(msg)
+
+        if data["e"] == "ORDER_TRADE_UPDATE":
+            o = data["o"]
+            order_status = OrderStatus({"orderId": o["i"], "status": o["X"], "avgPrice": o["ap"]}, Exchange.binance)
+            self._cache_order(order_status)
+
+            # Handled on the worker of the symbol, after the trades received before the update
+            self.ingest.put(o["s"], self._process_order_update, o["s"], order_status)
+
+        elif data["e"] == "ACCOUNT_UPDATE":
+            for b in data["a"]["B"]:
+                if b["a"] in self.balances:
+                    self.balances[b["a"]].wallet_balance = float(b["wb"])
+
+        elif data["e"] == "listenKeyExpired":
+            logger.warning("Binance listen key expired, restarting the user data stream")
+            ws.close()
+
+    def _process_order_update(self, symbol: str, order_status: OrderStatus):
+        for strategy in self._symbol_strategies.get(symbol, ()):
+            strategy.on_order_update(order_status)
+
+    @staticmethod
+    def stream_name(symbol: str, channel: str) -> str:
+        return symbol.lower() + "@" + channel
+
+    def _send_subscription(self, op: str, streams: List[str]) -> bool:
+        if self.ws is None:
+            return False
+
+        # The pool keeps the streams of every connection and subscribes them again on reconnection, the frames
+        # themselves are sent by its own sender thread
+        if op == "subscribe":
+            if not self.ws.subscribe(streams):
+                logger.error("Could not subscribe to %s streams", len(streams))
+                return False
+            return True
+
+        return self.ws.unsubscribe(streams)
 
     def get_trade_size(self, contract: Contract, price: float, balance_pct: float):
-        balance = self.get_balances()
+        # The user data stream keeps the balances current, no need to ask the exchange before every entry
+        balance = self.balances if self.private_ws_connected else self.get_balances()
         if balance is not None:
             if "USDT" in balance:
                 balance = balance["USDT"].wallet_balance
@@ -1,16 +1,22 @@
+import datetime
 import hashlib
 import hmac
 import json
 import logging
 import threading
 import time
-from typing import Dict, Optional, List, Union
+from typing import Dict, Optional, List, Union, Tuple
 from urllib.parse import urlencode
 
-import dateutil.parser
 import requests
 import websocket
 
+from connectors.decoders import WsDecoder
+from connectors.history import fetch_candles_range
+from connectors.ingest import IngestQueue
+from connectors.rate_limiter import RateLimiter
+from connectors.subscriptions import SubscriptionManager
+from connectors.transport import HttpTransport
 from constants import (
     BITMEX_TESTNET_BASE_URL,
     BITMEX_BASE_URL,
@@ -20,13 +26,23 @@ from constants import (
     BITMEX_BALANCES_URL,
     BITMEX_HISTORIC_CANDLES_URL,
     BITMEX_ORDER_URL,
+    BITMEX_ORDER_TYPES,
+    BITMEX_PRIVATE_TABLES,
+    BITMEX_EXECUTIONS_LIMIT,
+    BITMEX_CANDLES_PAGE_SIZE,
+    BITMEX_HISTORY_WORKERS,
+    BITMEX_REQUEST_LIMIT,
+    BITMEX_REQUEST_WINDOW,
 )
+from helpers.clock import Clock, WallClock
 from helpers.Exchange import Exchange
 from helpers.Methods import Methods
 from models.Balance import Balance
-from models.Candle import Candle
+from models.Candle import Candle, BITMEX_TF_MINUTES
 from models.Contract import Contract
 from models.OrderStatus import OrderStatus
+from models.PriceBoard import PriceBoard, UNCHANGED
+from recording.recorder import MarketDataRecorder
 from strategies.BreakoutStrategy import BreakoutStrategy
 from strategies.TechnicalStrategy import TechnicalStrategy
 
@@ -34,7 +50,18 @@ logger = logging.getLogger()
 
 
 class BitmexClient:
-    def __init__(self, public_key: str, private_key: str, testnet: bool):
+    def __init__(
+        self,
+        public_key: str,
+        private_key: str,
+        testnet: bool,
+        base_url: Optional[str] = None,
+        wss_url: Optional[str] = None,
+        recorder: Optional[MarketDataRecorder] = None,
+        contracts: Optional[Dict[str, Contract]] = None,
+        connect: bool = True,
+        clock: Optional[Clock] = None,
+    ):
         if testnet:
             self._base_url = BITMEX_TESTNET_BASE_URL
             self._wss_url = BITMEX_TESTNET_WS_URL
@@ -42,22 +69,54 @@ class BitmexClient:
             self._base_url = BITMEX_BASE_URL
             self._wss_url = BITMEX_WS_URL
 
+        # Explicit urls take precedence, to point the client at a local server
+        if base_url is not None:
+            self._base_url = base_url
+        if wss_url is not None:
+            self._wss_url = wss_url
+
+        # Replays and simulations give their own clock, request signatures and timers follow it
+        self.clock = clock if clock is not None else WallClock()
+
         self._public_key = public_key
         self._private_key = private_key
 
+        self._transport = HttpTransport(self._base_url)
+        self.rate_limiter = RateLimiter("Bitmex", BITMEX_REQUEST_LIMIT, BITMEX_REQUEST_WINDOW)
+
         self.ws: websocket.WebSocketApp
         self.reconnect = True
+        self.ws_connected = False
 
-        self.contracts = self.get_contracts()
-        self.balances = self.get_balances()
+        # Without a connection the client is only fed by a replay of recorded frames, the contracts are then given
+        # and no websocket is opened
+        self.contracts = contracts if contracts is not None else self.get_contracts()
+        self.balances = self.get_balances() if connect else dict()
 
-        self.prices = dict()
+        self.prices = PriceBoard()
         self.strategies: Dict[int, Union[TechnicalStrategy, BreakoutStrategy]] = dict()
+        self._symbol_strategies: Dict[str, Tuple[Union[TechnicalStrategy, BreakoutStrategy], ...]] = dict()
 
         self.logs = []
 
-        t = threading.Thread(target=self._start_ws)
-        t.start()
+        self.ingest = IngestQueue("Bitmex")
+        self.decoder = WsDecoder()
+
+        # Raw frames are only recorded when a recorder is given
+        self.recorder = recorder
+
+        # Local copies of the private websocket tables, rows indexed by their key columns
+        self.tables: Dict[str, Dict[Tuple, Dict]] = {table: dict() for table in BITMEX_PRIVATE_TABLES}
+        self.private_ws_connected = False
+
+        # Only the symbols of the watchlist and of the strategies are streamed, not the whole exchange
+        self.subscriptions = SubscriptionManager("Bitmex", self._send_subscription)
+        if self._public_key is not None and self._private_key is not None:
+            self.subscriptions.replace("account", BITMEX_PRIVATE_TABLES)
+
+        if connect:
+            t = threading.Thread(target=self._start_ws)
+            t.start()
 
         logger.info("Bitmex Client successfully initialized")
 
@@ -65,6 +124,28 @@ class BitmexClient:
         logger.info("%s", msg)
         self.logs.append({"log": msg, "displayed": False})
 
+    def add_strategy(self, b_index: int, strategy: Union[TechnicalStrategy, BreakoutStrategy]):
+        self.strategies[b_index] = strategy
+        self._index_symbol_strategies(strategy.contract.symbol)
+
+        symbol = strategy.contract.symbol
+        self.subscriptions.replace(("strategy", b_index), [f"trade:{symbol}", f"quote:{symbol}"])
+
+    def remove_strategy(self, b_index: int):
+        strategy = self.strategies.pop(b_index)
+        self._index_symbol_strategies(strategy.contract.symbol)
+
+        self.subscriptions.replace(("strategy", b_index), [])
+
+    def _index_symbol_strategies(self, symbol: str):
+        # The tuple is rebuilt and swapped in one assignment so the websocket thread never iterates over
+        # a collection the UI thread is mutating
+        symbol_strategies = tuple(s for s in self.strategies.values() if s.contract.symbol == symbol)
+        if len(symbol_strategies) > 0:
+            self._symbol_strategies[symbol] = symbol_strategies
+        else:
+            self._symbol_strategies.pop(symbol, None)
+
     def _generate_signature(self, method: Methods, endpoint: str, expires: str, data: Dict) -> str:
         message = (
             f"{method.value}{endpoint}?{urlencode(data)}{expires}"
@@ -73,49 +154,36 @@ class BitmexClient:
         )
         return hmac.new(self._private_key.encode(), message.encode(), hashlib.sha256).hexdigest()
 
-    def _make_request(self, method: Methods, endpoint: str, data: Optional[Dict]):
+    def _make_request(self, method: Methods, endpoint: str, data: Optional[Dict], blocking: bool = True):
+        if not self.rate_limiter.acquire(priority=endpoint == BITMEX_ORDER_URL, blocking=blocking):
+            logger.warning("Skipped %s request to %s, no request left in the rate limit", method, endpoint)
+            return None
+
         headers = dict()
 
-        expires = str(int(time.time()) + 5)
+        expires = str(int(self.clock.time()) + 5)
         headers["api-expires"] = expires
         headers["api-key"] = self._public_key
         headers["api-signature"] = self._generate_signature(method, endpoint, expires, data)
 
-        if method == Methods.GET:
-            try:
-                response = requests.get(f"{self._base_url}{endpoint}", params=data, headers=headers)
-            except Exception as e:
-                logger.error(
-                    "Connection error while making %s request to %s: %s",
-                    method,
-                    endpoint,
-                    e,
-                )
-                return None
-        elif method == Methods.POST:
-            try:
-                response = requests.post(f"{self._base_url}{endpoint}", params=data, headers=headers)
-            except Exception as e:
-                logger.error(
-                    "Connection error while making %s request to %s: %s",
-                    method,
-                    endpoint,
-                    e,
-                )
-                return None
-        elif method == Methods.DELETE:
-            try:
-                response = requests.delete(f"{self._base_url}{endpoint}", params=data, headers=headers)
-            except Exception as e:
-                logger.error(
-                    "Connection error while making %s request to %s: %s",
-                    method,
-                    endpoint,
-                    e,
-                )
-                return None
-        else:
-            raise ValueError(f"Accepted methods are {Methods.all()}")
+        try:
+            response = self._transport.request(method, endpoint, data, headers)
+        except requests.RequestException as e:
+            logger.error(
+                "Connection error while making %s request to %s: %s",
+                method,
+                endpoint,
+                e,
+            )
+            return None
+
+        remaining = response.headers.get("x-ratelimit-remaining")
+        if remaining is not None:
+            limit = response.headers.get("x-ratelimit-limit")
+            self.rate_limiter.sync(remaining=int(remaining), capacity=int(limit) if limit is not None else None)
+
+        if response.status_code == 429:
+            self.rate_limiter.block(float(response.headers.get("Retry-After", BITMEX_REQUEST_WINDOW)))
 
         if response.status_code == 200:
             return response.json()
@@ -148,22 +216,54 @@ class BitmexClient:
                 balances[a["currency"]] = Balance(a, Exchange.bitmex)
         return balances
 
-    def get_historical_candles(self, contract: Contract, timeframe: str) -> List[Candle]:
+    def get_historical_candles(
+        self, contract: Contract, timeframe: str, start_time: Optional[int] = None, end_time: Optional[int] = None
+    ) -> Optional[List[Candle]]:
         data = dict()
         data["symbol"] = contract.symbol
         data["partial"] = True
         data["binSize"] = timeframe
-        data["count"] = 500
-        data["reverse"] = True
+        data["count"] = BITMEX_CANDLES_PAGE_SIZE
+
+        if start_time is None and end_time is None:
+            data["reverse"] = True
+        else:
+            # Bitmex buckets are timestamped with their close time
+            if start_time is not None:
+                data["startTime"] = self._bucket_time(start_time, timeframe)
+            if end_time is not None:
+                data["endTime"] = self._bucket_time(end_time, timeframe)
+            data["reverse"] = False
 
         raw_candles = self._make_request(Methods.GET, BITMEX_HISTORIC_CANDLES_URL, data)
+        # A failed request is told apart from a range without candles, the range fetch retries it
+        if raw_candles is None:
+            return None
 
         candles = []
-        if raw_candles is not None:
-            for c in reversed(raw_candles):
-                candles.append(Candle(c, timeframe, Exchange.bitmex))
+        if data["reverse"]:
+            raw_candles = reversed(raw_candles)
+        for c in raw_candles:
+            candles.append(Candle(c, timeframe, Exchange.bitmex))
         return candles
 
+    def get_historical_candles_range(
+        self, contract: Contract, timeframe: str, start: int, end: int
+    ) -> Optional[List[Candle]]:
+        return fetch_candles_range(
+            lambda start_time, end_time: self.get_historical_candles(contract, timeframe, start_time, end_time),
+            timeframe,
+            start,
+            end,
+            BITMEX_CANDLES_PAGE_SIZE,
+            BITMEX_HISTORY_WORKERS,
+        )
+
+    @staticmethod
+    def _bucket_time(timestamp: int, timeframe: str) -> str:
+        bucket_time = timestamp + BITMEX_TF_MINUTES[timeframe] * 60 * 1000
+        return datetime.datetime.fromtimestamp(bucket_time / 1000, datetime.timezone.utc).isoformat()
+
     def place_order(
         self,
         contract: Contract,
@@ -172,17 +272,23 @@ class BitmexClient:
         side: str,
         price=None,
         time_in_force=None,
+        stop_price=None,
+        reduce_only: bool = False,
     ) -> OrderStatus:
         data = dict()
 
         data["symbol"] = contract.symbol
         data["side"] = side.capitalize()
         data["orderQty"] = round(quantity / contract.lot_size) * contract.lot_size
-        data["ordrType"] = order_type.capitalize()
+        data["ordType"] = BITMEX_ORDER_TYPES.get(order_type, order_type.capitalize())
         if price is not None:
             data["price"] = round(round(price / contract.tick_size) * contract.tick_size, 8)
         if time_in_force is not None:
             data["timeInForce"] = time_in_force
+        if stop_price is not None:
+            data["stopPx"] = round(round(stop_price / contract.tick_size) * contract.tick_size, 8)
+        if reduce_only:
+            data["execInst"] = "ReduceOnly"
 
         order_status = self._make_request(Methods.POST, BITMEX_ORDER_URL, data)
 
@@ -190,7 +296,7 @@ class BitmexClient:
             order_status = OrderStatus(order_status, Exchange.bitmex)
         return order_status
 
-    def cancel_order(self, order_id: str) -> OrderStatus:
+    def cancel_order(self, contract: Contract, order_id: str) -> OrderStatus:
         data = dict()
         data["orderID"] = order_id
 
@@ -201,6 +307,9 @@ class BitmexClient:
         return order_status
 
     def get_order_status(self, contract: Contract, order_id: str) -> OrderStatus:
+        if self.private_ws_connected and (order_id,) in self.tables["order"]:
+            return OrderStatus(self.tables["order"][(order_id,)], Exchange.bitmex)
+
         data = dict()
         data["symbol"] = contract.symbol
         data["reverse"] = True
@@ -210,7 +319,7 @@ class BitmexClient:
         if order_status is not None:
             for order in order_status:
                 if order["orderID"] == order_id:
-                    return OrderStatus(order_status[0], Exchange.bitmex)
+                    return OrderStatus(order, Exchange.bitmex)
 
     def _start_ws(self):
         self.ws = websocket.WebSocketApp(
@@ -232,93 +341,136 @@ class BitmexClient:
 
     def _on_open(self, ws):
         logger.info("Bitmex connection opened")
-        self.subscribe_channel("instrument")
-        self.subscribe_channel("trade")
+        self.ws_connected = True
+
+        # The private tables can only be subscribed to once authenticated
+        if self._public_key is not None and self._private_key is not None:
+            self._authenticate()
+        self.subscriptions.sync()
 
-    def _on_close(self, ws):
+    def _on_close(self, ws, *args):
         logger.warning("Bitmex Websocket connection closed")
+        self.ws_connected = False
+        self.private_ws_connected = False
+        self.subscriptions.reset()
 
     def _on_error(self, ws, msg: str):
         logger.error("Bitmex connection error: %s", msg)
 
+    def _authenticate(self):
+        expires = str(int(self.clock.time()) + 5)
+        signature = self._generate_signature(Methods.GET, "/realtime", expires, dict())
+
+        try:
+            self.ws.send(json.dumps({"op": "authKeyExpires", "args": [self._public_key, int(expires), signature]}))
+        except Exception as e:
+            logger.error("Connection error while authenticating the Bitmex websocket: %s", e)
+
     def _on_message(self, ws, msg: str):
-        data = json.loads(msg)
+        data = self.decoder.loads(msg)
+
+        # Only the market data is recorded, like on Binance where the user data stream is apart: the account tables
+        # and the answers to the requests, the authentication echoing the API key, never reach the files
+        if self.recorder is not None and data.get("table") not in BITMEX_PRIVATE_TABLES and "request" not in data:
+            self.recorder.record("bitmex", msg)
+
         if "table" in data:
-            if data["table"] == "instrument":
+            if data["table"] in BITMEX_PRIVATE_TABLES:
+                self._update_table(data)
+                return
+
+            if data["table"] == "quote":
                 for d in data["data"]:
-                    symbol = d["symbol"]
-                    if symbol not in self.prices:
-                        self.prices[symbol] = {"bid": None, "ask": None}
-                    if "bidPrice" in d:
-                        self.prices[symbol]["bid"] = float(d["bidPrice"]) if d["bidPrice"] is not None else None
-                    if "askPrice" in d:
-                        self.prices[symbol]["ask"] = float(d["askPrice"]) if d["askPrice"] is not None else None
-
-                        # PNL Calculation
-                        try:
-                            for b_index, strategy in self.strategies.items():
-                                if strategy.contract.symbol == symbol:
-                                    for trade in strategy.trades:
-                                        if trade.status == "open" and trade.entry_price is not None:
-                                            if trade.side == "long":
-                                                price = self.prices[symbol]["bid"]
-                                            else:
-                                                price = self.prices[symbol]["ask"]
-                                            multiplier = trade.contract.multiplier
-
-                                            if trade.contract.inverse:
-                                                if trade.side == "long":
-                                                    trade.pnl = (
-                                                        (1 / trade.entry_price - 1 / price)
-                                                        * multiplier
-                                                        * trade.quantity
-                                                    )
-                                                elif trade.side == "short":
-                                                    trade.pnl = (
-                                                        (1 / price - 1 / trade.entry_price)
-                                                        * multiplier
-                                                        * trade.quantity
-                                                    )
-                                            else:
-                                                if trade.side == "long":
-                                                    trade.pnl = (
-                                                        (price - trade.entry_price) * multiplier * trade.quantity
-                                                    )
-                                                elif trade.side == "short":
-                                                    trade.pnl = (
-                                                        (trade.entry_price - price) * multiplier * trade.quantity
-                                                    )
-                        except RuntimeError as e:
-                            logger.error("Error while looping through the Bitmex strategies: %s", e)
+                    if "bidPrice" in d or "askPrice" in d:
+                        self.prices.update(d["symbol"], d.get("bidPrice", UNCHANGED), d.get("askPrice", UNCHANGED))
 
             if data["table"] == "trade":
-                for d in data["data"]:
-                    symbol = d["symbol"]
-                    ts = int(dateutil.parser.isoparse(d["timestamp"]).timestamp() * 1000)
+                trades = self.decoder.bitmex_trades(data["data"])
+                symbols = trades["symbol"]
+
+                batch_symbols = list(dict.fromkeys(symbols.tolist()))
+                for symbol in batch_symbols:
+                    # With per symbol subscriptions a message almost always holds the trades of one symbol
+                    if len(batch_symbols) == 1:
+                        rows = trades
+                    else:
+                        rows = {k: v[symbols == symbol] for k, v in trades.items()}
+                    self.ingest.put(
+                        symbol,
+                        self._process_trades,
+                        symbol,
+                        rows["price"].tolist(),
+                        rows["size"].tolist(),
+                        rows["timestamp"].tolist(),
+                    )
+
+    def _process_trades(self, symbol: str, prices: List[float], sizes: List[float], timestamps: List[int]):
+        for price, size, timestamp in zip(prices, sizes, timestamps):
+            for strategy in self._symbol_strategies.get(symbol, ()):
+                res = strategy.parse_trades(price, size, timestamp)
+                strategy.check_trade(res)
+
+    def _update_table(self, data: Dict):
+        table_name = data["table"]
+        table = self.tables[table_name]
+        keys = BITMEX_PRIVATE_TABLES[table_name]
+
+        # The partial is the full image of the table, the other actions are applied on top of it
+        if data["action"] == "partial":
+            table.clear()
+
+        for row in data["data"]:
+            key = tuple(row.get(k) for k in keys)
+
+            if data["action"] == "delete":
+                table.pop(key, None)
+                continue
+
+            if key in table:
+                table[key].update(row)
+            else:
+                table[key] = row
+
+            if table_name == "order":
+                # Handled on the worker of the symbol, after the trades received before the update
+                symbol = table[key]["symbol"]
+                order_status = OrderStatus(table[key], Exchange.bitmex)
+                self.ingest.put(symbol, self._process_order_update, symbol, order_status)
+
+            elif table_name == "margin":
+                try:
+                    self.balances[table[key]["currency"]] = Balance(table[key], Exchange.bitmex)
+                except KeyError as e:
+                    logger.warning("Incomplete Bitmex margin row, missing %s", e)
 
-                    for key, strategy in self.strategies.items():
-                        if strategy.contract.symbol == symbol:
-                            res = strategy.parse_trades(float(d["price"]), float(d["size"]), ts)
-                            strategy.check_trade(res)
+        if table_name == "execution":
+            while len(table) > BITMEX_EXECUTIONS_LIMIT:
+                del table[next(iter(table))]
 
-    def subscribe_channel(self, topic: str):
-        data = {
-            "op": "subscribe",
-            "args": [topic],
-        }
+        if table_name == "order" and data["action"] == "partial":
+            logger.info("Bitmex private websocket tables synchronized")
+            self.private_ws_connected = True
+
+    def _process_order_update(self, symbol: str, order_status: OrderStatus):
+        for strategy in self._symbol_strategies.get(symbol, ()):
+            strategy.on_order_update(order_status)
+
+    def _send_subscription(self, op: str, topics: List[str]) -> bool:
+        # Everything desired is sent again once the connection is (re)opened
+        if not self.ws_connected:
+            return False
 
         try:
-            self.ws.send(json.dumps(data))
+            self.ws.send(json.dumps({"op": op, "args": topics}))
         except Exception as e:
-            logger.error(
-                "Connection error while subscribing to %s updates: %s",
-                topic,
-                e,
-            )
-            return None
+            logger.error("Connection error while sending %s for %s: %s", op, ",".join(topics), e)
+            return False
+
+        return True
 
     def get_trade_size(self, contract: Contract, price: float, balance_pct: float):
-        balance = self.get_balances()
+        # The margin table keeps the balances current, no need to ask the exchange before every entry
+        balance = self.balances if self.private_ws_connected else self.get_balances()
         if balance is not None:
             if "XBt" in balance:
                 balance = balance["XBt"].wallet_balance
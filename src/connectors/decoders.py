@@ -0,0 +1,67 @@
+import calendar
+import json
+import logging
+from typing import Dict, List
+
+import dateutil.parser
+import numpy as np
+
+logger = logging.getLogger()
+
+# orjson is several times faster than the standard library on the exchange payloads, it stays optional
+try:
+    import orjson
+
+    JSON_BACKEND = "orjson"
+    json_loads = orjson.loads
+except ImportError:
+    JSON_BACKEND = "json"
+    json_loads = json.loads
+
+
+class IsoTimestampParser:
+    def __init__(self, cache_size: int = 1024):
+        self._cache_size = cache_size
+        self._seconds: Dict[str, int] = dict()
+
+    def __call__(self, timestamp: str) -> int:
+        # Bitmex timestamps are always "YYYY-MM-DDTHH:MM:SS.fffZ", the date and time part only changes every
+        # second so its conversion is cached and the milliseconds are added to it
+        if len(timestamp) != 24 or timestamp[19] != "." or timestamp[23] != "Z":
+            return int(dateutil.parser.isoparse(timestamp).timestamp() * 1000)
+
+        prefix = timestamp[:19]
+        seconds = self._seconds.get(prefix)
+        if seconds is None:
+            if len(self._seconds) >= self._cache_size:
+                self._seconds.clear()
+
+            seconds = calendar.timegm(
+                (
+                    int(prefix[0:4]),
+                    int(prefix[5:7]),
+                    int(prefix[8:10]),
+                    int(prefix[11:13]),
+                    int(prefix[14:16]),
+                    int(prefix[17:19]),
+                )
+            )
+            self._seconds[prefix] = seconds
+
+        return seconds * 1000 + int(timestamp[20:23])
+
+
+class WsDecoder:
+    def __init__(self):
+        self.loads = json_loads
+        self.parse_timestamp = IsoTimestampParser()
+
+    def bitmex_trades(self, rows: List[Dict]) -> Dict[str, np.ndarray]:
+        # One pass over the rows per column instead of several conversions per row
+        count = len(rows)
+        return {
+            "symbol": np.array([r["symbol"] for r in rows], dtype=object),
+            "price": np.fromiter((r["price"] for r in rows), dtype=np.float64, count=count),
+            "size": np.fromiter((r["size"] for r in rows), dtype=np.float64, count=count),
+            "timestamp": np.fromiter((self.parse_timestamp(r["timestamp"]) for r in rows), dtype=np.int64, count=count),
+        }
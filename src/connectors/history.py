@@ -0,0 +1,57 @@
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, List, Optional
+
+from constants import CANDLES_PAGE_RETRIES, CANDLES_PAGE_RETRY_DELAY, TF_EQUIV
+from models.Candle import Candle
+
+logger = logging.getLogger()
+
+
+def fetch_candles_range(
+    fetch_page: Callable[[int, int], Optional[List[Candle]]],
+    timeframe: str,
+    start: int,
+    end: int,
+    page_size: int,
+    workers: int,
+    retries: int = CANDLES_PAGE_RETRIES,
+    retry_delay: float = CANDLES_PAGE_RETRY_DELAY,
+) -> Optional[List[Candle]]:
+    tf_equiv = TF_EQUIV[timeframe] * 1000
+    page_span = page_size * tf_equiv
+
+    # Pages are aligned on the timeframe so they never overlap, the exchanges can still return the candle at
+    # a boundary twice and it is de-duplicated on its timestamp below
+    first = start - start % tf_equiv
+    pages = [(page_start, min(page_start + page_span, end) - 1) for page_start in range(first, end, page_span)]
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        results = list(executor.map(lambda page: fetch_page(*page), pages))
+
+        # fetch_page returns None when the request failed, merging the other pages would leave a hole in the series
+        for attempt in range(retries):
+            failed = [i for i, page in enumerate(results) if page is None]
+            if len(failed) == 0:
+                break
+
+            logger.warning("%s of %s %s candle pages failed, retrying", len(failed), len(pages), timeframe)
+            time.sleep(retry_delay * (attempt + 1))
+            for i, page in zip(failed, executor.map(lambda i: fetch_page(*pages[i]), failed)):
+                results[i] = page
+
+    missing = [pages[i] for i, page in enumerate(results) if page is None]
+    if len(missing) > 0:
+        logger.error("Could not fetch the %s candles of the ranges %s, the history is incomplete", timeframe, missing)
+        return None
+
+    candles = dict()
+    for page in results:
+        for candle in page:
+            if start <= candle.timestamp < end:
+                candles[candle.timestamp] = candle
+
+    logger.info("Fetched %s %s candles in %s pages", len(candles), timeframe, len(pages))
+
+    return [candles[ts] for ts in sorted(candles)]
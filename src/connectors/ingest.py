@@ -0,0 +1,94 @@
+import logging
+import queue
+import threading
+import time
+from typing import Callable, Dict, List
+
+from constants import INGEST_WORKERS, INGEST_QUEUE_SIZE
+
+logger = logging.getLogger()
+
+
+class _IngestWorker:
+    def __init__(self, name: str, maxsize: int):
+        self.queue = queue.Queue(maxsize=maxsize)
+
+        self.processed = 0
+        self.errors = 0
+        self.max_depth = 0
+        self.latency = 0.0
+
+        self.thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self.thread.start()
+
+    def _run(self):
+        while True:
+            item = self.queue.get()
+            if item is None:
+                self.queue.task_done()
+                break
+
+            enqueued_at, handler, args = item
+            try:
+                handler(*args)
+            except Exception as e:
+                self.errors += 1
+                logger.error("Error while processing %s in %s: %s", handler.__name__, self.thread.name, e)
+
+            self.processed += 1
+            # Smoothed time between the reception of the message and the end of its processing
+            self.latency = 0.99 * self.latency + 0.01 * (time.monotonic() - enqueued_at)
+            self.queue.task_done()
+
+
+class IngestQueue:
+    def __init__(self, name: str, workers: int = INGEST_WORKERS, maxsize: int = INGEST_QUEUE_SIZE):
+        self.name = name
+        self._workers: List[_IngestWorker] = [_IngestWorker(f"{name}-ingest-{i}", maxsize) for i in range(workers)]
+
+        self.enqueued = 0
+        self.blocked_puts = 0
+        self.blocked_time = 0.0
+
+    def put(self, key: str, handler: Callable, *args):
+        # Every message of a symbol goes to the same worker, so they are processed in the order they arrived
+        worker = self._workers[hash(key) % len(self._workers)]
+        item = (time.monotonic(), handler, args)
+
+        try:
+            worker.queue.put_nowait(item)
+        except queue.Full:
+            # The websocket thread waits for the workers to catch up instead of dropping messages, which
+            # would corrupt the candles
+            self.blocked_puts += 1
+            if self.blocked_puts % 1000 == 1:
+                logger.warning("%s ingest queue is full, the websocket is slowed down", self.name)
+
+            start = time.monotonic()
+            worker.queue.put(item)
+            self.blocked_time += time.monotonic() - start
+
+        self.enqueued += 1
+        worker.max_depth = max(worker.max_depth, worker.queue.qsize())
+
+    def join(self):
+        # Waits until every queued message has been processed, used by replays to measure end to end throughput
+        for worker in self._workers:
+            worker.queue.join()
+
+    def stop(self):
+        for worker in self._workers:
+            worker.queue.put(None)
+
+    @property
+    def metrics(self) -> Dict:
+        return {
+            "enqueued": self.enqueued,
+            "processed": sum(w.processed for w in self._workers),
+            "errors": sum(w.errors for w in self._workers),
+            "depth": [w.queue.qsize() for w in self._workers],
+            "max_depth": [w.max_depth for w in self._workers],
+            "latency_ms": [round(w.latency * 1000, 3) for w in self._workers],
+            "blocked_puts": self.blocked_puts,
+            "blocked_time": self.blocked_time,
+        }
@@ -0,0 +1,107 @@
+import logging
+import threading
+import time
+from typing import Callable, Dict, Optional
+
+from constants import RATE_LIMIT_PRIORITY_RESERVE
+
+logger = logging.getLogger()
+
+
+class RateLimiter:
+    def __init__(
+        self,
+        name: str,
+        capacity: float,
+        window: float,
+        priority_reserve: float = RATE_LIMIT_PRIORITY_RESERVE,
+        monotonic: Callable[[], float] = time.monotonic,
+    ):
+        self.name = name
+        self.capacity = capacity
+        self.window = window
+
+        # Part of the budget only priority requests (orders) can spend, so market data calls can never use up
+        # what an exit order needs
+        self._reserve = capacity * priority_reserve
+
+        self._monotonic = monotonic
+        self._tokens = float(capacity)
+        self._last_refill = monotonic()
+        self._blocked_until = 0.0
+        self._waiting = 0
+        self._waiting_priority = 0
+
+        self._condition = threading.Condition()
+
+    def _refill(self, now: float):
+        self._tokens = min(self.capacity, self._tokens + (now - self._last_refill) * self.capacity / self.window)
+        self._last_refill = now
+
+    def acquire(self, weight: float = 1, priority: bool = False, blocking: bool = True) -> bool:
+        with self._condition:
+            self._waiting += 1
+            if priority:
+                self._waiting_priority += 1
+
+            try:
+                while True:
+                    now = self._monotonic()
+                    self._refill(now)
+
+                    floor = 0 if priority else self._reserve
+                    needed = min(weight + floor, self.capacity)
+
+                    if now >= self._blocked_until:
+                        # Market data requests step aside as long as an order is waiting for the budget
+                        if (priority or self._waiting_priority == 0) and self._tokens >= needed:
+                            self._tokens -= weight
+                            return True
+                        wait = max((needed - self._tokens) * self.window / self.capacity, 0.01)
+                    else:
+                        wait = self._blocked_until - now
+
+                    if not blocking:
+                        return False
+
+                    self._condition.wait(wait)
+            finally:
+                self._waiting -= 1
+                if priority:
+                    self._waiting_priority -= 1
+                    self._condition.notify_all()
+
+    def sync(self, remaining: Optional[float] = None, used: Optional[float] = None, capacity: Optional[float] = None):
+        # The exchange counts the requests of every client sharing the key or the IP, its view is only trusted
+        # when it is lower than the local one
+        with self._condition:
+            self._refill(self._monotonic())
+
+            if capacity is not None and capacity != self.capacity:
+                self._reserve = self._reserve / self.capacity * capacity
+                self.capacity = capacity
+            if used is not None:
+                remaining = self.capacity - used
+            if remaining is not None:
+                self._tokens = min(self._tokens, max(remaining, 0))
+
+    def block(self, seconds: float):
+        with self._condition:
+            self._tokens = 0
+            self._blocked_until = max(self._blocked_until, self._monotonic() + seconds)
+
+        logger.warning("%s rate limit reached, requests paused for %s seconds", self.name, seconds)
+
+    @property
+    def usage(self) -> Dict[str, float]:
+        with self._condition:
+            now = self._monotonic()
+            self._refill(now)
+
+            return {
+                "capacity": self.capacity,
+                "available": self._tokens,
+                "used_pct": round((1 - self._tokens / self.capacity) * 100, 2),
+                "waiting": self._waiting,
+                "blocked_for": max(self._blocked_until - now, 0),
+            }
@@ -0,0 +1,76 @@
+import logging
+import threading
+import time
+from typing import Callable, Dict, Hashable, Iterable, List, Set
+
+from constants import SUBSCRIPTION_SYNC_INTERVAL
+
+logger = logging.getLogger()
+
+
+class SubscriptionManager:
+    def __init__(self, name: str, send: Callable[[str, List[str]], bool], interval: float = SUBSCRIPTION_SYNC_INTERVAL):
+        self.name = name
+        self._send = send
+        self._interval = interval
+
+        # Topics wanted by every owner (the watchlist, a strategy...), a topic stays subscribed while one owner
+        # still needs it
+        self._owners: Dict[Hashable, Set[str]] = dict()
+        self.active: Set[str] = set()
+
+        self._lock = threading.RLock()
+        self.running = True
+
+        # Changes are not sent when they are made: the desired and active topics are compared on a fixed cadence,
+        # so a whole watchlist refresh or several strategies started together end up in one frame per operation
+        t = threading.Thread(target=self._sync_loop, name=f"{name}-subscriptions", daemon=True)
+        t.start()
+
+    @property
+    def desired(self) -> Set[str]:
+        with self._lock:
+            return set().union(*self._owners.values())
+
+    @property
+    def pending(self) -> bool:
+        with self._lock:
+            return self.desired != self.active
+
+    def replace(self, owner: Hashable, topics: Iterable[str]):
+        topics = set(topics)
+        with self._lock:
+            if len(topics) > 0:
+                self._owners[owner] = topics
+            else:
+                self._owners.pop(owner, None)
+
+    def reset(self):
+        # Called when the connection is lost, everything desired is subscribed again by the next sync()
+        with self._lock:
+            self.active.clear()
+
+    def _sync_loop(self):
+        while self.running:
+            time.sleep(self._interval)
+            try:
+                self.sync()
+            except Exception as e:
+                logger.error("%s: error while syncing subscriptions: %s", self.name, e)
+
+    def stop(self):
+        self.running = False
+
+    def sync(self):
+        with self._lock:
+            desired = self.desired
+
+            unsubscribe = sorted(self.active - desired)
+            if len(unsubscribe) > 0 and self._send("unsubscribe", unsubscribe):
+                logger.info("%s: unsubscribed from %s", self.name, ",".join(unsubscribe))
+                self.active.difference_update(unsubscribe)
+
+            subscribe = sorted(desired - self.active)
+            if len(subscribe) > 0 and self._send("subscribe", subscribe):
+                logger.info("%s: subscribed to %s", self.name, ",".join(subscribe))
+                self.active.update(subscribe)
@@ -0,0 +1,65 @@
+import logging
+from typing import Dict, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from constants import (
+    HTTP_POOL_SIZE,
+    HTTP_MAX_RETRIES,
+    HTTP_BACKOFF_FACTOR,
+    HTTP_RETRY_STATUSES,
+    HTTP_TIMEOUT,
+)
+from helpers.Methods import Methods
+
+logger = logging.getLogger()
+
+
+class HttpTransport:
+    def __init__(
+        self,
+        base_url: str,
+        headers: Optional[Dict] = None,
+        pool_size: int = HTTP_POOL_SIZE,
+        max_retries: int = HTTP_MAX_RETRIES,
+        backoff_factor: float = HTTP_BACKOFF_FACTOR,
+        timeout: float = HTTP_TIMEOUT,
+    ):
+        self.base_url = base_url
+        self.timeout = timeout
+
+        # Connection errors are retried for every method since the request never reached the exchange,
+        # read errors and retryable statuses only for idempotent methods so an order is never sent twice
+        retries = Retry(
+            total=max_retries,
+            connect=max_retries,
+            read=max_retries,
+            status=max_retries,
+            backoff_factor=backoff_factor,
+            status_forcelist=HTTP_RETRY_STATUSES,
+            raise_on_status=False,
+        )
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retries)
+
+        self._session = requests.Session()
+        self._session.mount("https://", adapter)
+        self._session.mount("http://", adapter)
+        if headers is not None:
+            self._session.headers.update(headers)
+
+    def request(self, method: Methods, endpoint: str, params: Optional[Dict], headers: Optional[Dict] = None):
+        if method not in Methods.all():
+            raise ValueError(f"Accepted methods are {Methods.all()}")
+
+        return self._session.request(
+            method.value,
+            f"{self.base_url}{endpoint}",
+            params=params,
+            headers=headers,
+            timeout=self.timeout,
+        )
+
+    def close(self):
+        self._session.close()
@@ -0,0 +1,365 @@
+import json
+import logging
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Set, Tuple
+
+import websocket
+
+from constants import (
+    BINANCE_WS_MAX_STREAMS,
+    BINANCE_WS_MAX_CONNECTIONS,
+    BINANCE_WS_MESSAGES_PER_SECOND,
+    BINANCE_WS_REBALANCE_THRESHOLD,
+    BINANCE_WS_HANDOVER_GRACE,
+)
+
+logger = logging.getLogger()
+
+# Increasing id of the events of every channel, a stream delivered by two connections while it is moved is
+# de-duplicated with it
+EVENT_IDS = {"aggTrade": "a", "bookTicker": "u"}
+
+
+class _Connection:
+    def __init__(self, pool: "ShardedWebsocket", index: int):
+        self.pool = pool
+        self.index = index
+
+        # Streams assigned to this connection, subscribed again every time it (re)connects
+        self.streams: Set[str] = set()
+        self.pending_subscribe: Set[str] = set()
+        self.pending_unsubscribe: Set[str] = set()
+
+        # Frames sent with streams being moved, by request id, their acknowledgements drive the handover
+        self.requests: Dict[int, Tuple[str, Set[str]]] = dict()
+
+        self.connected = False
+        self.running = True
+
+        self.messages = 0
+        self._last_messages = 0
+        self.message_rate = 0.0
+
+        self.ws: Optional[websocket.WebSocketApp] = None
+        self.thread = threading.Thread(target=self._run, name=f"{pool.name}-ws-{index}", daemon=True)
+        self.thread.start()
+
+    def _run(self):
+        while self.running and self.pool.running:
+            self.ws = websocket.WebSocketApp(
+                self.pool.url,
+                on_open=self._on_open,
+                on_close=self._on_close,
+                on_error=self._on_error,
+                on_message=self._on_message,
+            )
+            try:
+                self.ws.run_forever()
+            except Exception as e:
+                logger.error("%s error in run_forever() method of connection %s: %s", self.pool.name, self.index, e)
+            time.sleep(2)
+
+    def _on_open(self, ws):
+        logger.info("%s connection %s opened", self.pool.name, self.index)
+        with self.pool.lock:
+            self.connected = True
+            self.pending_subscribe = set(self.streams)
+            self.pending_unsubscribe.clear()
+            self.requests.clear()
+
+    def _on_close(self, ws, *args):
+        logger.warning("%s connection %s closed", self.pool.name, self.index)
+        self.connected = False
+        self.pool.connection_closed(self)
+
+    def _on_error(self, ws, msg):
+        logger.error("%s connection %s error: %s", self.pool.name, self.index, msg)
+
+    def _on_message(self, ws, msg: str):
+        self.messages += 1
+        # Frames are only looked at while streams are being moved
+        if len(self.pool.moving) > 0 and not self.pool.accept(self, msg):
+            return
+        self.pool.on_message(ws, msg)
+
+    def update_rate(self, elapsed: float):
+        messages = self.messages
+        self.message_rate = (messages - self._last_messages) / elapsed
+        self._last_messages = messages
+
+    def close(self):
+        self.running = False
+        if self.ws is not None:
+            self.ws.close()
+
+
+class ShardedWebsocket:
+    def __init__(
+        self,
+        name: str,
+        url: str,
+        on_message: Callable,
+        max_streams: int = BINANCE_WS_MAX_STREAMS,
+        max_connections: int = BINANCE_WS_MAX_CONNECTIONS,
+        messages_per_second: float = BINANCE_WS_MESSAGES_PER_SECOND,
+        rebalance_threshold: int = BINANCE_WS_REBALANCE_THRESHOLD,
+    ):
+        self.name = name
+        self.url = url
+        self.on_message = on_message
+        self.max_streams = max_streams
+        self.max_connections = max_connections
+        self.messages_per_second = messages_per_second
+        self.rebalance_threshold = rebalance_threshold
+
+        self.running = True
+        self.lock = threading.RLock()
+
+        self._connections: List[_Connection] = []
+        self._stream_connection: Dict[str, _Connection] = dict()
+        self._request_id = 1
+
+        # Streams moved by rebalance() and the connection they were moved from, still subscribed there until the
+        # new connection acknowledged its own subscription, with the last event id delivered by either
+        self.moving: Dict[str, _Connection] = dict()
+        self._last_ids: Dict[str, int] = dict()
+        # Events sent before the unsubscription may still be on their way once it is acknowledged, the copies are
+        # dropped for a while longer
+        self._move_ends: Dict[str, float] = dict()
+
+        self._connections.append(_Connection(self, 0))
+
+        t = threading.Thread(target=self._send_pending, name=f"{name}-ws-sender", daemon=True)
+        t.start()
+
+    @property
+    def connected(self) -> bool:
+        return any(c.connected for c in self._connections)
+
+    @property
+    def streams(self) -> Set[str]:
+        with self.lock:
+            return set(self._stream_connection)
+
+    def _least_loaded(self) -> Optional[_Connection]:
+        candidates = [c for c in self._connections if len(c.streams) < self.max_streams]
+        if len(candidates) == 0:
+            if len(self._connections) >= self.max_connections:
+                return None
+            connection = _Connection(self, len(self._connections))
+            self._connections.append(connection)
+            return connection
+
+        return min(candidates, key=lambda c: len(c.streams))
+
+    def _assign(self, stream: str, connection: _Connection):
+        if self.moving.get(stream) is connection:
+            # Moved back before the handover ended, the stream is still subscribed there
+            self._end_move(stream)
+        connection.streams.add(stream)
+        if stream in connection.pending_unsubscribe:
+            connection.pending_unsubscribe.discard(stream)
+        else:
+            connection.pending_subscribe.add(stream)
+        self._stream_connection[stream] = connection
+
+    def _unassign(self, stream: str) -> _Connection:
+        if stream in self.moving:
+            source = self._end_move(stream)
+            if stream not in source.streams:
+                source.pending_unsubscribe.add(stream)
+
+        connection = self._stream_connection.pop(stream)
+        connection.streams.discard(stream)
+        if stream in connection.pending_subscribe:
+            connection.pending_subscribe.discard(stream)
+        else:
+            connection.pending_unsubscribe.add(stream)
+        return connection
+
+    def subscribe(self, streams: List[str]) -> bool:
+        with self.lock:
+            new_streams = [s for s in dict.fromkeys(streams) if s not in self._stream_connection]
+
+            # All or nothing: a batch partly assigned would leave streams subscribed on the sockets that the
+            # caller never records as active, so they would never be unsubscribed
+            free = sum(self.max_streams - len(c.streams) for c in self._connections)
+            free += (self.max_connections - len(self._connections)) * self.max_streams
+            if len(new_streams) > free:
+                logger.warning(
+                    "%s: %s connections of %s streams are full, cannot subscribe to %s more streams",
+                    self.name,
+                    self.max_connections,
+                    self.max_streams,
+                    len(new_streams),
+                )
+                return False
+
+            for stream in new_streams:
+                self._assign(stream, self._least_loaded())
+
+        return True
+
+    def unsubscribe(self, streams: List[str]) -> bool:
+        with self.lock:
+            for stream in streams:
+                if stream in self._stream_connection:
+                    self._unassign(stream)
+            self.rebalance()
+
+        return True
+
+    def rebalance(self):
+        # Unsubscriptions leave some connections nearly empty, streams are moved from the busiest ones when the
+        # gap gets large, which keeps the message rate of every socket in the same range
+        with self.lock:
+            while len(self._connections) > 1:
+                busiest = max(self._connections, key=lambda c: len(c.streams))
+                idlest = min(self._connections, key=lambda c: len(c.streams))
+                if len(busiest.streams) - len(idlest.streams) <= self.rebalance_threshold:
+                    break
+
+                movable = [s for s in busiest.streams if s not in self.moving]
+                count = min((len(busiest.streams) - len(idlest.streams)) // 2, len(movable))
+                if count == 0:
+                    break
+                for stream in movable[:count]:
+                    self._move(stream, idlest)
+
+    def _move(self, stream: str, target: _Connection):
+        # Make before break: the stream is subscribed on the target first and only unsubscribed from its
+        # connection once the target acknowledged it, so no event is lost in between. Both deliver the events
+        # sent meanwhile, the copies are dropped by accept()
+        source = self._stream_connection.pop(stream)
+        source.streams.discard(stream)
+        if stream in source.pending_subscribe or not source.connected:
+            source.pending_subscribe.discard(stream)
+        else:
+            self.moving[stream] = source
+
+        self._assign(stream, target)
+
+    def _end_move(self, stream: str) -> _Connection:
+        self._last_ids.pop(stream, None)
+        self._move_ends.pop(stream, None)
+        return self.moving.pop(stream)
+
+    def accept(self, connection: _Connection, msg: str) -> bool:
+        try:
+            data = json.loads(msg)
+        except ValueError:
+            return True
+
+        with self.lock:
+            if "e" not in data:
+                request = connection.requests.pop(data.get("id"), None)
+                if request is not None and "error" not in data:
+                    self._acknowledged(connection, *request)
+                return True
+
+            id_field = EVENT_IDS.get(data["e"])
+            if id_field is None or "s" not in data:
+                return True
+
+            stream = data["s"].lower() + "@" + data["e"]
+            if stream not in self.moving:
+                return True
+
+            last_id = self._last_ids.get(stream)
+            if last_id is not None and data[id_field] <= last_id:
+                return False
+            self._last_ids[stream] = data[id_field]
+            return True
+
+    def _acknowledged(self, connection: _Connection, method: str, streams: Set[str]):
+        for stream in streams:
+            source = self.moving.get(stream)
+            if source is None:
+                continue
+
+            if method == "SUBSCRIBE" and self._stream_connection.get(stream) is connection:
+                # The target delivers the stream, its previous connection can let go of it
+                if source.connected:
+                    source.pending_unsubscribe.add(stream)
+                else:
+                    self._end_move(stream)
+            elif method == "UNSUBSCRIBE" and source is connection:
+                self._move_ends[stream] = time.monotonic() + BINANCE_WS_HANDOVER_GRACE
+
+    def connection_closed(self, connection: _Connection):
+        # Nothing more comes from a closed connection, the streams it was handing over are only on their target
+        with self.lock:
+            for stream, source in list(self.moving.items()):
+                if source is connection:
+                    self._end_move(stream)
+
+    def _send(self, connection: _Connection, method: str, streams: Set[str]) -> Set[str]:
+        params = sorted(streams)[: self.max_streams]
+        data = {"method": method, "params": params, "id": self._request_id}
+
+        moving = {s for s in params if s in self.moving}
+        if len(moving) > 0:
+            connection.requests[self._request_id] = (method, moving)
+        self._request_id += 1
+
+        try:
+            connection.ws.send(json.dumps(data))
+        except Exception as e:
+            logger.error("%s connection %s error while sending %s: %s", self.name, connection.index, method, e)
+            return set()
+
+        logger.info("%s connection %s: %s %s", self.name, connection.index, method, ",".join(params))
+        return set(params)
+
+    def _send_pending(self):
+        # Every connection gets at most one frame per tick, pending changes are coalesced in the frame, which
+        # keeps each socket under the limit of incoming messages per second
+        interval = 1 / self.messages_per_second
+        last_rate_update = time.monotonic()
+
+        while self.running:
+            time.sleep(interval)
+
+            with self.lock:
+                for connection in self._connections:
+                    if not connection.connected or connection.ws is None:
+                        continue
+
+                    if len(connection.pending_unsubscribe) > 0:
+                        sent = self._send(connection, "UNSUBSCRIBE", connection.pending_unsubscribe)
+                        connection.pending_unsubscribe -= sent
+                    elif len(connection.pending_subscribe) > 0:
+                        sent = self._send(connection, "SUBSCRIBE", connection.pending_subscribe)
+                        connection.pending_subscribe -= sent
+
+                now = time.monotonic()
+                for stream, end in list(self._move_ends.items()):
+                    if now >= end:
+                        self._end_move(stream)
+
+            now = time.monotonic()
+            if now - last_rate_update >= 1:
+                for connection in self._connections:
+                    connection.update_rate(now - last_rate_update)
+                last_rate_update = now
+
+    def close(self):
+        self.running = False
+        for connection in self._connections:
+            connection.close()
+
+    @property
+    def metrics(self) -> List[Dict]:
+        with self.lock:
+            return [
+                {
+                    "connection": c.index,
+                    "connected": c.connected,
+                    "streams": len(c.streams),
+                    "pending": len(c.pending_subscribe) + len(c.pending_unsubscribe),
+                    "messages": c.messages,
+                    "message_rate": round(c.message_rate, 2),
+                }
+                for c in self._connections
+            ]
@@ -4,6 +4,35 @@ from dotenv import load_dotenv
 
 load_dotenv()
 
+# HTTP
+HTTP_POOL_SIZE = 10
+HTTP_MAX_RETRIES = 3
+HTTP_BACKOFF_FACTOR = 0.3
+HTTP_RETRY_STATUSES = (500, 502, 503, 504)
+HTTP_TIMEOUT = 10
+
+# Rate limits
+RATE_LIMIT_PRIORITY_RESERVE = 0.1
+
+# Websocket ingest
+INGEST_WORKERS = 2
+INGEST_QUEUE_SIZE = 10000
+
+# Unrealized PnL refresh, in seconds
+PNL_INTERVAL = 1
+
+# Websocket subscriptions, desired and active topics are compared and sent in batches every interval, in seconds
+SUBSCRIPTION_SYNC_INTERVAL = 1
+
+# Raw websocket frames recording, only enabled when a directory is set. Segments are rotated after a number of
+# uncompressed bytes or seconds, the oldest ones are deleted past the disk budget (compressed bytes)
+RECORDER_DIRECTORY = os.environ.get("RECORDER_DIRECTORY")
+RECORDER_SEGMENT_BYTES = 64 * 1024 * 1024
+RECORDER_SEGMENT_SECONDS = 3600
+RECORDER_MAX_BYTES = 2 * 1024 * 1024 * 1024
+RECORDER_QUEUE_SIZE = 100000
+RECORDER_FLUSH_INTERVAL = 1
+
 # Binance
 BINANCE_TESTNET_BASE_URL = "https://testnet.binancefuture.com"
 BINANCE_TESTNET_WS_URL = "wss://stream.binancefuture.com/ws"
@@ -15,6 +44,36 @@ BINANCE_HISTORIC_CANDLES_URL = "/fapi/v1/klines"
 BINANCE_BID_ASK_URL = "/fapi/v1/ticker/bookTicker"
 BINANCE_ORDER_URL = "/fapi/v1/order"
 BINANCE_ACCOUNT_URL = "/fapi/v1/account"
+BINANCE_LISTEN_KEY_URL = "/fapi/v1/listenKey"
+
+# A listen key expires after 60 minutes without keepalive
+BINANCE_LISTEN_KEY_KEEPALIVE = 30 * 60
+
+# Order updates of the user data stream kept for get_order_status, the oldest are dropped first
+BINANCE_ORDERS_CACHE_SIZE = 1000
+
+BINANCE_WEIGHT_LIMIT = 2400
+BINANCE_WEIGHT_WINDOW = 60
+BINANCE_REQUEST_WEIGHTS = {
+    BINANCE_CONTRACTS_URL: 1,
+    BINANCE_HISTORIC_CANDLES_URL: 5,
+    BINANCE_BID_ASK_URL: 2,
+    BINANCE_ORDER_URL: 1,
+    BINANCE_ACCOUNT_URL: 5,
+    BINANCE_LISTEN_KEY_URL: 1,
+}
+
+# Streams are spread over several websocket connections, each one accepts 200 streams and 10 incoming messages
+# per second, pings and pongs included
+BINANCE_WS_MAX_STREAMS = 200
+BINANCE_WS_MAX_CONNECTIONS = 10
+BINANCE_WS_MESSAGES_PER_SECOND = 5
+BINANCE_WS_REBALANCE_THRESHOLD = 50
+# Seconds a moved stream is still de-duplicated after its previous connection acknowledged the unsubscription
+BINANCE_WS_HANDOVER_GRACE = 1
+
+BINANCE_CANDLES_PAGE_SIZE = 1000
+BINANCE_HISTORY_WORKERS = 5
 
 BINANCE_TESTNET_API_KEY = os.environ.get("BINANCE_TESTNET_API_KEY")
 BINANCE_TESTNET_API_SECRET = os.environ.get("BINANCE_TESTNET_API_SECRET")
@@ -33,6 +92,29 @@ BITMEX_BALANCES_URL = "/api/v1/user/margin"
 BITMEX_HISTORIC_CANDLES_URL = "/api/v1/trade/bucketed"
 BITMEX_ORDER_URL = "/api/v1/order"
 
+# Orders types are given with the Binance names by the strategies
+BITMEX_ORDER_TYPES = {
+    "MARKET": "Market",
+    "LIMIT": "Limit",
+    "STOP_MARKET": "Stop",
+    "TAKE_PROFIT_MARKET": "MarketIfTouched",
+}
+
+# Private websocket tables and the columns identifying their rows
+BITMEX_PRIVATE_TABLES = {
+    "order": ["orderID"],
+    "execution": ["execID"],
+    "margin": ["account", "currency"],
+    "position": ["account", "symbol", "currency"],
+}
+BITMEX_EXECUTIONS_LIMIT = 1000
+
+BITMEX_REQUEST_LIMIT = 120
+BITMEX_REQUEST_WINDOW = 60
+
+BITMEX_CANDLES_PAGE_SIZE = 500
+BITMEX_HISTORY_WORKERS = 2
+
 
 TF_EQUIV = {
     "1m": 60,
@@ -42,3 +124,48 @@ TF_EQUIV = {
     "1h": 3600,
     "4h": 14400,
 }
+
+CANDLES_BUFFER_SIZE = 5000
+
+# Candle history pages whose request failed are asked again, a delay in seconds apart, before the range is given up
+CANDLES_PAGE_RETRIES = 2
+CANDLES_PAGE_RETRY_DELAY = 1
+
+# Candles loaded when a strategy starts, one page of history like before the cache: 1000 on Binance, 500 on Bitmex.
+# The buffer keeps growing up to CANDLES_BUFFER_SIZE while the strategy runs
+CANDLES_WARMUP_SIZE = {"Binance": BINANCE_CANDLES_PAGE_SIZE, "Bitmex": BITMEX_CANDLES_PAGE_SIZE}
+
+# Tick backtests stream the trades in chunks, the first candles are only used to warm the indicators up
+BACKTEST_TRADES_CHUNK_SIZE = 1000000
+BACKTEST_WARMUP_CANDLES = 100
+
+# Local stand-in exchange servers, latency and jitter in seconds
+MOCK_LATENCY = 0.0
+MOCK_JITTER = 0.0
+MOCK_TRADES_PER_SECOND = 20
+MOCK_BINANCE_BALANCE = 10000.0
+MOCK_BINANCE_FEE_RATE = 0.0004
+MOCK_BINANCE_SYMBOLS = {
+    "BTCUSDT": {
+        "baseAsset": "BTC",
+        "quoteAsset": "USDT",
+        "price": 30000.0,
+        "pricePrecision": 2,
+        "quantityPrecision": 3,
+    },
+    "ETHUSDT": {"baseAsset": "ETH", "quoteAsset": "USDT", "price": 2000.0, "pricePrecision": 2, "quantityPrecision": 3},
+}
+MOCK_BITMEX_BALANCE = 100000000
+MOCK_BITMEX_FEE_RATE = 0.00075
+MOCK_BITMEX_SYMBOLS = {
+    "XBTUSD": {
+        "rootSymbol": "XBT",
+        "quoteCurrency": "USD",
+        "price": 30000.0,
+        "tickSize": 0.5,
+        "lotSize": 100,
+        "multiplier": -100000000,
+        "isQuanto": False,
+        "isInverse": True,
+    },
+}
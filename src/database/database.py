@@ -1,5 +1,13 @@
+import logging
 import sqlite3
-from typing import Tuple, List
+import time
+from typing import List, Optional, Tuple
+
+from constants import TF_EQUIV
+from models.Candle import Candle
+from models.Contract import Contract
+
+logger = logging.getLogger()
 
 
 class WorkspaceData:
@@ -30,3 +38,126 @@ class WorkspaceData:
         data = self.cursor.fetchall()
 
         return data
+
+
+def _first_gap(candles: List[Candle], tf_equiv: int) -> Optional[int]:
+    for i in range(1, len(candles)):
+        if candles[i].timestamp - candles[i - 1].timestamp != tf_equiv:
+            return i
+    return None
+
+
+class CandleCache:
+    def __init__(self):
+        self.conn = sqlite3.connect("candles.db")
+        self.cursor = self.conn.cursor()
+
+        self.cursor.execute(
+            "CREATE TABLE IF NOT EXISTS candles (exchange TEXT, symbol TEXT, timeframe TEXT, timestamp INTEGER, "
+            "open REAL, high REAL, low REAL, close REAL, volume REAL, "
+            "PRIMARY KEY (exchange, symbol, timeframe, timestamp))"
+        )
+        self.conn.commit()
+
+    def get(self, exchange: str, symbol: str, timeframe: str, limit: int) -> List[Candle]:
+        self.cursor.execute(
+            "SELECT timestamp, open, high, low, close, volume FROM candles "
+            "WHERE exchange = ? AND symbol = ? AND timeframe = ? ORDER BY timestamp DESC LIMIT ?",
+            (exchange, symbol, timeframe, limit),
+        )
+
+        candles = []
+        for row in reversed(self.cursor.fetchall()):
+            candle_info = {
+                "ts": row[0],
+                "open": row[1],
+                "high": row[2],
+                "low": row[3],
+                "close": row[4],
+                "volume": row[5],
+            }
+            candles.append(Candle(candle_info, timeframe, "past_trade"))
+
+        return candles
+
+    def save(self, exchange: str, symbol: str, timeframe: str, candles: List[Candle]):
+        self.cursor.executemany(
+            "INSERT OR REPLACE INTO candles VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            [(exchange, symbol, timeframe, c.timestamp, c.open, c.high, c.low, c.close, c.volume) for c in candles],
+        )
+        self.conn.commit()
+
+    def load(self, client, contract: Contract, timeframe: str, limit: int) -> List[Candle]:
+        exchange = contract.exchange.name
+        tf_equiv = TF_EQUIV[timeframe] * 1000
+        now = int(time.time() * 1000)
+
+        cached = self.get(exchange, contract.symbol, timeframe, limit)
+        start = now - limit * tf_equiv
+
+        # Only the candles before a hole are trusted, the hole is fetched again with everything after it
+        gap = _first_gap(cached, tf_equiv)
+        if gap is not None:
+            cached = cached[:gap]
+
+        # The range end is exclusive, one more timeframe makes sure the running candle is part of it. Cached history
+        # older than the requested window is useless, the whole window is fetched in that case
+        if len(cached) == 0 or cached[-1].timestamp < start:
+            cached = []
+            ranges = [(start, now + tf_equiv)]
+        else:
+            ranges = [(cached[-1].timestamp, now + tf_equiv)]
+
+            # A cache filled with a smaller limit misses the beginning of the window
+            if len(cached) < limit and cached[0].timestamp > start:
+                ranges.insert(0, (start, cached[0].timestamp))
+
+        fresh = []
+        for range_start, range_end in ranges:
+            range_candles = client.get_historical_candles_range(contract, timeframe, range_start, range_end)
+            # The indicators would be warmed up on a history with holes, the strategy is not started instead
+            if range_candles is None:
+                return []
+            fresh.extend(range_candles)
+
+        candles = {c.timestamp: c for c in cached}
+        for c in fresh:
+            candles[c.timestamp] = c
+        candles = [candles[ts] for ts in sorted(candles)][-limit:]
+
+        if len(fresh) > 0:
+            # The last candle is still open, it is refetched next time instead of being cached. So is everything from
+            # a hole in the series, the cache only holds contiguous candles
+            cache_end = candles[-1].timestamp
+            gap = _first_gap(candles, tf_equiv)
+            if gap is not None:
+                cache_end = candles[gap].timestamp
+                logger.warning(
+                    "%s %s %s: candles missing after %s, the following ones are not cached",
+                    exchange,
+                    contract.symbol,
+                    timeframe,
+                    candles[gap - 1].timestamp,
+                )
+
+            self.save(exchange, contract.symbol, timeframe, [c for c in fresh if c.timestamp < cache_end])
+
+        logger.info(
+            "%s %s %s: %s candles from cache, %s fetched",
+            exchange,
+            contract.symbol,
+            timeframe,
+            len(cached),
+            len(fresh),
+        )
+        if len(candles) < limit:
+            logger.warning(
+                "%s %s %s: only %s candles of history out of %s",
+                exchange,
+                contract.symbol,
+                timeframe,
+                len(candles),
+                limit,
+            )
+
+        return candles
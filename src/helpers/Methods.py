@@ -4,8 +4,9 @@ from enum import Enum, auto
 class Methods(Enum):
     GET = "GET"
     POST = "POST"
+    PUT = "PUT"
     DELETE = "DELETE"
 
     @classmethod
     def all(cls) -> list:
-        return [cls.GET, cls.POST, cls.DELETE]
+        return [cls.GET, cls.POST, cls.PUT, cls.DELETE]
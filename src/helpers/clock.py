@@ -0,0 +1,89 @@
+import abc
+import heapq
+import itertools
+import threading
+import time
+from typing import Callable, List, Optional, Tuple
+
+
+class Clock(abc.ABC):
+    @abc.abstractmethod
+    def time(self) -> float:
+        pass
+
+    def time_ms(self) -> int:
+        return int(self.time() * 1000)
+
+    @abc.abstractmethod
+    def call_later(self, delay: float, callback: Callable):
+        pass
+
+
+class WallClock(Clock):
+    def time(self) -> float:
+        return time.time()
+
+    def call_later(self, delay: float, callback: Callable) -> threading.Timer:
+        t = threading.Timer(delay, callback)
+        t.start()
+        return t
+
+
+class _ScheduledCall:
+    def __init__(self, callback: Callable):
+        self.callback = callback
+        self.cancelled = False
+
+    def cancel(self):
+        self.cancelled = True
+
+
+class SimulatedClock(Clock):
+    def __init__(self, start: float = 0.0):
+        # Time only moves when advance() is called, the callbacks due until then run in the thread advancing it,
+        # so a simulation is as fast as the CPU allows and its timers fire in a deterministic order
+        self._now = start
+        self._scheduled: List[Tuple[float, int, _ScheduledCall]] = []
+        self._sequence = itertools.count()
+        self._lock = threading.Lock()
+
+    def time(self) -> float:
+        return self._now
+
+    def call_later(self, delay: float, callback: Callable) -> _ScheduledCall:
+        call = _ScheduledCall(callback)
+        with self._lock:
+            heapq.heappush(self._scheduled, (self._now + delay, next(self._sequence), call))
+        return call
+
+    def advance(self, to: float):
+        while True:
+            with self._lock:
+                if len(self._scheduled) == 0 or self._scheduled[0][0] > to:
+                    break
+                due, _, call = heapq.heappop(self._scheduled)
+                # Callbacks see the time they were scheduled for, and may schedule the next call from it
+                self._now = max(self._now, due)
+
+            if not call.cancelled:
+                call.callback()
+
+        self._now = max(self._now, to)
+
+    @property
+    def pending(self) -> int:
+        with self._lock:
+            return sum(1 for _, _, call in self._scheduled if not call.cancelled)
+
+
+class ReplayClock(SimulatedClock):
+    def __init__(self, start: Optional[float] = None):
+        super().__init__(start if start is not None else 0.0)
+        self.started = start is not None
+
+    def update(self, timestamp: int):
+        # Follows the receive time of the replayed frames, in milliseconds
+        if not self.started:
+            self._now = timestamp / 1000
+            self.started = True
+        self.advance(timestamp / 1000)
@@ -7,7 +7,9 @@ from constants import (
     BINANCE_TESTNET_API_SECRET,
     BITMEX_TESTNET_API_SECRET,
     BITMEX_TESTNET_API_KEY,
+    RECORDER_DIRECTORY,
 )
+from recording.recorder import MarketDataRecorder
 from ui.root_component import Root
 
 logger = logging.getLogger()
@@ -27,15 +29,20 @@ logger.addHandler(stream_handler)
 logger.addHandler(file_handler)
 
 if __name__ == "__main__":
+    # Both exchanges share the recorder, their frames are told apart by their source
+    recorder = MarketDataRecorder(RECORDER_DIRECTORY) if RECORDER_DIRECTORY is not None else None
+
     binance = BinanceFuturesClient(
         public_key=BINANCE_TESTNET_API_KEY,
         private_key=BINANCE_TESTNET_API_SECRET,
         testnet=True,
+        recorder=recorder,
     )
     bitmex = BitmexClient(
         public_key=BITMEX_TESTNET_API_KEY,
         private_key=BITMEX_TESTNET_API_SECRET,
         testnet=True,
+        recorder=recorder,
     )
 
     root = Root(binance, bitmex)
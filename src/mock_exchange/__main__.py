@@ -0,0 +1,35 @@
+import argparse
+import logging
+import time
+
+from mock_exchange.binance import MockBinanceServer
+from mock_exchange.bitmex import MockBitmexServer
+
+logger = logging.getLogger()
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s :: %(message)s")
+
+    parser = argparse.ArgumentParser(description="Local Binance Futures and Bitmex stand-ins")
+    parser.add_argument("--binance-port", type=int, default=8801)
+    parser.add_argument("--bitmex-port", type=int, default=8802)
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds added to every response and message")
+    parser.add_argument("--jitter", type=float, default=0.0, help="uniform random seconds added on top")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of REST requests answered with a 503")
+    parser.add_argument("--api-secret", default=None, help="check the request signatures against this secret")
+    args = parser.parse_args()
+
+    options = dict(latency=args.latency, jitter=args.jitter, error_rate=args.error_rate, api_secret=args.api_secret)
+    servers = [
+        MockBinanceServer(port=args.binance_port, **options).start(),
+        MockBitmexServer(port=args.bitmex_port, **options).start(),
+    ]
+    for server in servers:
+        logger.info("%s: base_url=%s wss_url=%s", server.name, server.base_url, server.wss_url)
+
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        for server in servers:
+            server.stop()
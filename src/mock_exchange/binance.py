@@ -0,0 +1,498 @@
+import hashlib
+import hmac
+import itertools
+import json
+import math
+import threading
+import time
+import uuid
+from collections import deque
+from typing import Deque, Dict, Optional, Set
+
+from constants import (
+    BINANCE_CONTRACTS_URL,
+    BINANCE_HISTORIC_CANDLES_URL,
+    BINANCE_BID_ASK_URL,
+    BINANCE_ORDER_URL,
+    BINANCE_ACCOUNT_URL,
+    BINANCE_LISTEN_KEY_URL,
+    BINANCE_REQUEST_WEIGHTS,
+    BINANCE_WEIGHT_LIMIT,
+    BINANCE_WEIGHT_WINDOW,
+    BINANCE_WS_MAX_STREAMS,
+    MOCK_BINANCE_BALANCE,
+    MOCK_BINANCE_FEE_RATE,
+    MOCK_BINANCE_SYMBOLS,
+    TF_EQUIV,
+)
+from mock_exchange.market import synthetic_candles, synthetic_price
+from mock_exchange.matching import MatchingEngine, MockOrder, OrderRejected
+from mock_exchange.server import MockExchangeServer, Request, Response
+from mock_exchange.websocket_server import WebsocketConnection
+
+# Connections sending more messages than this in a second are closed by Binance
+INCOMING_MESSAGES_PER_SECOND = 10
+
+ORDER_STATUSES = {"new": "NEW", "filled": "FILLED", "canceled": "CANCELED", "expired": "EXPIRED"}
+EXECUTION_TYPES = {"new": "NEW", "filled": "TRADE", "canceled": "CANCELED", "expired": "EXPIRED"}
+
+
+class MockBinanceServer(MockExchangeServer):
+    name = "Binance"
+    ws_path = "/ws"
+
+    def __init__(
+        self,
+        symbols: Optional[Dict[str, Dict]] = None,
+        balance: float = MOCK_BINANCE_BALANCE,
+        fee_rate: float = MOCK_BINANCE_FEE_RATE,
+        **kwargs,
+    ):
+        self.symbols = symbols if symbols is not None else MOCK_BINANCE_SYMBOLS
+
+        now = int(time.time() * 1000)
+        super().__init__(
+            {s: round(synthetic_price(info["price"], now), info["pricePrecision"]) for s, info in self.symbols.items()},
+            {s: 1 / pow(10, info["pricePrecision"]) for s, info in self.symbols.items()},
+            {s: 1 / pow(10, info["quantityPrecision"]) for s, info in self.symbols.items()},
+            **kwargs,
+        )
+
+        # USDT margined contracts: linear PnL and fees on the quote notional
+        self.engine = MatchingEngine(
+            balance,
+            lambda symbol, quantity, entry, exit_price: quantity * (exit_price - entry),
+            lambda symbol, quantity, price: quantity * price,
+            fee_rate,
+            on_order=self._on_order,
+            on_fill=self._on_fill,
+        )
+
+        self._lock = threading.Lock()
+        self._streams: Dict[str, Set[WebsocketConnection]] = dict()
+        self._connection_streams: Dict[WebsocketConnection, Set[str]] = dict()
+        self._connection_messages: Dict[WebsocketConnection, Deque[float]] = dict()
+        self._user_connections: Set[WebsocketConnection] = set()
+        self.listen_keys: Set[str] = set()
+
+        self._trade_ids = itertools.count(1)
+        self._update_ids = itertools.count(1)
+
+        self._weight_used = 0
+        self._weight_window = 0
+
+        self.routes = {
+            ("GET", BINANCE_CONTRACTS_URL): self._exchange_info,
+            ("GET", BINANCE_HISTORIC_CANDLES_URL): self._klines,
+            ("GET", BINANCE_BID_ASK_URL): self._book_ticker,
+            ("GET", BINANCE_ACCOUNT_URL): self._signed(self._account),
+            ("POST", BINANCE_ORDER_URL): self._signed(self._new_order),
+            ("DELETE", BINANCE_ORDER_URL): self._signed(self._cancel_order),
+            ("GET", BINANCE_ORDER_URL): self._signed(self._query_order),
+            ("POST", BINANCE_LISTEN_KEY_URL): self._new_listen_key,
+            ("PUT", BINANCE_LISTEN_KEY_URL): self._keep_listen_key,
+            ("DELETE", BINANCE_LISTEN_KEY_URL): self._keep_listen_key,
+        }
+
+    def handle_http(self, method: str, path: str, params: Dict, headers, raw_path: str) -> Response:
+        # The request weight of the last minute is returned with every response, like the exchange does
+        window = int(time.time() // BINANCE_WEIGHT_WINDOW)
+        with self._lock:
+            if window != self._weight_window:
+                self._weight_window = window
+                self._weight_used = 0
+            self._weight_used += BINANCE_REQUEST_WEIGHTS.get(path, 1)
+            used = self._weight_used
+
+        weight_headers = {"X-MBX-USED-WEIGHT-1M": str(used)}
+        if used > BINANCE_WEIGHT_LIMIT:
+            retry_after = BINANCE_WEIGHT_WINDOW - time.time() % BINANCE_WEIGHT_WINDOW
+            return (
+                429,
+                {"code": -1003, "msg": "Too many requests"},
+                dict(weight_headers, **{"Retry-After": str(int(retry_after) + 1)}),
+            )
+
+        status, body, response_headers = super().handle_http(method, path, params, headers, raw_path)
+        return status, body, dict(weight_headers, **response_headers)
+
+    def _signed(self, route):
+        def signed_route(request: Request) -> Response:
+            if self.api_secret is not None:
+                query = request.raw_path.split("?", 1)[1] if "?" in request.raw_path else ""
+                payload, _, signature = query.rpartition("&signature=")
+                expected = hmac.new(self.api_secret.encode(), payload.encode(), hashlib.sha256).hexdigest()
+                if not hmac.compare_digest(expected, signature):
+                    return 400, {"code": -1022, "msg": "Signature for this request is not valid."}, dict()
+            elif "timestamp" not in request.params:
+                return 400, {"code": -1102, "msg": "Mandatory parameter 'timestamp' was not sent."}, dict()
+            return route(request)
+
+        return signed_route
+
+    def _symbol(self, params: Dict) -> Optional[str]:
+        symbol = params.get("symbol")
+        return symbol if symbol in self.symbols else None
+
+    @staticmethod
+    def _invalid_symbol() -> Response:
+        return 400, {"code": -1121, "msg": "Invalid symbol."}, dict()
+
+    def _exchange_info(self, request: Request) -> Response:
+        symbols = []
+        for symbol, info in self.symbols.items():
+            symbols.append(
+                {
+                    "symbol": symbol,
+                    "pair": symbol,
+                    "contractType": "PERPETUAL",
+                    "status": "TRADING",
+                    "baseAsset": info["baseAsset"],
+                    "quoteAsset": info["quoteAsset"],
+                    "marginAsset": info["quoteAsset"],
+                    "pricePrecision": info["pricePrecision"],
+                    "quantityPrecision": info["quantityPrecision"],
+                }
+            )
+        return 200, {"timezone": "UTC", "serverTime": int(time.time() * 1000), "symbols": symbols}, dict()
+
+    def _klines(self, request: Request) -> Response:
+        symbol = self._symbol(request.params)
+        if symbol is None:
+            return self._invalid_symbol()
+        if request.params["interval"] not in TF_EQUIV:
+            return 400, {"code": -1120, "msg": "Invalid interval."}, dict()
+
+        interval = TF_EQUIV[request.params["interval"]] * 1000
+        limit = min(int(request.params.get("limit", 500)), 1500)
+        now = int(time.time() * 1000)
+        last = now - now % interval
+
+        # Candles opened from the start time, or the ones up to the end time (or now) when only it is given
+        if "endTime" in request.params:
+            end = int(request.params["endTime"])
+            last = min(last, end - end % interval)
+        if "startTime" in request.params:
+            first = math.ceil(int(request.params["startTime"]) / interval) * interval
+            count = max(0, min(limit, (last - first) // interval + 1))
+        else:
+            count = limit
+            first = last - (count - 1) * interval
+
+        rows = []
+        for open_time, o, h, l, c, v in synthetic_candles(self.symbols[symbol]["price"], interval, first, count):
+            rows.append(
+                [
+                    open_time,
+                    f"{o:.8f}",
+                    f"{h:.8f}",
+                    f"{l:.8f}",
+                    f"{c:.8f}",
+                    f"{v:.3f}",
+                    open_time + interval - 1,
+                    f"{v * c:.8f}",
+                    100,
+                    f"{v / 2:.3f}",
+                    f"{v * c / 2:.8f}",
+                    "0",
+                ]
+            )
+        return 200, rows, dict()
+
+    def _book_ticker_data(self, symbol: str) -> Dict:
+        price = self.market.prices[symbol]
+        bid, ask = self.engine.quotes.get(symbol, (price, price))
+        return {
+            "symbol": symbol,
+            "bidPrice": str(bid),
+            "bidQty": "1.000",
+            "askPrice": str(ask),
+            "askQty": "1.000",
+            "time": int(time.time() * 1000),
+        }
+
+    def _book_ticker(self, request: Request) -> Response:
+        if "symbol" not in request.params:
+            return 200, [self._book_ticker_data(s) for s in self.symbols], dict()
+
+        symbol = self._symbol(request.params)
+        if symbol is None:
+            return self._invalid_symbol()
+        return 200, self._book_ticker_data(symbol), dict()
+
+    def _balance_data(self) -> Dict:
+        unrealized_pnl = self.engine.unrealized_pnl()
+        balance = self.engine.balance
+        return {
+            "asset": "USDT",
+            "walletBalance": str(balance),
+            "unrealizedProfit": str(unrealized_pnl),
+            "marginBalance": str(balance + unrealized_pnl),
+            "maintMargin": "0",
+            "initialMargin": "0",
+            "positionInitialMargin": "0",
+            "openOrderInitialMargin": "0",
+            "crossWalletBalance": str(balance),
+            "crossUnPnl": str(unrealized_pnl),
+            "availableBalance": str(balance + unrealized_pnl),
+            "maxWithdrawAmount": str(balance),
+        }
+
+    def _account(self, request: Request) -> Response:
+        positions = [
+            {"symbol": symbol, "positionAmt": str(p.quantity), "entryPrice": str(p.entry_price), "positionSide": "BOTH"}
+            for symbol, p in self.engine.positions.items()
+        ]
+        return 200, {"assets": [self._balance_data()], "positions": positions}, dict()
+
+    @staticmethod
+    def _order_data(order: MockOrder) -> Dict:
+        return {
+            "orderId": order.order_id,
+            "symbol": order.symbol,
+            "status": ORDER_STATUSES[order.status],
+            "clientOrderId": f"mock_{order.order_id}",
+            "price": str(order.price or 0),
+            "avgPrice": str(order.avg_price),
+            "origQty": str(order.quantity),
+            "executedQty": str(order.filled),
+            "cumQuote": str(order.filled * order.avg_price),
+            "timeInForce": "GTC",
+            "type": order.order_type,
+            "origType": order.order_type,
+            "reduceOnly": order.reduce_only,
+            "side": order.side.upper(),
+            "positionSide": "BOTH",
+            "stopPrice": str(order.stop_price or 0),
+            "updateTime": order.update_time,
+        }
+
+    def _new_order(self, request: Request) -> Response:
+        symbol = self._symbol(request.params)
+        if symbol is None:
+            return self._invalid_symbol()
+
+        try:
+            order = self.engine.submit(
+                symbol,
+                request.params["side"].lower(),
+                request.params["type"],
+                float(request.params["quantity"]),
+                int(time.time() * 1000),
+                price=float(request.params["price"]) if "price" in request.params else None,
+                stop_price=float(request.params["stopPrice"]) if "stopPrice" in request.params else None,
+                reduce_only=request.params.get("reduceOnly", "false").lower() == "true",
+            )
+        except OrderRejected as e:
+            code = -2021 if "trigger" in str(e) else -2010
+            return 400, {"code": code, "msg": str(e)}, dict()
+
+        return 200, self._order_data(order), dict()
+
+    def _find_order(self, params: Dict) -> Optional[MockOrder]:
+        order = self.engine.orders.get(int(params["orderId"]))
+        if order is None or order.symbol != params.get("symbol"):
+            return None
+        return order
+
+    def _cancel_order(self, request: Request) -> Response:
+        order = self._find_order(request.params)
+        if order is None:
+            return 400, {"code": -2011, "msg": "Unknown order sent."}, dict()
+
+        self.engine.cancel(order.order_id, int(time.time() * 1000))
+        return 200, self._order_data(order), dict()
+
+    def _query_order(self, request: Request) -> Response:
+        order = self._find_order(request.params)
+        if order is None:
+            return 400, {"code": -2013, "msg": "Order does not exist."}, dict()
+        return 200, self._order_data(order), dict()
+
+    def _new_listen_key(self, request: Request) -> Response:
+        listen_key = uuid.uuid4().hex
+        self.listen_keys.add(listen_key)
+        return 200, {"listenKey": listen_key}, dict()
+
+    def _keep_listen_key(self, request: Request) -> Response:
+        return 200, dict(), dict()
+
+    def expire_listen_keys(self):
+        # Failover tests: the user data streams are told their key expired, as if no keepalive had been received
+        self.listen_keys.clear()
+        self._send_user({"e": "listenKeyExpired", "E": int(time.time() * 1000)})
+
+    @staticmethod
+    def _dumps(data: Dict) -> str:
+        return json.dumps(data, separators=(",", ":"))
+
+    def _publish(self, stream: str, data: Dict):
+        with self._lock:
+            connections = tuple(self._streams.get(stream, ()))
+        if len(connections) == 0:
+            return
+
+        msg = self._dumps(data)
+        for connection in connections:
+            connection.send(msg)
+
+    def _on_market_quote(self, symbol: str, bid: float, ask: float, timestamp: int):
+        self.engine.update_quote(symbol, bid, ask)
+        self._publish(
+            f"{symbol.lower()}@bookTicker",
+            {
+                "e": "bookTicker",
+                "u": next(self._update_ids),
+                "E": timestamp,
+                "T": timestamp,
+                "s": symbol,
+                "b": str(bid),
+                "B": "1.000",
+                "a": str(ask),
+                "A": "1.000",
+            },
+        )
+
+    def _on_market_trade(self, symbol: str, price: float, size: float, side: str, timestamp: int):
+        trade_id = next(self._trade_ids)
+        self._publish(
+            f"{symbol.lower()}@aggTrade",
+            {
+                "e": "aggTrade",
+                "E": timestamp,
+                "a": trade_id,
+                "s": symbol,
+                "p": str(price),
+                "q": str(size),
+                "f": trade_id,
+                "l": trade_id,
+                "T": timestamp,
+                "m": side == "sell",
+            },
+        )
+        self.engine.update_trade(symbol, price, timestamp)
+
+    def _send_user(self, data: Dict):
+        msg = self._dumps(data)
+        with self._lock:
+            connections = tuple(self._user_connections)
+        for connection in connections:
+            connection.send(msg)
+
+    def _on_order(self, order: MockOrder):
+        now = int(time.time() * 1000)
+        self._send_user(
+            {
+                "e": "ORDER_TRADE_UPDATE",
+                "E": now,
+                "T": now,
+                "o": {
+                    "s": order.symbol,
+                    "c": f"mock_{order.order_id}",
+                    "S": order.side.upper(),
+                    "o": order.order_type,
+                    "f": "GTC",
+                    "q": str(order.quantity),
+                    "p": str(order.price or 0),
+                    "ap": str(order.avg_price),
+                    "sp": str(order.stop_price or 0),
+                    "x": EXECUTION_TYPES[order.status],
+                    "X": ORDER_STATUSES[order.status],
+                    "i": order.order_id,
+                    "l": str(order.filled if order.status == "filled" else 0),
+                    "z": str(order.filled),
+                    "L": str(order.last_price),
+                    "T": order.update_time,
+                    "R": order.reduce_only,
+                    "ps": "BOTH",
+                },
+            }
+        )
+
+    def _on_fill(self, order: MockOrder, quantity: float, price: float):
+        now = int(time.time() * 1000)
+        position = self.engine.positions[order.symbol]
+        balance = self._balance_data()
+        self._send_user(
+            {
+                "e": "ACCOUNT_UPDATE",
+                "E": now,
+                "T": now,
+                "a": {
+                    "m": "ORDER",
+                    "B": [{"a": "USDT", "wb": balance["walletBalance"], "cw": balance["crossWalletBalance"]}],
+                    "P": [
+                        {
+                            "s": order.symbol,
+                            "pa": str(position.quantity),
+                            "ep": str(position.entry_price),
+                            "up": "0",
+                            "mt": "cross",
+                            "ps": "BOTH",
+                        }
+                    ],
+                },
+            }
+        )
+
+    def on_ws_open(self, connection: WebsocketConnection):
+        path = connection.path.rstrip("/")
+        if path == self.ws_path:
+            with self._lock:
+                self._connection_streams[connection] = set()
+                self._connection_messages[connection] = deque()
+            return
+
+        listen_key = path[len(self.ws_path) + 1 :]
+        if listen_key in self.listen_keys:
+            with self._lock:
+                self._user_connections.add(connection)
+        else:
+            connection.close(1008)
+
+    def on_ws_message(self, connection: WebsocketConnection, data: Dict):
+        if connection not in self._connection_streams:
+            return
+
+        # More than 10 incoming messages in a second and the exchange drops the connection
+        messages = self._connection_messages[connection]
+        now = time.monotonic()
+        messages.append(now)
+        while messages[0] < now - 1:
+            messages.popleft()
+        if len(messages) > INCOMING_MESSAGES_PER_SECOND:
+            connection.close(1008)
+            return
+
+        method = data["method"]
+        streams = self._connection_streams[connection]
+        with self._lock:
+            if method == "SUBSCRIBE":
+                if len(streams | set(data["params"])) > BINANCE_WS_MAX_STREAMS:
+                    connection.send(
+                        self._dumps({"error": {"code": 2, "msg": "Too many streams"}, "id": data.get("id")})
+                    )
+                    return
+                for stream in data["params"]:
+                    streams.add(stream)
+                    self._streams.setdefault(stream, set()).add(connection)
+                result = None
+            elif method == "UNSUBSCRIBE":
+                for stream in data["params"]:
+                    streams.discard(stream)
+                    self._streams.get(stream, set()).discard(connection)
+                result = None
+            elif method == "LIST_SUBSCRIPTIONS":
+                result = sorted(streams)
+            else:
+                connection.send(self._dumps({"error": {"code": 1, "msg": "Invalid method"}, "id": data.get("id")}))
+                return
+
+        connection.send(self._dumps({"result": result, "id": data.get("id")}))
+
+    def on_ws_close(self, connection: WebsocketConnection):
+        with self._lock:
+            self._user_connections.discard(connection)
+            for stream in self._connection_streams.pop(connection, set()):
+                self._streams.get(stream, set()).discard(connection)
+            self._connection_messages.pop(connection, None)
@@ -0,0 +1,499 @@
+import datetime
+import hashlib
+import hmac
+import json
+import math
+import threading
+import time
+import uuid
+from typing import Dict, List, Optional, Set
+
+from constants import (
+    BITMEX_CONTRACTS_URL,
+    BITMEX_BALANCES_URL,
+    BITMEX_HISTORIC_CANDLES_URL,
+    BITMEX_ORDER_URL,
+    BITMEX_ORDER_TYPES,
+    BITMEX_PRIVATE_TABLES,
+    BITMEX_REQUEST_LIMIT,
+    BITMEX_REQUEST_WINDOW,
+    MOCK_BITMEX_BALANCE,
+    MOCK_BITMEX_FEE_RATE,
+    MOCK_BITMEX_SYMBOLS,
+)
+from mock_exchange.market import synthetic_candles, synthetic_price
+from mock_exchange.matching import MatchingEngine, MockOrder, OrderRejected
+from mock_exchange.server import MockExchangeServer, Request, Response
+from mock_exchange.websocket_server import WebsocketConnection
+
+BIN_SIZES = {"1m": 60000, "5m": 300000, "1h": 3600000, "1d": 86400000}
+
+ORDER_TYPES = {v: k for k, v in BITMEX_ORDER_TYPES.items()}
+ORDER_STATUSES = {"new": "New", "filled": "Filled", "canceled": "Canceled", "expired": "Canceled"}
+
+ACCOUNT = 1
+
+
+def _iso(timestamp: int) -> str:
+    return time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(timestamp // 1000)) + f".{timestamp % 1000:03d}Z"
+
+
+def _parse_iso(timestamp: str) -> int:
+    return int(datetime.datetime.fromisoformat(timestamp.replace("Z", "+00:00")).timestamp() * 1000)
+
+
+def _order_uuid(order_id: int) -> str:
+    # Bitmex order ids are UUIDs, the ones of the matching engine are integers
+    return str(uuid.UUID(int=order_id))
+
+
+class MockBitmexServer(MockExchangeServer):
+    name = "Bitmex"
+    ws_path = "/realtime"
+
+    def __init__(
+        self,
+        symbols: Optional[Dict[str, Dict]] = None,
+        balance: int = MOCK_BITMEX_BALANCE,
+        fee_rate: float = MOCK_BITMEX_FEE_RATE,
+        **kwargs,
+    ):
+        self.symbols = symbols if symbols is not None else MOCK_BITMEX_SYMBOLS
+
+        now = int(time.time() * 1000)
+        super().__init__(
+            {
+                s: round(synthetic_price(info["price"], now) / info["tickSize"]) * info["tickSize"]
+                for s, info in self.symbols.items()
+            },
+            {s: info["tickSize"] for s, info in self.symbols.items()},
+            {s: info["lotSize"] for s, info in self.symbols.items()},
+            **kwargs,
+        )
+
+        # Balances and PnL in satoshis (XBt), inverse or linear depending on the contract
+        self.engine = MatchingEngine(
+            balance,
+            self._pnl,
+            self._notional,
+            fee_rate,
+            on_order=self._on_order,
+            on_fill=self._on_fill,
+        )
+
+        self._lock = threading.Lock()
+        self._topics: Dict[str, Set[WebsocketConnection]] = dict()
+        self._connection_topics: Dict[WebsocketConnection, Set[str]] = dict()
+        self._authenticated: Set[WebsocketConnection] = set()
+        self._inserted: Set[int] = set()
+
+        self._requests_used = 0
+        self._requests_window = 0
+
+        self.routes = {
+            ("GET", BITMEX_CONTRACTS_URL): self._instruments,
+            ("GET", BITMEX_BALANCES_URL): self._authenticated_route(self._margin),
+            ("GET", BITMEX_HISTORIC_CANDLES_URL): self._bucketed_trades,
+            ("POST", BITMEX_ORDER_URL): self._authenticated_route(self._new_order),
+            ("DELETE", BITMEX_ORDER_URL): self._authenticated_route(self._cancel_order),
+            ("GET", BITMEX_ORDER_URL): self._authenticated_route(self._orders),
+        }
+
+    def _pnl(self, symbol: str, quantity: float, entry: float, exit_price: float) -> float:
+        info = self.symbols[symbol]
+        if info["isInverse"]:
+            return quantity * info["multiplier"] * (1 / exit_price - 1 / entry)
+        return quantity * info["multiplier"] * (exit_price - entry)
+
+    def _notional(self, symbol: str, quantity: float, price: float) -> float:
+        info = self.symbols[symbol]
+        if info["isInverse"]:
+            return abs(quantity * info["multiplier"] / price)
+        return abs(quantity * info["multiplier"] * price)
+
+    def handle_http(self, method: str, path: str, params: Dict, headers, raw_path: str) -> Response:
+        window = int(time.time() // BITMEX_REQUEST_WINDOW)
+        with self._lock:
+            if window != self._requests_window:
+                self._requests_window = window
+                self._requests_used = 0
+            self._requests_used += 1
+            remaining = BITMEX_REQUEST_LIMIT - self._requests_used
+
+        reset = (window + 1) * BITMEX_REQUEST_WINDOW
+        limit_headers = {
+            "x-ratelimit-limit": str(BITMEX_REQUEST_LIMIT),
+            "x-ratelimit-remaining": str(max(0, remaining)),
+            "x-ratelimit-reset": str(reset),
+        }
+        if remaining < 0:
+            return (
+                429,
+                {"error": {"message": "Rate limit exceeded", "name": "RateLimitError"}},
+                dict(limit_headers, **{"Retry-After": str(int(reset - time.time()) + 1)}),
+            )
+
+        status, body, response_headers = super().handle_http(method, path, params, headers, raw_path)
+        return status, body, dict(limit_headers, **response_headers)
+
+    def _check_signature(self, verb: str, path: str, expires: str, signature: str) -> Optional[str]:
+        if self.api_secret is None:
+            return None
+        if expires is None or int(expires) < time.time():
+            return "This request has expired"
+
+        expected = hmac.new(self.api_secret.encode(), f"{verb}{path}{expires}".encode(), hashlib.sha256).hexdigest()
+        if signature is None or not hmac.compare_digest(expected, signature):
+            return "Signature not valid."
+        return None
+
+    def _authenticated_route(self, route):
+        def authenticated_route(request: Request) -> Response:
+            error = self._check_signature(
+                request.method,
+                request.raw_path,
+                request.headers.get("api-expires"),
+                request.headers.get("api-signature"),
+            )
+            if error is not None:
+                return 401, {"error": {"message": error, "name": "HTTPError"}}, dict()
+            return route(request)
+
+        return authenticated_route
+
+    @staticmethod
+    def _error(message: str, status: int = 400) -> Response:
+        return status, {"error": {"message": message, "name": "HTTPError"}}, dict()
+
+    def _instruments(self, request: Request) -> Response:
+        instruments = []
+        for symbol, info in self.symbols.items():
+            price = self.market.prices[symbol]
+            bid, ask = self.engine.quotes.get(symbol, (price, price))
+            instruments.append(
+                {
+                    "symbol": symbol,
+                    "rootSymbol": info["rootSymbol"],
+                    "state": "Open",
+                    "typ": "FFWCSX",
+                    "quoteCurrency": info["quoteCurrency"],
+                    "settlCurrency": "XBt",
+                    "tickSize": info["tickSize"],
+                    "lotSize": info["lotSize"],
+                    "multiplier": info["multiplier"],
+                    "isQuanto": info["isQuanto"],
+                    "isInverse": info["isInverse"],
+                    "lastPrice": price,
+                    "bidPrice": bid,
+                    "askPrice": ask,
+                }
+            )
+        return 200, instruments, dict()
+
+    def _margin_data(self) -> Dict:
+        unrealised_pnl = int(self.engine.unrealized_pnl())
+        balance = int(self.engine.balance)
+        return {
+            "account": ACCOUNT,
+            "currency": "XBt",
+            "walletBalance": balance,
+            "marginBalance": balance + unrealised_pnl,
+            "availableMargin": balance + unrealised_pnl,
+            "initMargin": 0,
+            "maintMargin": 0,
+            "unrealisedPnl": unrealised_pnl,
+            "timestamp": _iso(int(time.time() * 1000)),
+        }
+
+    def _margin(self, request: Request) -> Response:
+        return 200, [self._margin_data()], dict()
+
+    def _bucketed_trades(self, request: Request) -> Response:
+        symbol = request.params.get("symbol")
+        if symbol not in self.symbols:
+            return self._error(f"Unknown symbol {symbol}")
+        if request.params.get("binSize") not in BIN_SIZES:
+            return self._error("binSize must be one of 1m, 5m, 1h, 1d")
+
+        interval = BIN_SIZES[request.params["binSize"]]
+        count = min(int(request.params.get("count", 100)), 1000)
+        reverse = request.params.get("reverse", "false").lower() == "true"
+        partial = request.params.get("partial", "false").lower() == "true"
+
+        # Buckets are timestamped with their close time, the one still open is only sent when partial is asked for
+        now = int(time.time() * 1000)
+        last = now - now % interval + (interval if partial else 0)
+        if "endTime" in request.params:
+            end = _parse_iso(request.params["endTime"])
+            last = min(last, end - end % interval)
+
+        if "startTime" in request.params:
+            first = math.ceil(_parse_iso(request.params["startTime"]) / interval) * interval
+            count = max(0, min(count, (last - first) // interval + 1))
+        else:
+            first = last - (count - 1) * interval
+
+        rows = []
+        for open_time, o, h, l, c, v in synthetic_candles(
+            self.symbols[symbol]["price"], interval, first - interval, count
+        ):
+            rows.append(
+                {
+                    "timestamp": _iso(open_time + interval),
+                    "symbol": symbol,
+                    "open": o,
+                    "high": h,
+                    "low": l,
+                    "close": c,
+                    "trades": 100,
+                    "volume": int(v * 1000),
+                    "vwap": (h + l) / 2,
+                }
+            )
+        if reverse:
+            rows.reverse()
+        return 200, rows, dict()
+
+    def _order_data(self, order: MockOrder) -> Dict:
+        return {
+            "orderID": _order_uuid(order.order_id),
+            "clOrdID": "",
+            "account": ACCOUNT,
+            "symbol": order.symbol,
+            "side": order.side.capitalize(),
+            "orderQty": order.quantity,
+            "price": order.price,
+            "stopPx": order.stop_price,
+            "ordType": BITMEX_ORDER_TYPES[order.order_type],
+            "execInst": "ReduceOnly" if order.reduce_only else "",
+            "ordStatus": ORDER_STATUSES[order.status],
+            "avgPx": order.avg_price if order.filled > 0 else None,
+            "cumQty": order.filled,
+            "leavesQty": order.quantity - order.filled if order.status == "new" else 0,
+            "text": "ReduceOnly order would increase the position" if order.status == "expired" else "",
+            "timestamp": _iso(order.update_time),
+            "transactTime": _iso(order.update_time),
+        }
+
+    def _new_order(self, request: Request) -> Response:
+        symbol = request.params.get("symbol")
+        if symbol not in self.symbols:
+            return self._error(f"Unknown symbol {symbol}")
+        if request.params.get("ordType", "Limit") not in ORDER_TYPES:
+            return self._error(f"Unsupported ordType {request.params.get('ordType')}")
+
+        try:
+            order = self.engine.submit(
+                symbol,
+                request.params["side"].lower(),
+                ORDER_TYPES[request.params.get("ordType", "Limit")],
+                float(request.params["orderQty"]),
+                int(time.time() * 1000),
+                price=float(request.params["price"]) if "price" in request.params else None,
+                stop_price=float(request.params["stopPx"]) if "stopPx" in request.params else None,
+                reduce_only="ReduceOnly" in request.params.get("execInst", ""),
+            )
+        except OrderRejected as e:
+            return self._error(str(e))
+
+        return 200, self._order_data(order), dict()
+
+    def _cancel_order(self, request: Request) -> Response:
+        try:
+            order_id = uuid.UUID(request.params["orderID"]).int
+        except ValueError:
+            return self._error("Invalid orderID")
+
+        order = self.engine.cancel(order_id, int(time.time() * 1000))
+        if order is None:
+            return self._error("Not Found", 404)
+        return 200, [self._order_data(order)], dict()
+
+    def _orders(self, request: Request) -> Response:
+        orders = [o for o in self.engine.orders.values() if o.symbol == request.params.get("symbol", o.symbol)]
+        if request.params.get("reverse", "false").lower() == "true":
+            orders.reverse()
+        count = min(int(request.params.get("count", 100)), 500)
+        return 200, [self._order_data(o) for o in orders[:count]], dict()
+
+    @staticmethod
+    def _dumps(data: Dict) -> str:
+        return json.dumps(data, separators=(",", ":"))
+
+    def _publish(self, topic: str, data: Dict):
+        with self._lock:
+            connections = tuple(self._topics.get(topic, ()))
+        if len(connections) == 0:
+            return
+
+        msg = self._dumps(data)
+        for connection in connections:
+            connection.send(msg)
+
+    def _on_market_quote(self, symbol: str, bid: float, ask: float, timestamp: int):
+        self.engine.update_quote(symbol, bid, ask)
+        self._publish(f"quote:{symbol}", {"table": "quote", "action": "insert", "data": [self._quote_row(symbol)]})
+
+    def _quote_row(self, symbol: str) -> Dict:
+        price = self.market.prices[symbol]
+        bid, ask = self.engine.quotes.get(symbol, (price, price))
+        return {
+            "timestamp": _iso(int(time.time() * 1000)),
+            "symbol": symbol,
+            "bidSize": 1000,
+            "bidPrice": bid,
+            "askPrice": ask,
+            "askSize": 1000,
+        }
+
+    def _on_market_trade(self, symbol: str, price: float, size: float, side: str, timestamp: int):
+        row = {
+            "timestamp": _iso(timestamp),
+            "symbol": symbol,
+            "side": side.capitalize(),
+            "size": size,
+            "price": price,
+            "tickDirection": "ZeroPlusTick",
+            "trdMatchID": str(uuid.uuid4()),
+            "grossValue": int(self._notional(symbol, size, price)),
+            "homeNotional": self._notional(symbol, size, price) / 100000000,
+            "foreignNotional": size,
+        }
+        self._publish(f"trade:{symbol}", {"table": "trade", "action": "insert", "data": [row]})
+        self.engine.update_trade(symbol, price, timestamp)
+
+    def _position_rows(self, symbols: Optional[List[str]] = None) -> List[Dict]:
+        rows = []
+        for symbol, position in self.engine.positions.items():
+            if symbols is not None and symbol not in symbols:
+                continue
+            rows.append(
+                {
+                    "account": ACCOUNT,
+                    "symbol": symbol,
+                    "currency": "XBt",
+                    "currentQty": position.quantity,
+                    "avgEntryPrice": position.entry_price if position.quantity != 0 else None,
+                    "isOpen": position.quantity != 0,
+                }
+            )
+        return rows
+
+    def _on_order(self, order: MockOrder):
+        action = "update" if order.order_id in self._inserted else "insert"
+        self._inserted.add(order.order_id)
+        self._publish("order", {"table": "order", "action": action, "data": [self._order_data(order)]})
+
+    def _on_fill(self, order: MockOrder, quantity: float, price: float):
+        execution = {
+            "execID": str(uuid.uuid4()),
+            "orderID": _order_uuid(order.order_id),
+            "account": ACCOUNT,
+            "symbol": order.symbol,
+            "side": order.side.capitalize(),
+            "lastQty": quantity,
+            "lastPx": price,
+            "execType": "Trade",
+            "ordStatus": "Filled",
+            "timestamp": _iso(order.update_time),
+        }
+        self._publish("execution", {"table": "execution", "action": "insert", "data": [execution]})
+        self._publish("margin", {"table": "margin", "action": "update", "data": [self._margin_data()]})
+        self._publish(
+            "position", {"table": "position", "action": "update", "data": self._position_rows([order.symbol])}
+        )
+
+    def _partial(self, table: str, symbol: str) -> Dict:
+        if table == "order":
+            data = [self._order_data(o) for o in self.engine.open_orders()]
+        elif table == "execution":
+            data = []
+        elif table == "margin":
+            data = [self._margin_data()]
+        elif table == "position":
+            data = self._position_rows()
+        elif table == "quote":
+            data = [self._quote_row(symbol)]
+        else:
+            # The last trades are not sent again, they would be processed as new ones
+            data = []
+
+        return {
+            "table": table,
+            "action": "partial",
+            "keys": BITMEX_PRIVATE_TABLES.get(table, []),
+            "filter": {"account": ACCOUNT} if table in BITMEX_PRIVATE_TABLES else {"symbol": symbol},
+            "data": data,
+        }
+
+    def on_ws_open(self, connection: WebsocketConnection):
+        with self._lock:
+            self._connection_topics[connection] = set()
+
+        connection.send(
+            self._dumps(
+                {
+                    "info": "Welcome to the BitMEX Realtime API.",
+                    "version": "mock",
+                    "timestamp": _iso(int(time.time() * 1000)),
+                    "docs": "https://www.bitmex.com/app/wsAPI",
+                    "limit": {"remaining": 40},
+                }
+            )
+        )
+
+    def on_ws_message(self, connection: WebsocketConnection, data: Dict):
+        op = data["op"]
+        args = data.get("args", [])
+
+        if op == "authKeyExpires":
+            error = self._check_signature("GET", "/realtime", str(args[1]), args[2])
+            if error is not None:
+                connection.send(self._dumps({"status": 401, "error": error, "request": data}))
+                return
+            with self._lock:
+                self._authenticated.add(connection)
+            connection.send(self._dumps({"success": True, "request": data}))
+
+        elif op == "subscribe":
+            for topic in args:
+                table, _, symbol = topic.partition(":")
+                if table in BITMEX_PRIVATE_TABLES and connection not in self._authenticated:
+                    connection.send(
+                        self._dumps(
+                            {
+                                "status": 401,
+                                "error": "User requested an account-locked subscription but no authorization was "
+                                "provided.",
+                                "request": data,
+                            }
+                        )
+                    )
+                    continue
+                if table not in BITMEX_PRIVATE_TABLES and (
+                    table not in ("quote", "trade") or symbol not in self.symbols
+                ):
+                    connection.send(self._dumps({"status": 400, "error": f"Unknown table: {topic}", "request": data}))
+                    continue
+
+                with self._lock:
+                    self._topics.setdefault(topic, set()).add(connection)
+                    self._connection_topics[connection].add(topic)
+                connection.send(self._dumps({"success": True, "subscribe": topic, "request": data}))
+                connection.send(self._dumps(self._partial(table, symbol)))
+
+        elif op == "unsubscribe":
+            for topic in args:
+                with self._lock:
+                    self._topics.get(topic, set()).discard(connection)
+                    self._connection_topics[connection].discard(topic)
+                connection.send(self._dumps({"success": True, "unsubscribe": topic, "request": data}))
+
+        else:
+            connection.send(self._dumps({"status": 400, "error": f"Unknown or unsupported op {op}", "request": data}))
+
+    def on_ws_close(self, connection: WebsocketConnection):
+        with self._lock:
+            self._authenticated.discard(connection)
+            for topic in self._connection_topics.pop(connection, set()):
+                self._topics.get(topic, set()).discard(connection)
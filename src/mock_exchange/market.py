@@ -0,0 +1,94 @@
+import math
+import random
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+from constants import MOCK_TRADES_PER_SECOND
+
+
+def synthetic_price(base_price: float, timestamp: int) -> float:
+    # A smooth function of the time, every page of candles asked for the same range gets the same prices
+    hours = timestamp / 3600000
+    return base_price * (1 + 0.03 * math.sin(hours / 24 * 2 * math.pi) + 0.01 * math.sin(hours * 1.7))
+
+
+def synthetic_candles(
+    base_price: float, interval: int, start: int, count: int
+) -> List[Tuple[int, float, float, float, float, float]]:
+    # (open time, open, high, low, close, volume) of `count` candles of `interval` ms from the aligned `start`
+    candles = []
+    for i in range(count):
+        open_time = start + i * interval
+        open_price = synthetic_price(base_price, open_time)
+        close_price = synthetic_price(base_price, open_time + interval)
+        high = max(open_price, close_price) * 1.0005
+        low = min(open_price, close_price) * 0.9995
+        volume = 100 + 50 * math.sin(open_time / interval)
+        candles.append((open_time, open_price, high, low, close_price, volume))
+    return candles
+
+
+class MarketSimulator:
+    def __init__(
+        self,
+        prices: Dict[str, float],
+        tick_sizes: Dict[str, float],
+        lot_sizes: Dict[str, float],
+        on_trade: Callable[[str, float, float, str, int], None],
+        on_quote: Callable[[str, float, float, int], None],
+        trades_per_second: float = MOCK_TRADES_PER_SECOND,
+        seed: Optional[int] = None,
+    ):
+        # Random walk of every symbol, one trade at a time, the quote around the last price is published first
+        self.prices = dict(prices)
+        self._tick_sizes = tick_sizes
+        self._lot_sizes = lot_sizes
+        self._on_trade = on_trade
+        self._on_quote = on_quote
+        self.trades_per_second = trades_per_second
+        self._random = random.Random(seed)
+
+        self.running = False
+        self.trades = 0
+
+    def start(self):
+        self.running = True
+        t = threading.Thread(target=self._run, name="mock-market", daemon=True)
+        t.start()
+
+    def stop(self):
+        self.running = False
+
+    def step(self, symbol: str):
+        tick = self._tick_sizes[symbol]
+        price = max(tick, self.prices[symbol] + self._random.choice((-2, -1, -1, 0, 1, 1, 2)) * tick)
+        price = round(round(price / tick) * tick, 8)
+        self.prices[symbol] = price
+
+        timestamp = int(time.time() * 1000)
+        self._on_quote(symbol, round(price - tick, 8), price, timestamp)
+
+        side = "buy" if self._random.random() < 0.5 else "sell"
+        size = round(self._lot_sizes[symbol] * self._random.randint(1, 20), 8)
+        self._on_trade(symbol, price, size, side, timestamp)
+        self.trades += 1
+
+    def _run(self):
+        symbols = list(self.prices)
+        next_time = time.monotonic()
+        i = 0
+
+        while self.running:
+            if self.trades_per_second <= 0:
+                time.sleep(0.1)
+                next_time = time.monotonic()
+                continue
+
+            self.step(symbols[i % len(symbols)])
+            i += 1
+
+            next_time += 1 / self.trades_per_second
+            delay = next_time - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
@@ -0,0 +1,248 @@
+import itertools
+import threading
+from typing import Callable, Dict, List, Optional, Tuple
+
+MARKET = "MARKET"
+LIMIT = "LIMIT"
+STOP_MARKET = "STOP_MARKET"
+TAKE_PROFIT_MARKET = "TAKE_PROFIT_MARKET"
+
+
+class OrderRejected(Exception):
+    pass
+
+
+class MockOrder:
+    def __init__(
+        self,
+        order_id: int,
+        symbol: str,
+        side: str,
+        order_type: str,
+        quantity: float,
+        price: Optional[float],
+        stop_price: Optional[float],
+        reduce_only: bool,
+        timestamp: int,
+    ):
+        self.order_id = order_id
+        self.symbol = symbol
+        self.side = side
+        self.order_type = order_type
+        self.quantity = quantity
+        self.price = price
+        self.stop_price = stop_price
+        self.reduce_only = reduce_only
+        self.timestamp = timestamp
+
+        self.status = "new"
+        self.filled = 0.0
+        self.avg_price = 0.0
+        self.last_price = 0.0
+        self.update_time = timestamp
+
+
+class MockPosition:
+    def __init__(self):
+        # Signed quantity, negative when short
+        self.quantity = 0.0
+        self.entry_price = 0.0
+
+
+class MatchingEngine:
+    def __init__(
+        self,
+        balance: float,
+        pnl: Callable[[str, float, float, float], float],
+        notional: Callable[[str, float, float], float],
+        fee_rate: float = 0.0,
+        on_order: Optional[Callable[[MockOrder], None]] = None,
+        on_fill: Optional[Callable[[MockOrder, float, float], None]] = None,
+        slippage: float = 0.0,
+    ):
+        # There is no order book: market orders are filled at the best bid or ask of the simulated market, resting
+        # orders when a trade reaches their price. pnl(symbol, signed quantity, entry, exit) and notional(symbol,
+        # quantity, price) are in the balance currency, linear for Binance, inverse for Bitmex. Market and triggered
+        # orders are filled `slippage` (a fraction of the price) away from the bid or ask
+        self.balance = balance
+        self._pnl = pnl
+        self._notional = notional
+        self._fee_rate = fee_rate
+        self._slippage = slippage
+        self._on_order = on_order
+        self._on_fill = on_fill
+
+        self.quotes: Dict[str, Tuple[float, float]] = dict()
+        self.last_prices: Dict[str, float] = dict()
+        self.orders: Dict[int, MockOrder] = dict()
+        self.positions: Dict[str, MockPosition] = dict()
+        self._resting: Dict[str, List[MockOrder]] = dict()
+
+        self._ids = itertools.count(1)
+        self._lock = threading.RLock()
+
+    def submit(
+        self,
+        symbol: str,
+        side: str,
+        order_type: str,
+        quantity: float,
+        timestamp: int,
+        price: Optional[float] = None,
+        stop_price: Optional[float] = None,
+        reduce_only: bool = False,
+        order_id: Optional[int] = None,
+    ) -> MockOrder:
+        with self._lock:
+            if quantity <= 0:
+                raise OrderRejected("Quantity less than or equal to zero")
+            if order_type == LIMIT and price is None:
+                raise OrderRejected("Limit orders need a price")
+            if order_type in (STOP_MARKET, TAKE_PROFIT_MARKET):
+                if stop_price is None:
+                    raise OrderRejected("Stop orders need a stop price")
+                last = self.last_prices.get(symbol)
+                if last is not None and self._triggered(side, order_type, stop_price, last):
+                    raise OrderRejected("Order would immediately trigger")
+            if order_type == MARKET and self._market_price(symbol, side) is None:
+                raise OrderRejected("No market price")
+
+            # The caller can give the id when it has already handed it out, like a backtest with latency does
+            order = MockOrder(
+                order_id if order_id is not None else next(self._ids),
+                symbol,
+                side,
+                order_type,
+                quantity,
+                price,
+                stop_price,
+                reduce_only,
+                timestamp,
+            )
+            self.orders[order.order_id] = order
+            self._notify(order)
+
+            if order_type == MARKET:
+                self._fill(order, self._market_price(symbol, side), timestamp)
+            elif order_type == LIMIT and self._limit_crossed(order, self._market_price(symbol, side)):
+                self._fill(order, self._market_price(symbol, side), timestamp)
+            else:
+                self._resting.setdefault(symbol, []).append(order)
+
+            return order
+
+    def cancel(self, order_id: int, timestamp: int) -> Optional[MockOrder]:
+        with self._lock:
+            order = self.orders.get(order_id)
+            if order is None or order.status != "new":
+                return order
+
+            self._resting[order.symbol].remove(order)
+            order.status = "canceled"
+            order.update_time = timestamp
+            self._notify(order)
+            return order
+
+    def open_orders(self, symbol: Optional[str] = None) -> List[MockOrder]:
+        with self._lock:
+            return [o for o in self.orders.values() if o.status == "new" and (symbol is None or o.symbol == symbol)]
+
+    def update_quote(self, symbol: str, bid: float, ask: float):
+        with self._lock:
+            self.quotes[symbol] = (bid, ask)
+
+    def update_trade(self, symbol: str, price: float, timestamp: int):
+        with self._lock:
+            self.last_prices[symbol] = price
+
+            for order in list(self._resting.get(symbol, [])):
+                if order.order_type == LIMIT:
+                    if self._limit_crossed(order, price):
+                        self._resting[symbol].remove(order)
+                        self._fill(order, order.price, timestamp)
+                elif self._triggered(order.side, order.order_type, order.stop_price, price):
+                    # Triggered stops become market orders
+                    self._resting[symbol].remove(order)
+                    self._fill(order, self._market_price(symbol, order.side), timestamp)
+
+    def unrealized_pnl(self) -> float:
+        with self._lock:
+            pnl = 0.0
+            for symbol, position in self.positions.items():
+                last = self.last_prices.get(symbol)
+                if position.quantity != 0 and last is not None:
+                    pnl += self._pnl(symbol, position.quantity, position.entry_price, last)
+            return pnl
+
+    @staticmethod
+    def _triggered(side: str, order_type: str, stop_price: float, price: float) -> bool:
+        # Stops are triggered against the position they protect, take profits in its favor
+        if order_type == STOP_MARKET:
+            return price >= stop_price if side == "buy" else price <= stop_price
+        return price <= stop_price if side == "buy" else price >= stop_price
+
+    @staticmethod
+    def _limit_crossed(order: MockOrder, price: Optional[float]) -> bool:
+        if price is None:
+            return False
+        return price <= order.price if order.side == "buy" else price >= order.price
+
+    def _market_price(self, symbol: str, side: str) -> Optional[float]:
+        quote = self.quotes.get(symbol)
+        if quote is not None:
+            price = quote[1] if side == "buy" else quote[0]
+        else:
+            price = self.last_prices.get(symbol)
+
+        if price is not None and self._slippage > 0:
+            price *= 1 + self._slippage if side == "buy" else 1 - self._slippage
+        return price
+
+    def _fill(self, order: MockOrder, price: float, timestamp: int):
+        position = self.positions.setdefault(order.symbol, MockPosition())
+        quantity = order.quantity
+
+        if order.reduce_only:
+            if order.side == "buy" and position.quantity < 0:
+                quantity = min(quantity, -position.quantity)
+            elif order.side == "sell" and position.quantity > 0:
+                quantity = min(quantity, position.quantity)
+            else:
+                order.status = "expired"
+                order.update_time = timestamp
+                self._notify(order)
+                return
+
+        signed = quantity if order.side == "buy" else -quantity
+
+        if position.quantity != 0 and (position.quantity > 0) != (signed > 0):
+            closed = min(abs(signed), abs(position.quantity))
+            closed_signed = closed if position.quantity > 0 else -closed
+            self.balance += self._pnl(order.symbol, closed_signed, position.entry_price, price)
+
+            remaining = position.quantity + signed
+            if remaining == 0:
+                position.entry_price = 0.0
+            elif (remaining > 0) != (position.quantity > 0):
+                position.entry_price = price
+            position.quantity = remaining
+        else:
+            total = abs(position.quantity) + quantity
+            position.entry_price = (abs(position.quantity) * position.entry_price + quantity * price) / total
+            position.quantity += signed
+
+        self.balance -= self._fee_rate * self._notional(order.symbol, quantity, price)
+
+        order.filled = quantity
+        order.avg_price = price
+        order.last_price = price
+        order.status = "filled"
+        order.update_time = timestamp
+
+        self._notify(order)
+        if self._on_fill is not None:
+            self._on_fill(order, quantity, price)
+
+    def _notify(self, order: MockOrder):
+        if self._on_order is not None:
+            self._on_order(order)
@@ -0,0 +1,202 @@
+import abc
+import json
+import logging
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, List, NamedTuple, Optional, Tuple
+from urllib.parse import parse_qsl, urlparse
+
+from constants import MOCK_LATENCY, MOCK_JITTER, MOCK_TRADES_PER_SECOND
+from mock_exchange.market import MarketSimulator
+from mock_exchange.websocket_server import WebsocketConnection, is_upgrade
+
+logger = logging.getLogger()
+
+# (status code, JSON body, extra headers)
+Response = Tuple[int, object, Dict[str, str]]
+
+
+class Request(NamedTuple):
+    method: str
+    path: str
+    params: Dict[str, str]
+    headers: Dict[str, str]
+    # Path and query string as sent, what the signatures are computed over
+    raw_path: str
+
+
+class _RequestHandler(BaseHTTPRequestHandler):
+    # Keep alive, the clients reuse their connections through a requests session
+    protocol_version = "HTTP/1.1"
+    app: "MockExchangeServer"
+
+    def do_GET(self):
+        if is_upgrade(self):
+            self.app.handle_websocket(WebsocketConnection(self, self.app.delay))
+            self.close_connection = True
+            return
+        self._dispatch("GET")
+
+    def do_POST(self):
+        self._dispatch("POST")
+
+    def do_PUT(self):
+        self._dispatch("PUT")
+
+    def do_DELETE(self):
+        self._dispatch("DELETE")
+
+    def _dispatch(self, method: str):
+        url = urlparse(self.path)
+        params = dict(parse_qsl(url.query, keep_blank_values=True))
+
+        length = int(self.headers.get("Content-Length", 0))
+        if length > 0:
+            params.update(parse_qsl(self.rfile.read(length).decode(), keep_blank_values=True))
+
+        status, body, headers = self.app.handle_http(method, url.path, params, self.headers, self.path)
+
+        payload = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        for k, v in headers.items():
+            self.send_header(k, v)
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format: str, *args):
+        logger.debug("%s mock server: " + format, self.app.name, *args)
+
+
+class MockExchangeServer(abc.ABC):
+    name = "Mock"
+    ws_path = "/ws"
+
+    def __init__(
+        self,
+        prices: Dict[str, float],
+        tick_sizes: Dict[str, float],
+        lot_sizes: Dict[str, float],
+        host: str = "127.0.0.1",
+        port: int = 0,
+        latency: float = MOCK_LATENCY,
+        jitter: float = MOCK_JITTER,
+        error_rate: float = 0.0,
+        trades_per_second: float = MOCK_TRADES_PER_SECOND,
+        api_secret: Optional[str] = None,
+        seed: Optional[int] = None,
+    ):
+        # Every REST response and websocket message is delayed by the latency plus a uniform jitter, a share of the
+        # REST requests can be answered with a 503 to exercise the retries. Signatures are only checked when the
+        # secret is given
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.api_secret = api_secret
+        self._random = random.Random(seed)
+
+        self.routes: Dict[Tuple[str, str], Callable[[Request], Response]] = dict()
+        self.connections: List[WebsocketConnection] = []
+        self._connections_lock = threading.Lock()
+        self.requests = 0
+
+        self.market = MarketSimulator(
+            prices, tick_sizes, lot_sizes, self._on_market_trade, self._on_market_quote, trades_per_second, seed
+        )
+
+        handler = type(f"{self.name}RequestHandler", (_RequestHandler,), {"app": self})
+        self._httpd = ThreadingHTTPServer((host, port), handler)
+        self._httpd.daemon_threads = True
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    @property
+    def wss_url(self) -> str:
+        host, port = self._httpd.server_address[:2]
+        return f"ws://{host}:{port}{self.ws_path}"
+
+    def start(self) -> "MockExchangeServer":
+        t = threading.Thread(target=self._httpd.serve_forever, name=f"{self.name}-mock-server", daemon=True)
+        t.start()
+        self.market.start()
+        logger.info("%s mock server listening on %s", self.name, self.base_url)
+        return self
+
+    def stop(self):
+        self.market.stop()
+        self.disconnect_websockets()
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def delay(self) -> float:
+        if self.jitter > 0:
+            return self.latency + self._random.uniform(0, self.jitter)
+        return self.latency
+
+    def disconnect_websockets(self):
+        # Failover tests: every client sees its websocket closed by the exchange
+        with self._connections_lock:
+            connections = list(self.connections)
+        for connection in connections:
+            connection.close()
+
+    def handle_http(self, method: str, path: str, params: Dict, headers, raw_path: str) -> Response:
+        self.requests += 1
+
+        delay = self.delay()
+        if delay > 0:
+            time.sleep(delay)
+
+        if self.error_rate > 0 and self._random.random() < self.error_rate:
+            return 503, {"code": -1001, "msg": "Service unavailable"}, dict()
+
+        route = self.routes.get((method, path))
+        if route is None:
+            return 404, {"code": -1, "msg": f"Unknown endpoint {method} {path}"}, dict()
+
+        try:
+            return route(Request(method, path, params, headers, raw_path))
+        except (KeyError, ValueError) as e:
+            return 400, {"code": -1102, "msg": f"Invalid or missing parameter: {e}"}, dict()
+
+    def handle_websocket(self, connection: WebsocketConnection):
+        with self._connections_lock:
+            self.connections.append(connection)
+
+        try:
+            self.on_ws_open(connection)
+            while True:
+                msg = connection.receive()
+                if msg is None:
+                    break
+                try:
+                    self.on_ws_message(connection, json.loads(msg))
+                except (KeyError, ValueError, TypeError) as e:
+                    logger.warning("%s mock server: invalid websocket message %s: %s", self.name, msg, e)
+        finally:
+            with self._connections_lock:
+                self.connections.remove(connection)
+            self.on_ws_close(connection)
+
+    @abc.abstractmethod
+    def _on_market_trade(self, symbol: str, price: float, size: float, side: str, timestamp: int):
+        pass
+
+    @abc.abstractmethod
+    def _on_market_quote(self, symbol: str, bid: float, ask: float, timestamp: int):
+        pass
+
+    def on_ws_open(self, connection: WebsocketConnection):
+        pass
+
+    def on_ws_message(self, connection: WebsocketConnection, data: Dict):
+        pass
+
+    def on_ws_close(self, connection: WebsocketConnection):
+        pass
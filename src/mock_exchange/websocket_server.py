@@ -0,0 +1,179 @@
+import base64
+import hashlib
+import logging
+import queue
+import socket
+import struct
+import threading
+import time
+from http.server import BaseHTTPRequestHandler
+from typing import Callable, Optional
+
+logger = logging.getLogger()
+
+WEBSOCKET_GUID = "258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+
+OP_CONTINUATION = 0x0
+OP_TEXT = 0x1
+OP_BINARY = 0x2
+OP_CLOSE = 0x8
+OP_PING = 0x9
+OP_PONG = 0xA
+
+
+def is_upgrade(handler: BaseHTTPRequestHandler) -> bool:
+    return handler.headers.get("Upgrade", "").lower() == "websocket"
+
+
+def encode_frame(opcode: int, payload: bytes) -> bytes:
+    # Frames sent by a server are never masked
+    header = bytearray([0x80 | opcode])
+    length = len(payload)
+    if length < 126:
+        header.append(length)
+    elif length < 65536:
+        header.append(126)
+        header += struct.pack("!H", length)
+    else:
+        header.append(127)
+        header += struct.pack("!Q", length)
+    return bytes(header) + payload
+
+
+def _unmask(payload: bytes, mask: bytes) -> bytes:
+    if len(payload) == 0:
+        return payload
+    # XOR of the whole payload at once, as integers, instead of byte by byte
+    key = (mask * (len(payload) // 4 + 1))[: len(payload)]
+    return (int.from_bytes(payload, "big") ^ int.from_bytes(key, "big")).to_bytes(len(payload), "big")
+
+
+class WebsocketConnection:
+    def __init__(self, handler: BaseHTTPRequestHandler, delay: Callable[[], float]):
+        # The HTTP request that asked for the upgrade, its socket is taken over once the handshake is answered
+        self.path = handler.path
+        self._rfile = handler.rfile
+        self._socket: socket.socket = handler.connection
+        self._delay = delay
+
+        self.open = True
+        self.sent = 0
+        self.received = 0
+
+        # Outgoing frames are delayed by the simulated latency on their own thread, in the order they were sent
+        self._outbox = queue.Queue()
+        self._last_due = 0.0
+        self._send_lock = threading.Lock()
+        # Pongs are written by the reading thread, frames must not interleave with the ones of the sender thread
+        self._write_lock = threading.Lock()
+
+        key = handler.headers.get("Sec-WebSocket-Key")
+        accept = base64.b64encode(hashlib.sha1((key + WEBSOCKET_GUID).encode()).digest()).decode()
+
+        handler.send_response(101, "Switching Protocols")
+        handler.send_header("Upgrade", "websocket")
+        handler.send_header("Connection", "Upgrade")
+        handler.send_header("Sec-WebSocket-Accept", accept)
+        handler.end_headers()
+        handler.wfile.flush()
+
+        self._thread = threading.Thread(target=self._send_outbox, daemon=True)
+        self._thread.start()
+
+    def send(self, text: str):
+        if not self.open:
+            return
+
+        with self._send_lock:
+            due = max(time.monotonic() + self._delay(), self._last_due)
+            self._last_due = due
+            self._outbox.put((due, encode_frame(OP_TEXT, text.encode("utf-8"))))
+
+    def _send_outbox(self):
+        while True:
+            item = self._outbox.get()
+            if item is None:
+                break
+
+            due, frame = item
+            delay = due - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+
+            if not self._write(frame):
+                break
+            self.sent += 1
+
+    def _write(self, frame: bytes) -> bool:
+        try:
+            with self._write_lock:
+                self._socket.sendall(frame)
+            return True
+        except OSError:
+            self.open = False
+            return False
+
+    def _read_frame(self):
+        header = self._rfile.read(2)
+        if len(header) < 2:
+            return None
+
+        fin = header[0] & 0x80
+        opcode = header[0] & 0x0F
+        masked = header[1] & 0x80
+        length = header[1] & 0x7F
+        if length == 126:
+            length = struct.unpack("!H", self._rfile.read(2))[0]
+        elif length == 127:
+            length = struct.unpack("!Q", self._rfile.read(8))[0]
+
+        mask = self._rfile.read(4) if masked else None
+        payload = self._rfile.read(length)
+        if len(payload) < length:
+            return None
+        if mask is not None:
+            payload = _unmask(payload, mask)
+
+        return fin, opcode, payload
+
+    def receive(self) -> Optional[str]:
+        # Next text message from the client, None once the connection is closed. Pings are answered here
+        fragments = []
+        while self.open:
+            try:
+                frame = self._read_frame()
+            except (OSError, struct.error):
+                frame = None
+            if frame is None:
+                self.open = False
+                break
+
+            fin, opcode, payload = frame
+            if opcode == OP_PING:
+                self._write(encode_frame(OP_PONG, payload))
+                continue
+            if opcode == OP_PONG:
+                continue
+            if opcode == OP_CLOSE:
+                self._write(encode_frame(OP_CLOSE, payload[:2]))
+                self.open = False
+                break
+
+            fragments.append(payload)
+            if fin:
+                self.received += 1
+                return b"".join(fragments).decode("utf-8")
+
+        self._outbox.put(None)
+        return None
+
+    def close(self, code: int = 1000):
+        # The close frame goes out immediately, the client then closes its side and receive() returns None
+        if not self.open:
+            return
+        self._write(encode_frame(OP_CLOSE, struct.pack("!H", code)))
+        self.open = False
+        try:
+            self._socket.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
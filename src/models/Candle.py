@@ -5,7 +5,7 @@ import dateutil.parser
 
 from helpers.Exchange import Exchange
 
-BITMEX_TF_MINUTES = {"1m": 5, "5m": 5, "1h": 60, "1d": 1440}
+BITMEX_TF_MINUTES = {"1m": 1, "5m": 5, "1h": 60, "1d": 1440}
 
 
 class Candle:
@@ -0,0 +1,125 @@
+from typing import List
+
+import numpy as np
+
+from models.Candle import Candle
+
+
+class CandleView:
+    __slots__ = ("_buffer", "_position")
+
+    def __init__(self, buffer: "CandleBuffer", position: int):
+        self._buffer = buffer
+        self._position = position
+
+    @property
+    def timestamp(self) -> int:
+        return int(self._buffer.timestamp_array[self._position])
+
+    @property
+    def open(self) -> float:
+        return float(self._buffer.open_array[self._position])
+
+    @property
+    def high(self) -> float:
+        return float(self._buffer.high_array[self._position])
+
+    @property
+    def low(self) -> float:
+        return float(self._buffer.low_array[self._position])
+
+    @property
+    def close(self) -> float:
+        return float(self._buffer.close_array[self._position])
+
+    @property
+    def volume(self) -> float:
+        return float(self._buffer.volume_array[self._position])
+
+
+class CandleBuffer:
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+
+        # Every candle is written twice, at position and position + capacity, so the last `size` candles are
+        # always a contiguous slice of each array whatever the write position is
+        self.timestamp_array = np.zeros(2 * capacity, dtype=np.int64)
+        self.open_array = np.zeros(2 * capacity, dtype=np.float64)
+        self.high_array = np.zeros(2 * capacity, dtype=np.float64)
+        self.low_array = np.zeros(2 * capacity, dtype=np.float64)
+        self.close_array = np.zeros(2 * capacity, dtype=np.float64)
+        self.volume_array = np.zeros(2 * capacity, dtype=np.float64)
+
+        self._next = 0
+        self._size = 0
+
+        # Number of candles appended since creation, including the ones that were overwritten
+        self.total = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    def __getitem__(self, index: int) -> CandleView:
+        if index < 0:
+            index += self._size
+        if not 0 <= index < self._size:
+            raise IndexError("Candle index out of range")
+
+        return CandleView(self, self._next + self.capacity - self._size + index)
+
+    def _window(self, array: np.ndarray) -> np.ndarray:
+        end = self._next + self.capacity
+        return array[end - self._size : end]
+
+    @property
+    def timestamps(self) -> np.ndarray:
+        return self._window(self.timestamp_array)
+
+    @property
+    def opens(self) -> np.ndarray:
+        return self._window(self.open_array)
+
+    @property
+    def highs(self) -> np.ndarray:
+        return self._window(self.high_array)
+
+    @property
+    def lows(self) -> np.ndarray:
+        return self._window(self.low_array)
+
+    @property
+    def closes(self) -> np.ndarray:
+        return self._window(self.close_array)
+
+    @property
+    def volumes(self) -> np.ndarray:
+        return self._window(self.volume_array)
+
+    def append(self, timestamp: int, open_price: float, high: float, low: float, close: float, volume: float):
+        for position in (self._next, self._next + self.capacity):
+            self.timestamp_array[position] = timestamp
+            self.open_array[position] = open_price
+            self.high_array[position] = high
+            self.low_array[position] = low
+            self.close_array[position] = close
+            self.volume_array[position] = volume
+
+        self._next = (self._next + 1) % self.capacity
+        self._size = min(self._size + 1, self.capacity)
+        self.total += 1
+
+    def extend(self, candles: List[Candle]):
+        for candle in candles:
+            self.append(candle.timestamp, candle.open, candle.high, candle.low, candle.close, candle.volume)
+
+    def update_last(self, price: float, size: float):
+        last = (self._next - 1) % self.capacity
+
+        for position in (last, last + self.capacity):
+            self.close_array[position] = price
+            self.volume_array[position] += size
+
+            if price > self.high_array[position]:
+                self.high_array[position] = price
+            elif price < self.low_array[position]:
+                self.low_array[position] = price
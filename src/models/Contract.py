@@ -3,6 +3,10 @@ from typing import Dict
 from helpers.Exchange import Exchange
 from models.Balance import BITMEX_MULTIPLIER
 
+# Bitmex settles the contracts in the minor unit of a currency, satoshis for the inverse and quanto ones. Multipliers
+# and PnL are given in the major unit
+BITMEX_SETTLEMENT_CURRENCIES = {"XBt": ("XBT", BITMEX_MULTIPLIER), "USDt": ("USDT", 0.000001)}
+
 
 def tick_to_decimals(tick_size: float) -> int:
     tick_size_str = "{0:.8f}".format(tick_size)
@@ -27,6 +31,7 @@ class Contract:
             self.quantity_decimals = contract_info["quantityPrecision"]
             self.tick_size = 1 / pow(10, contract_info["pricePrecision"])
             self.lot_size = 1 / pow(10, contract_info["quantityPrecision"])
+            self.settlement_currency = self.quote_asset
         elif exchange == Exchange.bitmex:
             self.symbol = contract_info["symbol"]
             self.base_asset = contract_info["rootSymbol"]
@@ -39,7 +44,14 @@ class Contract:
             self.quanto = contract_info["isQuanto"]
             self.inverse = contract_info["isInverse"]
 
-            self.multiplier = contract_info["multiplier"] * BITMEX_MULTIPLIER
+            settlement = contract_info.get("settlCurrency")
+            if settlement is None:
+                settlement = "XBt" if self.inverse or self.quanto else self.quote_asset
+            self.settlement_currency, unit = BITMEX_SETTLEMENT_CURRENCIES.get(
+                settlement, (settlement, BITMEX_MULTIPLIER)
+            )
+
+            self.multiplier = contract_info["multiplier"] * unit
             if self.inverse:
                 self.multiplier *= -1
 
@@ -6,7 +6,7 @@ class OrderStatus:
         if exchange == Exchange.binance:
             self.order_id = order_info["orderId"]
             self.status = order_info["status"].lower()
-            self.avg_price = order_info["avgPrice"]
+            self.avg_price = float(order_info["avgPrice"])
         elif exchange == Exchange.bitmex:
             self.order_id = order_info["orderID"]
             self.status = order_info["ordStatus"].lower()
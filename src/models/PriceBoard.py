@@ -0,0 +1,70 @@
+import threading
+import time
+from typing import Dict, Iterable, NamedTuple, Optional, Tuple, Union
+
+# Given for a side an update doesn't carry, None is a side of the book left empty
+UNCHANGED = object()
+
+
+class Quote(NamedTuple):
+    seq: int
+    bid: Optional[float]
+    ask: Optional[float]
+    timestamp: int
+
+
+class PriceBoard:
+    def __init__(self):
+        # Quotes are immutable, a writer replaces the slot of a symbol so a reader never sees a half updated one
+        self._quotes: Dict[str, Quote] = dict()
+        self._lock = threading.Lock()
+
+        self.seq = 0
+
+    def __contains__(self, symbol: str) -> bool:
+        return symbol in self._quotes
+
+    def __getitem__(self, symbol: str) -> Quote:
+        return self._quotes[symbol]
+
+    def __len__(self) -> int:
+        return len(self._quotes)
+
+    def get(self, symbol: str) -> Optional[Quote]:
+        return self._quotes.get(symbol)
+
+    def update(
+        self,
+        symbol: str,
+        bid: Union[float, None, object] = UNCHANGED,
+        ask: Union[float, None, object] = UNCHANGED,
+        timestamp: Optional[int] = None,
+    ) -> Quote:
+        if timestamp is None:
+            timestamp = int(time.time() * 1000)
+
+        with self._lock:
+            # Partial updates (Bitmex sends the side that changed only) keep the other side of the last quote, a
+            # side sent empty is stored as None rather than left at a price that is gone
+            previous = self._quotes.get(symbol)
+            if bid is UNCHANGED:
+                bid = previous.bid if previous is not None else None
+            if ask is UNCHANGED:
+                ask = previous.ask if previous is not None else None
+
+            self.seq += 1
+            quote = Quote(self.seq, bid, ask, timestamp)
+            self._quotes[symbol] = quote
+
+        return quote
+
+    def snapshot(self, symbols: Optional[Iterable[str]] = None) -> Dict[str, Quote]:
+        with self._lock:
+            if symbols is None:
+                return dict(self._quotes)
+            return {s: self._quotes[s] for s in symbols if s in self._quotes}
+
+    def changed_since(self, seq: int) -> Tuple[int, Dict[str, Quote]]:
+        # Consumers keep the returned sequence number and only get the symbols updated since their last pull
+        with self._lock:
+            return self.seq, {s: q for s, q in self._quotes.items() if q.seq > seq}
@@ -1,3 +1,5 @@
+from typing import Dict
+
 from models.Contract import Contract
 
 
@@ -12,3 +14,6 @@ class Trade:
         self.pnl: float = trade_info["pnl"]
         self.quantity = trade_info["quantity"]
         self.entry_id = trade_info["entry_id"]
+
+        # Ids of the take profit / stop loss orders resting on the exchange
+        self.protective_ids: Dict[str, str] = trade_info.get("protective_ids", dict())
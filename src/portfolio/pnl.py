@@ -0,0 +1,175 @@
+import logging
+import threading
+from typing import Dict, List, Optional, Tuple, TYPE_CHECKING, Union
+
+import numpy as np
+
+from constants import PNL_INTERVAL
+from models.Trade import Trade
+
+if TYPE_CHECKING:
+    from connectors.bitmex import BitmexClient
+    from connectors.binance_futures import BinanceFuturesClient
+
+logger = logging.getLogger()
+
+
+class PnlEngine:
+    def __init__(
+        self,
+        clients: List[Union["BinanceFuturesClient", "BitmexClient"]],
+        interval: Optional[float] = PNL_INTERVAL,
+    ):
+        self._clients = clients
+        self.interval = interval
+
+        self._versions: Dict[int, int] = dict()
+        self._trades: List[Trade] = []
+        self._strategy_keys: List[Tuple[str, int]] = []
+        self._exchange_names: List[str] = []
+        self._currencies: List[str] = []
+        self._symbols: List[Tuple[int, str]] = []
+
+        self._entry_price = np.zeros(0)
+        self._quantity = np.zeros(0)
+        self._side = np.zeros(0)
+        self._multiplier = np.zeros(0)
+        self._inverse = np.zeros(0, dtype=bool)
+        self._symbol_index = np.zeros(0, dtype=np.int64)
+        self._strategy_index = np.zeros(0, dtype=np.int64)
+        self._exchange_index = np.zeros(0, dtype=np.int64)
+        self._currency_index = np.zeros(0, dtype=np.int64)
+
+        self.per_strategy: Dict[Tuple[str, int], float] = dict()
+        self.per_exchange: Dict[str, float] = dict()
+        self.total: Dict[str, float] = dict()
+
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+
+        if interval is not None:
+            t = threading.Thread(target=self._run, daemon=True)
+            t.start()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.revalue()
+            except Exception as e:
+                logger.error("Error while computing the unrealized PnL: %s", e)
+
+    def stop(self):
+        self._stop.set()
+
+    def _positions_changed(self) -> bool:
+        versions = dict()
+        for client in self._clients:
+            for strategy in list(client.strategies.values()):
+                versions[id(strategy)] = strategy.trades_version
+
+        changed = versions != self._versions
+        self._versions = versions
+        return changed
+
+    def _load_positions(self):
+        # Only called when a strategy opened, filled or closed a trade, the arrays are reused in between
+        trades = []
+        strategy_keys = []
+        exchange_names = []
+        currencies = []
+        symbols = []
+
+        rows = []
+        for client_index, client in enumerate(self._clients):
+            for b_index, strategy in list(client.strategies.items()):
+                for trade in strategy.trades:
+                    if trade.status != "open" or trade.entry_price is None:
+                        continue
+
+                    contract = trade.contract
+                    exchange = contract.exchange.name.capitalize()
+                    currency = contract.settlement_currency
+
+                    for values, value in (
+                        (strategy_keys, (exchange, b_index)),
+                        (exchange_names, exchange),
+                        (currencies, currency),
+                        (symbols, (client_index, contract.symbol)),
+                    ):
+                        if value not in values:
+                            values.append(value)
+
+                    rows.append(
+                        (
+                            float(trade.entry_price),
+                            float(trade.quantity),
+                            1.0 if trade.side == "long" else -1.0,
+                            getattr(contract, "multiplier", 1.0),
+                            getattr(contract, "inverse", False),
+                            symbols.index((client_index, contract.symbol)),
+                            strategy_keys.index((exchange, b_index)),
+                            exchange_names.index(exchange),
+                            currencies.index(currency),
+                        )
+                    )
+                    trades.append(trade)
+
+        columns = list(zip(*rows)) if len(rows) > 0 else [()] * 9
+
+        self._trades = trades
+        self._strategy_keys = strategy_keys
+        self._exchange_names = exchange_names
+        self._currencies = currencies
+        self._symbols = symbols
+
+        self._entry_price = np.array(columns[0], dtype=np.float64)
+        self._quantity = np.array(columns[1], dtype=np.float64)
+        self._side = np.array(columns[2], dtype=np.float64)
+        self._multiplier = np.array(columns[3], dtype=np.float64)
+        self._inverse = np.array(columns[4], dtype=bool)
+        self._symbol_index = np.array(columns[5], dtype=np.int64)
+        self._strategy_index = np.array(columns[6], dtype=np.int64)
+        self._exchange_index = np.array(columns[7], dtype=np.int64)
+        self._currency_index = np.array(columns[8], dtype=np.int64)
+
+    def revalue(self) -> Dict[str, float]:
+        with self._lock:
+            if self._positions_changed():
+                self._load_positions()
+
+            # One snapshot per exchange, every position of a symbol is valued against the same quote
+            snapshots = [client.prices.snapshot() for client in self._clients]
+
+            bids = np.full(len(self._symbols), np.nan)
+            asks = np.full(len(self._symbols), np.nan)
+            for i, (client_index, symbol) in enumerate(self._symbols):
+                quote = snapshots[client_index].get(symbol)
+                if quote is not None:
+                    bids[i] = quote.bid if quote.bid is not None else np.nan
+                    asks[i] = quote.ask if quote.ask is not None else np.nan
+
+            # Longs are closed at the bid, shorts at the ask
+            price = np.where(self._side > 0, bids[self._symbol_index], asks[self._symbol_index])
+
+            with np.errstate(divide="ignore", invalid="ignore"):
+                move = np.where(self._inverse, 1 / self._entry_price - 1 / price, price - self._entry_price)
+            pnl = self._side * move * self._multiplier * self._quantity
+
+            # The trades table reads trade.pnl, a position without a quote yet keeps its last PnL
+            values = pnl.tolist()
+            for i, trade in enumerate(self._trades):
+                if np.isfinite(values[i]):
+                    trade.pnl = values[i]
+                else:
+                    values[i] = trade.pnl
+            pnl = np.array(values, dtype=np.float64)
+
+            per_strategy = np.bincount(self._strategy_index, weights=pnl, minlength=len(self._strategy_keys))
+            per_exchange = np.bincount(self._exchange_index, weights=pnl, minlength=len(self._exchange_names))
+            per_currency = np.bincount(self._currency_index, weights=pnl, minlength=len(self._currencies))
+
+            self.per_strategy = dict(zip(self._strategy_keys, per_strategy.tolist()))
+            self.per_exchange = dict(zip(self._exchange_names, per_exchange.tolist()))
+            self.total = dict(zip(self._currencies, per_currency.tolist()))
+
+            return self.total
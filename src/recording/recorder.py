@@ -0,0 +1,225 @@
+import gzip
+import json
+import logging
+import os
+import queue
+import threading
+import time
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from constants import (
+    RECORDER_SEGMENT_BYTES,
+    RECORDER_SEGMENT_SECONDS,
+    RECORDER_MAX_BYTES,
+    RECORDER_QUEUE_SIZE,
+    RECORDER_FLUSH_INTERVAL,
+)
+
+logger = logging.getLogger()
+
+INDEX_FILE = "index.json"
+SEGMENT_SUFFIX = ".frames.gz"
+
+
+def load_index(directory: str) -> List[Dict]:
+    path = os.path.join(directory, INDEX_FILE)
+    if not os.path.exists(path):
+        return []
+
+    with open(path) as f:
+        return json.load(f)
+
+
+def read_segment(path: str) -> Iterator[Tuple[int, str, str]]:
+    # Every line is "<receive timestamp in ms>\t<source>\t<raw frame>", a segment cut by a crash is read up to its
+    # last flush
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        try:
+            for line in f:
+                if not line.endswith("\n"):
+                    break
+                timestamp, source, frame = line[:-1].split("\t", 2)
+                yield int(timestamp), source, frame
+        except (EOFError, OSError) as e:
+            logger.warning("Recorded segment %s is truncated: %s", path, e)
+
+
+class MarketDataRecorder:
+    def __init__(
+        self,
+        directory: str,
+        segment_bytes: int = RECORDER_SEGMENT_BYTES,
+        segment_seconds: float = RECORDER_SEGMENT_SECONDS,
+        max_bytes: int = RECORDER_MAX_BYTES,
+        queue_size: int = RECORDER_QUEUE_SIZE,
+        flush_interval: float = RECORDER_FLUSH_INTERVAL,
+    ):
+        self.directory = directory
+        self._segment_bytes = segment_bytes
+        self._segment_seconds = segment_seconds
+        self._max_bytes = max_bytes
+        self._flush_interval = flush_interval
+
+        os.makedirs(directory, exist_ok=True)
+        self.index: List[Dict] = load_index(directory)
+        self._recover_segments()
+
+        self._queue = queue.Queue(maxsize=queue_size)
+        self.recorded = 0
+        self.dropped = 0
+
+        self._file: Optional[gzip.GzipFile] = None
+        self._segment: Optional[Dict] = None
+
+        self.running = True
+        self._thread = threading.Thread(target=self._run, name="recorder", daemon=True)
+        self._thread.start()
+
+    def record(self, source: str, frame: str, timestamp: Optional[int] = None):
+        # Called from the websocket threads, the frame is only queued, compression and disk writes happen on the
+        # writer thread. The receive time is the current one unless given, by synthetic recordings
+        if timestamp is None:
+            timestamp = int(time.time() * 1000)
+        try:
+            self._queue.put_nowait((timestamp, source, frame))
+        except queue.Full:
+            self.dropped += 1
+
+    def _run(self):
+        last_flush = time.monotonic()
+
+        while True:
+            try:
+                item = self._queue.get(timeout=self._flush_interval)
+            except queue.Empty:
+                item = None
+
+            if item is not None:
+                self._write(*item)
+
+            if self._file is not None and time.monotonic() - last_flush >= self._flush_interval:
+                self._file.flush()
+                last_flush = time.monotonic()
+
+            if not self.running and self._queue.empty():
+                break
+
+        self._close_segment()
+
+    def _write(self, timestamp: int, source: str, frame: str):
+        if self._segment is not None and (
+            self._segment["bytes"] >= self._segment_bytes
+            or (timestamp - self._segment["start"]) / 1000 >= self._segment_seconds
+        ):
+            self._close_segment()
+
+        if self._segment is None:
+            self._open_segment(timestamp)
+
+        # JSON cannot hold a raw new line inside a string, the ones between tokens are replaced to keep one frame
+        # per line
+        line = f"{timestamp}\t{source}\t{frame.replace(chr(10), ' ')}\n".encode("utf-8")
+        self._file.write(line)
+
+        self._segment["end"] = timestamp
+        self._segment["frames"] += 1
+        self._segment["bytes"] += len(line)
+        if source not in self._segment["sources"]:
+            self._segment["sources"].append(source)
+        self.recorded += 1
+
+    def _open_segment(self, timestamp: int):
+        file_name = f"{timestamp}{SEGMENT_SUFFIX}"
+        self._file = gzip.open(os.path.join(self.directory, file_name), "ab")
+        self._segment = {
+            "file": file_name,
+            "start": timestamp,
+            "end": timestamp,
+            "frames": 0,
+            "bytes": 0,
+            "sources": [],
+        }
+
+    def _close_segment(self):
+        if self._segment is None:
+            return
+
+        self._file.close()
+        self._segment["size"] = os.path.getsize(os.path.join(self.directory, self._segment["file"]))
+        self.index.append(self._segment)
+        logger.info(
+            "Recorded segment %s closed: %s frames, %s bytes",
+            self._segment["file"],
+            self._segment["frames"],
+            self._segment["size"],
+        )
+
+        self._file = None
+        self._segment = None
+
+        self._enforce_max_bytes()
+        self._save_index()
+
+    def _enforce_max_bytes(self):
+        while len(self.index) > 1 and sum(s["size"] for s in self.index) > self._max_bytes:
+            segment = self.index.pop(0)
+            try:
+                os.remove(os.path.join(self.directory, segment["file"]))
+            except FileNotFoundError:
+                pass
+            logger.info("Recorded segment %s deleted to stay under %s bytes", segment["file"], self._max_bytes)
+
+    def _save_index(self):
+        # Written next to the segments and renamed, a crash never leaves a partial index
+        path = os.path.join(self.directory, INDEX_FILE)
+        with open(path + ".tmp", "w") as f:
+            json.dump(self.index, f)
+        os.replace(path + ".tmp", path)
+
+    def _recover_segments(self):
+        # Segments still open when the process died are missing from the index, their range is read back from them
+        indexed = {s["file"] for s in self.index}
+        for file_name in sorted(os.listdir(self.directory)):
+            if not file_name.endswith(SEGMENT_SUFFIX) or file_name in indexed:
+                continue
+
+            path = os.path.join(self.directory, file_name)
+            segment = {"file": file_name, "start": None, "end": None, "frames": 0, "bytes": 0, "sources": []}
+            for timestamp, source, frame in read_segment(path):
+                if segment["start"] is None:
+                    segment["start"] = timestamp
+                segment["end"] = timestamp
+                segment["frames"] += 1
+                segment["bytes"] += len(f"{timestamp}\t{source}\t{frame}\n".encode("utf-8"))
+                if source not in segment["sources"]:
+                    segment["sources"].append(source)
+
+            if segment["start"] is None:
+                os.remove(path)
+                continue
+
+            segment["size"] = os.path.getsize(path)
+            self.index.append(segment)
+            logger.info("Recovered recorded segment %s: %s frames", file_name, segment["frames"])
+
+        self.index.sort(key=lambda s: s["start"])
+        self._enforce_max_bytes()
+        self._save_index()
+
+    def segments(self, start: Optional[int] = None, end: Optional[int] = None) -> List[Dict]:
+        # Closed segments overlapping the [start, end] range, in milliseconds
+        return [s for s in self.index if (start is None or s["end"] >= start) and (end is None or s["start"] <= end)]
+
+    def stop(self):
+        self.running = False
+        self._thread.join()
+
+    @property
+    def metrics(self) -> Dict:
+        return {
+            "recorded": self.recorded,
+            "dropped": self.dropped,
+            "queued": self._queue.qsize(),
+            "segments": len(self.index),
+            "disk_bytes": sum(s["size"] for s in self.index),
+        }
@@ -0,0 +1,118 @@
+import logging
+import os
+import time
+from typing import Dict, Iterable, Iterator, Optional, Tuple, Union, TYPE_CHECKING
+
+from helpers.clock import ReplayClock
+from recording.recorder import load_index, read_segment
+
+if TYPE_CHECKING:
+    from connectors.bitmex import BitmexClient
+    from connectors.binance_futures import BinanceFuturesClient
+
+logger = logging.getLogger()
+
+
+def iter_frames(
+    directory: str, start: Optional[int] = None, end: Optional[int] = None
+) -> Iterator[Tuple[int, str, str]]:
+    # Segments are written one after the other by a single thread, reading them in the index order gives the frames
+    # in the order they were received
+    for segment in load_index(directory):
+        if (start is not None and segment["end"] < start) or (end is not None and segment["start"] > end):
+            continue
+
+        for timestamp, source, frame in read_segment(os.path.join(directory, segment["file"])):
+            if start is not None and timestamp < start:
+                continue
+            if end is not None and timestamp > end:
+                return
+            yield timestamp, source, frame
+
+
+class ReplayEngine:
+    def __init__(
+        self,
+        clients: Dict[str, Union["BitmexClient", "BinanceFuturesClient"]],
+        speed: Optional[float] = 1.0,
+        clock: Optional[ReplayClock] = None,
+    ):
+        # Clients by recorded source ("binance", "bitmex"), they should be created without connection so only the
+        # replayed frames reach them. A speed of None replays as fast as the clients can process the frames
+        self.clients = clients
+        self.speed = speed
+
+        # Follows the receive time of the replayed frames, the clients have to be created with the same clock so
+        # their latency checks, timestamps and order timers run on the replay time
+        self.clock = clock if clock is not None else ReplayClock()
+        for source, client in clients.items():
+            if client.clock is not self.clock:
+                logger.warning("The %s client does not use the replay clock, it runs on its own time", source)
+        self._clocked_clients = [client for client in clients.values() if client.clock is self.clock]
+
+        self.running = False
+        self.frames = 0
+        self.skipped = 0
+        self.errors = 0
+        self.max_lag = 0.0
+
+    def run(self, frames: Iterable[Tuple[int, str, str]]) -> Dict:
+        self.running = True
+        start = time.monotonic()
+        first_timestamp = None
+
+        for timestamp, source, frame in frames:
+            if not self.running:
+                break
+
+            client = self.clients.get(source)
+            if client is None:
+                self.skipped += 1
+                continue
+
+            if self.speed is not None:
+                if first_timestamp is None:
+                    first_timestamp = timestamp
+
+                # Frames are sent at the pace they were received, compressed by the speed factor
+                delay = start + (timestamp - first_timestamp) / 1000 / self.speed - time.monotonic()
+                if delay > 0:
+                    time.sleep(delay)
+                else:
+                    self.max_lag = max(self.max_lag, -delay)
+
+            if timestamp > self.clock.time_ms():
+                # The trades are processed by the ingest workers: the clock only moves once the frames received
+                # before are done, so the strategies never see a time ahead of the trade they handle and the
+                # timers fire after the trades they depend on
+                for clocked_client in self._clocked_clients:
+                    clocked_client.ingest.join()
+            self.clock.update(timestamp)
+            try:
+                client._on_message(None, frame)
+            except Exception as e:
+                self.errors += 1
+                logger.error("Error while replaying a %s frame: %s", source, e)
+
+            self.frames += 1
+
+        # Trades are processed by the ingest workers, the replay is over once they are all done
+        for client in self.clients.values():
+            client.ingest.join()
+
+        self.running = False
+        return self._report(time.monotonic() - start)
+
+    def stop(self):
+        self.running = False
+
+    def _report(self, elapsed: float) -> Dict:
+        return {
+            "frames": self.frames,
+            "skipped": self.skipped,
+            "errors": self.errors,
+            "seconds": round(elapsed, 3),
+            "messages_per_second": round(self.frames / elapsed, 1) if elapsed > 0 else None,
+            "max_lag": round(self.max_lag, 3),
+            "ingest": {source: client.ingest.metrics for source, client in self.clients.items()},
+        }
@@ -1,13 +1,13 @@
 import logging
-import time
-from threading import Timer
-from typing import List, TYPE_CHECKING, Union
+from typing import Dict, List, Tuple, TYPE_CHECKING, Union
 
-from constants import TF_EQUIV
+from constants import TF_EQUIV, CANDLES_BUFFER_SIZE
 from helpers.Strategies import Strategies
-from models.Candle import Candle
+from models.CandleBuffer import CandleBuffer
 from models.Contract import Contract
+from models.OrderStatus import OrderStatus
 from models.Trade import Trade
+from strategies.triggers import TriggerIndex, ABOVE, BELOW
 
 if TYPE_CHECKING:
     from connectors.bitmex import BitmexClient
@@ -15,6 +15,8 @@ if TYPE_CHECKING:
 
 logger = logging.getLogger()
 
+PROTECTIVE_ORDER_TYPES = {"take_profit": "TAKE_PROFIT_MARKET", "stop_loss": "STOP_MARKET"}
+
 
 class Strategy:
     def __init__(
@@ -29,6 +31,8 @@ class Strategy:
         strategy_name: Strategies,
     ):
         self.client = client
+        # Timestamps, latency checks and order polling follow the client clock, simulated in replays and backtests
+        self.clock = client.clock
         self.contract = contract
         self.exchange = exchange
         self.timeframe = timeframe
@@ -41,16 +45,22 @@ class Strategy:
 
         self.ongoing_position = False
 
-        self.candles: List[Candle] = []
+        self.candles = CandleBuffer(CANDLES_BUFFER_SIZE)
         self.trades: List[Trade] = []
         self.logs = []
 
+        # Take profit and stop loss prices of the open trades
+        self._triggers = TriggerIndex()
+
+        # Incremented when a trade is opened, filled or closed, so the PnL engine knows when to reload them
+        self.trades_version = 0
+
     def _add_log(self, msg: str):
         logger.info("%s", msg)
         self.logs.append({"log": msg, "displayed": False})
 
     def parse_trades(self, price: float, size: float, timestamp: int) -> str:
-        timestamp_diff = int(time.time() * 1000) - timestamp
+        timestamp_diff = self.clock.time_ms() - timestamp
         if timestamp_diff >= 2000:
             logger.warning(
                 "%s %s: %s milliseconds of difference between the current" " time and the trade time",
@@ -61,20 +71,14 @@ class Strategy:
 
         last_candle = self.candles[-1]
 
+        # Check Take profit / Stop loss
+        if len(self._triggers) > 0:
+            for trade, kind in self._triggers.pop_crossed(price):
+                self._exit_trade(trade, kind)
+
         # Same candle
         if timestamp < last_candle.timestamp + self.tf_equiv:
-            last_candle.close = price
-            last_candle.volume += size
-
-            if price > last_candle.high:
-                last_candle.high = price
-            elif price < last_candle.low:
-                last_candle.low = price
-
-            # Check Take profit / Stop loss
-            for trade in self.trades:
-                if trade.status == "open" and trade.entry_price is not None:
-                    self._check_tp_sl(trade)
+            self.candles.update_last(price, size)
 
             return "same_candle"
 
@@ -87,32 +91,13 @@ class Strategy:
                 f"({timestamp} {last_candle.timestamp})"
             )
 
+            last_ts = last_candle.timestamp
+            last_close = last_candle.close
             for missing in range(missing_candles):
-                new_ts = last_candle.timestamp + self.tf_equiv
-                candle_info = {
-                    "ts": new_ts,
-                    "open": last_candle.close,
-                    "high": last_candle.close,
-                    "low": last_candle.close,
-                    "close": last_candle.close,
-                    "volume": 0,
-                }
-                new_candle = Candle(candle_info, self.timeframe, "parse_trade")
-                self.candles.append(new_candle)
-
-                last_candle = new_candle
-
-            new_ts = last_candle.timestamp + self.tf_equiv
-            candle_info = {
-                "ts": new_ts,
-                "open": price,
-                "high": price,
-                "low": price,
-                "close": price,
-                "volume": size,
-            }
-            new_candle = Candle(candle_info, self.timeframe, "parse_trade")
-            self.candles.append(new_candle)
+                last_ts += self.tf_equiv
+                self.candles.append(last_ts, last_close, last_close, last_close, last_close, 0)
+
+            self.candles.append(last_ts + self.tf_equiv, price, price, price, price, size)
 
             logger.info(f"{self.exchange} New candle for {self.contract.symbol}" f" {self.timeframe}")
 
@@ -120,17 +105,7 @@ class Strategy:
 
         # New candle
         elif timestamp >= last_candle.timestamp + self.tf_equiv:
-            new_ts = last_candle.timestamp + self.tf_equiv
-            candle_info = {
-                "ts": new_ts,
-                "open": price,
-                "high": price,
-                "low": price,
-                "close": price,
-                "volume": size,
-            }
-            new_candle = Candle(candle_info, self.timeframe, "parse_trade")
-            self.candles.append(new_candle)
+            self.candles.append(last_candle.timestamp + self.tf_equiv, price, price, price, price, size)
 
             logger.info(f"{self.exchange} New candle for {self.contract.symbol} " f"{self.timeframe}")
 
@@ -156,16 +131,13 @@ class Strategy:
             avg_fill_price = None
             if order_status.status == "filled":
                 avg_fill_price = order_status.avg_price
-            else:
-                t = Timer(
-                    2.0,
-                    lambda: self._check_order_status(order_status.order_id),
-                )
-                t.start()
+            elif not self.client.private_ws_connected:
+                # Without a private stream pushing the order updates, the fill has to be polled
+                self.clock.call_later(2.0, lambda: self._check_order_status(order_status.order_id))
 
             new_trade = Trade(
                 {
-                    "time": int(time.time() * 1000),
+                    "time": self.clock.time_ms(),
                     "entry_price": avg_fill_price,
                     "contract": self.contract,
                     "strategy": self.strategy_name,
@@ -177,6 +149,10 @@ class Strategy:
                 }
             )
             self.trades.append(new_trade)
+            self.trades_version += 1
+
+            if avg_fill_price is not None:
+                self._protect_trade(new_trade)
 
     def _check_order_status(self, order_id):
         order_status = self.client.get_order_status(self.contract, order_id)
@@ -186,43 +162,143 @@ class Strategy:
             if order_status.status == "filled":
                 for trade in self.trades:
                     if trade.entry_id == order_id:
-                        trade.entry_price = order_status.avg_price
+                        # The private stream may have reconnected and delivered the fill in the meantime
+                        if trade.entry_price is None:
+                            self._entry_filled(trade, order_status.avg_price)
                         break
                 return
 
-        t = Timer(2.0, lambda: self._check_order_status(order_id))
-        t.start()
+        self.clock.call_later(2.0, lambda: self._check_order_status(order_id))
+
+    def on_order_update(self, order_status: OrderStatus):
+        for trade in self.trades:
+            if trade.status != "open":
+                continue
 
-    def _check_tp_sl(self, trade: Trade):
-        tp_triggered = False
-        sl_triggered = False
+            if trade.entry_id == order_status.order_id:
+                if order_status.status == "filled" and trade.entry_price is None:
+                    self._entry_filled(trade, order_status.avg_price)
+                return
 
-        price = self.candles[-1].close
+            for kind, order_id in list(trade.protective_ids.items()):
+                if order_id == order_status.order_id:
+                    self._protective_order_update(trade, kind, order_status)
+                    return
 
+    def _entry_filled(self, trade: Trade, avg_price: float):
+        trade.entry_price = avg_price
+        self.trades_version += 1
+        self._protect_trade(trade)
+
+    def _exit_levels(self, trade: Trade) -> Dict[str, Tuple[float, str]]:
+        levels = dict()
         if trade.side == "long":
-            if self.stop_loss is not None:
-                if price <= trade.entry_price * (1 - self.stop_loss / 100):
-                    sl_triggered = True
             if self.take_profit is not None:
-                if price >= trade.entry_price * (1 - self.take_profit / 100):
-                    tp_triggered = True
-        elif trade.side == "short":
+                levels["take_profit"] = (trade.entry_price * (1 + self.take_profit / 100), ABOVE)
             if self.stop_loss is not None:
-                if price >= trade.entry_price * (1 - self.stop_loss / 100):
-                    sl_triggered = True
+                levels["stop_loss"] = (trade.entry_price * (1 - self.stop_loss / 100), BELOW)
+        elif trade.side == "short":
             if self.take_profit is not None:
-                if price <= trade.entry_price * (1 - self.take_profit / 100):
-                    tp_triggered = True
+                levels["take_profit"] = (trade.entry_price * (1 - self.take_profit / 100), BELOW)
+            if self.stop_loss is not None:
+                levels["stop_loss"] = (trade.entry_price * (1 + self.stop_loss / 100), ABOVE)
+
+        return levels
+
+    def _protect_trade(self, trade: Trade):
+        # Take profit and stop loss rest on the exchange as reduce only stop orders, they are triggered even if
+        # the bot is late or stopped
+        exit_side = "sell" if trade.side == "long" else "buy"
+
+        for kind, (level, _) in self._exit_levels(trade).items():
+            order_status = self.client.place_order(
+                self.contract,
+                PROTECTIVE_ORDER_TYPES[kind],
+                trade.quantity,
+                exit_side,
+                stop_price=level,
+                reduce_only=True,
+            )
+            if order_status is None:
+                self._add_log(
+                    f"Could not place the {kind.replace('_', ' ')} order on {self.contract.symbol} {self.timeframe},"
+                    f" it is checked locally instead"
+                )
+                continue
+
+            trade.protective_ids[kind] = order_status.order_id
+
+        self._register_triggers(trade)
+
+        if len(trade.protective_ids) > 0 and not self.client.private_ws_connected:
+            self.clock.call_later(2.0, lambda: self._check_protective_orders(trade))
+
+    def _check_protective_orders(self, trade: Trade):
+        for kind, order_id in list(trade.protective_ids.items()):
+            if trade.status != "open":
+                return
+
+            order_status = self.client.get_order_status(self.contract, order_id)
+            if order_status is not None:
+                self._protective_order_update(trade, kind, order_status)
+
+        if trade.status == "open" and len(trade.protective_ids) > 0:
+            self.clock.call_later(2.0, lambda: self._check_protective_orders(trade))
 
-        if tp_triggered or sl_triggered:
+    def _protective_order_update(self, trade: Trade, kind: str, order_status: OrderStatus):
+        if order_status.status == "filled":
             self._add_log(
-                f"{'Stop loss' if sl_triggered else 'Take profit'} for {self.contract.symbol} {self.timeframe}"
+                f"{'Stop loss' if kind == 'stop_loss' else 'Take profit'} order filled for"
+                f" {self.contract.symbol} {self.timeframe}"
             )
+            del trade.protective_ids[kind]
+            self._close_trade(trade)
 
-            order_side = "SELL" if trade.side == "long" else "BUY"
-            order_status = self.client.place_order(self.contract, "MARKET", trade.quantity, order_side)
+        elif order_status.status in ["canceled", "expired", "rejected"]:
+            self._add_log(
+                f"{kind.replace('_', ' ').capitalize()} order on {self.contract.symbol} {self.timeframe}"
+                f" is {order_status.status}, it is checked locally instead"
+            )
+            del trade.protective_ids[kind]
+            self._register_triggers(trade)
+
+    def _register_triggers(self, trade: Trade):
+        # Only the levels without an order on the exchange are watched on every trade
+        self._triggers.remove(trade)
+        for kind, (level, direction) in self._exit_levels(trade).items():
+            if kind not in trade.protective_ids:
+                self._triggers.add(level, direction, trade, kind)
+
+    def _close_trade(self, trade: Trade):
+        self._triggers.remove(trade)
+
+        # The opposite protective order would open a new position once the first one closed this one
+        for order_id in trade.protective_ids.values():
+            self.client.cancel_order(self.contract, order_id)
+        trade.protective_ids.clear()
+
+        trade.status = "closed"
+        self.trades_version += 1
+        self.ongoing_position = False
 
-            if order_status is not None:
-                self._add_log(f"Exit order on {self.contract.symbol} {self.timeframe} placed successfully")
-                trade.status = "closed"
-                self.ongoing_position = False
+    def _exit_trade(self, trade: Trade, kind: str):
+        # Both levels of a trade can't be crossed by the same price, but the trade may have been closed in between
+        self._triggers.remove(trade)
+        if trade.status != "open":
+            return
+
+        self._add_log(
+            f"{'Stop loss' if kind == 'stop_loss' else 'Take profit'} for {self.contract.symbol} {self.timeframe}"
+        )
+
+        order_side = "SELL" if trade.side == "long" else "BUY"
+        # Reduce only like the protective orders: if the exchange closed the position in the meantime (the other
+        # level resting there, or a fill missed while disconnected) the exit must not open a reverse position
+        order_status = self.client.place_order(self.contract, "MARKET", trade.quantity, order_side, reduce_only=True)
+
+        if order_status is not None:
+            self._add_log(f"Exit order on {self.contract.symbol} {self.timeframe} placed successfully")
+            self._close_trade(trade)
+        else:
+            # The levels are registered again so the exit is retried on the next trade past them
+            self._register_triggers(trade)
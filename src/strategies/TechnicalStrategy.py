@@ -1,10 +1,9 @@
 from typing import Dict, Tuple
 
-import pandas as pd
-
 from helpers.Strategies import Strategies
 from models.Contract import Contract
 from strategies.Strategy import Strategy
+from strategies.indicators import Macd, Rsi
 
 
 class TechnicalStrategy(Strategy):
@@ -36,38 +35,31 @@ class TechnicalStrategy(Strategy):
 
         self._rsi_length = other_params["rsi_length"]
 
-    def _rsi(self):
-        close_list = [candle.close for candle in self.candles]
-        closes = pd.Series(close_list)
-
-        delta = closes.diff().dropna()
+        self._macd_indicator = Macd(self._ema_fast, self._ema_slow, self._ema_signal)
+        self._rsi_indicator = Rsi(self._rsi_length)
+        self._closed_candles = 0
 
-        up, down = delta.copy(), delta.copy()
-        up[up < 0] = 0
-        down[down > 0] = 0
+    def _update_indicators(self):
+        # The last candle is still being built by parse_trades, only closed candles are fed to the indicators
+        pending = self.candles.total - 1 - self._closed_candles
+        if pending <= 0:
+            return
 
-        avg_gain = up.ewm(com=(self._rsi_length - 1), min_periods=self._rsi_length).mean()
-        avg_loss = down.abs().ewm(com=(self._rsi_length - 1), min_periods=self._rsi_length).mean()
+        for close in self.candles.closes[-pending - 1 : -1].tolist():
+            self._macd_indicator.update(close)
+            self._rsi_indicator.update(close)
 
-        rs = avg_gain / avg_loss
-        rsi = 100 - 100 / (1 + rs)
-        rsi = rsi.round(2)
+        self._closed_candles += pending
 
-        return rsi.iloc[-2]
+    def _rsi(self) -> float:
+        return self._rsi_indicator.value
 
     def _macd(self) -> Tuple[float, float]:
-        close_list = [candle.close for candle in self.candles]
-        closes = pd.Series(close_list)
-
-        ema_fast = closes.ewm(span=self._ema_fast).mean()
-        ema_slow = closes.ewm(span=self._ema_slow).mean()
-
-        macd_line = ema_fast - ema_slow
-        macd_signal = macd_line.ewm(span=self._ema_signal).mean()
-
-        return macd_line.iloc[-2], macd_signal.iloc[-2]
+        return self._macd_indicator.macd_line, self._macd_indicator.macd_signal
 
     def _check_signal(self):
+        self._update_indicators()
+
         macd_line, macd_signal = self._macd()
         rsi = self._rsi()
 
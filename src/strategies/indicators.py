@@ -0,0 +1,79 @@
+import math
+from typing import Tuple
+
+
+class Ema:
+    def __init__(self, span: float = None, com: float = None, min_periods: int = 0):
+        if span is not None:
+            self._alpha = 2 / (span + 1)
+        elif com is not None:
+            self._alpha = 1 / (1 + com)
+        else:
+            raise ValueError("Either span or com must be provided")
+
+        self._min_periods = min_periods
+
+        # Running numerator / denominator of the adjusted weighted average, same as pandas ewm(adjust=True)
+        self._weighted_sum = 0.0
+        self._weights = 0.0
+        self._count = 0
+
+        self.value = math.nan
+
+    def update(self, x: float) -> float:
+        decay = 1 - self._alpha
+        self._weighted_sum = self._weighted_sum * decay + x
+        self._weights = self._weights * decay + 1
+        self._count += 1
+
+        if self._count >= self._min_periods:
+            self.value = self._weighted_sum / self._weights
+
+        return self.value
+
+
+class Macd:
+    def __init__(self, ema_fast: int, ema_slow: int, ema_signal: int):
+        self._ema_fast = Ema(span=ema_fast)
+        self._ema_slow = Ema(span=ema_slow)
+        self._signal = Ema(span=ema_signal)
+
+        self.macd_line = math.nan
+        self.macd_signal = math.nan
+
+    def update(self, close: float) -> Tuple[float, float]:
+        self.macd_line = self._ema_fast.update(close) - self._ema_slow.update(close)
+        self.macd_signal = self._signal.update(self.macd_line)
+
+        return self.macd_line, self.macd_signal
+
+
+class Rsi:
+    def __init__(self, rsi_length: int):
+        self._avg_gain = Ema(com=rsi_length - 1, min_periods=rsi_length)
+        self._avg_loss = Ema(com=rsi_length - 1, min_periods=rsi_length)
+
+        self._previous_close = None
+
+        self.value = math.nan
+
+    def update(self, close: float) -> float:
+        if self._previous_close is None:
+            self._previous_close = close
+            return self.value
+
+        delta = close - self._previous_close
+        self._previous_close = close
+
+        avg_gain = self._avg_gain.update(max(delta, 0.0))
+        avg_loss = self._avg_loss.update(max(-delta, 0.0))
+
+        if math.isnan(avg_gain) or (avg_gain == 0 and avg_loss == 0):
+            self.value = math.nan
+        elif avg_loss == 0:
+            self.value = 100.0
+        else:
+            rs = avg_gain / avg_loss
+            self.value = round(100 - 100 / (1 + rs), 2)
+
+        return self.value
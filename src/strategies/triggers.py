@@ -0,0 +1,77 @@
+import heapq
+import itertools
+import threading
+from typing import Dict, List, Tuple
+
+from models.Trade import Trade
+
+ABOVE = "above"
+BELOW = "below"
+
+
+class _Trigger:
+    def __init__(self, trade: Trade, kind: str):
+        self.trade = trade
+        self.kind = kind
+        self.removed = False
+
+
+class TriggerIndex:
+    def __init__(self):
+        # One heap per direction, its top is the level the price reaches first: the lowest of the ones fired at or
+        # above it, the highest (stored negated) of the ones fired at or below it. Adding and popping a level is
+        # O(log n), removed levels are only marked and dropped when they come to the top
+        self._heaps: Dict[str, List[Tuple[float, int, _Trigger]]] = {ABOVE: [], BELOW: []}
+        self._sequence = itertools.count()
+
+        # Levels registered by every trade, marked when it is removed
+        self._registered: Dict[int, List[_Trigger]] = dict()
+        self._count = 0
+
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return self._count
+
+    def add(self, level: float, direction: str, trade: Trade, kind: str):
+        with self._lock:
+            trigger = _Trigger(trade, kind)
+            key = level if direction == ABOVE else -level
+            heapq.heappush(self._heaps[direction], (key, next(self._sequence), trigger))
+
+            self._registered.setdefault(id(trade), []).append(trigger)
+            self._count += 1
+
+    def remove(self, trade: Trade):
+        with self._lock:
+            for trigger in self._registered.pop(id(trade), []):
+                if not trigger.removed:
+                    trigger.removed = True
+                    self._count -= 1
+
+            # Levels far from the price may never reach the top, the heaps are rebuilt once they are mostly removed
+            # ones
+            size = len(self._heaps[ABOVE]) + len(self._heaps[BELOW])
+            if size > 2 * self._count + 64:
+                for direction, heap in self._heaps.items():
+                    heap = [item for item in heap if not item[2].removed]
+                    heapq.heapify(heap)
+                    self._heaps[direction] = heap
+
+    def pop_crossed(self, price: float) -> List[Tuple[Trade, str]]:
+        # The other levels of a crossed trade stay registered until remove() is called for it
+        with self._lock:
+            crossed = []
+
+            for direction, key in ((ABOVE, price), (BELOW, -price)):
+                heap = self._heaps[direction]
+                while len(heap) > 0 and heap[0][0] <= key:
+                    trigger = heapq.heappop(heap)[2]
+                    if trigger.removed:
+                        continue
+
+                    trigger.removed = True
+                    self._count -= 1
+                    crossed.append((trigger.trade, trigger.kind))
+
+            return crossed
@@ -6,9 +6,10 @@ from tkinter.messagebox import askquestion
 from connectors.binance_futures import BinanceFuturesClient
 from connectors.bitmex import BitmexClient
 from helpers.Exchange import Exchange
+from portfolio.pnl import PnlEngine
 from ui.logging_component import Logging
 from ui.strategy_component import StrategyEditor
-from ui.styling import BG_COLOR
+from ui.styling import BG_COLOR, FG_COLOR_2, GLOBAL_FONT
 from ui.trades_component import TradesWatch
 from ui.watchlist_component import Watchlist
 
@@ -23,6 +24,8 @@ class Root(tk.Tk):
         self.binance = binance
         self.bitmex = bitmex
 
+        self.pnl_engine = PnlEngine([self.binance, self.bitmex])
+
         self.title("Trading Bot")
         self.protocol("WM_DELETE_WINDOW", self._ask_before_close)
 
@@ -51,6 +54,13 @@ class Root(tk.Tk):
         self.logging_frame = Logging(self._left_frame, bg=BG_COLOR)
         self.logging_frame.pack(side=tk.TOP)
 
+        # Share of the REST request budgets used, the requests wait once it is spent
+        self._rate_limits_var = tk.StringVar()
+        self._rate_limits_label = tk.Label(
+            self._left_frame, textvariable=self._rate_limits_var, bg=BG_COLOR, fg=FG_COLOR_2, font=GLOBAL_FONT
+        )
+        self._rate_limits_label.pack(side=tk.TOP)
+
         self._strategy_frame = StrategyEditor(self, self.binance, self.bitmex, self._right_frame, bg=BG_COLOR)
         self._strategy_frame.pack(side=tk.TOP)
 
@@ -64,10 +74,17 @@ class Root(tk.Tk):
         if result == "yes":
             self.binance.reconnect = False
             self.bitmex.reconnect = False
+            self.pnl_engine.stop()
 
+            self.binance.subscriptions.stop()
+            self.bitmex.subscriptions.stop()
             self.binance.ws.close()
             self.bitmex.ws.close()
 
+            # Both clients share the same recorder, what is still queued is written before exiting
+            if self.binance.recorder is not None:
+                self.binance.recorder.stop()
+
             self.destroy()
 
     def _update_ui(self):
@@ -81,6 +98,18 @@ class Root(tk.Tk):
                 self.logging_frame.add_log(log["log"])
                 log["displayed"] = True
 
+        # Rate limits
+        rate_limits = []
+        for client in [self.binance, self.bitmex]:
+            usage = client.rate_limiter.usage
+            text = f"{client.rate_limiter.name} {usage['used_pct']:.0f}%"
+            if usage["blocked_for"] > 0:
+                text += f" (blocked for {usage['blocked_for']:.0f} s)"
+            elif usage["waiting"] > 0:
+                text += f" ({usage['waiting']} waiting)"
+            rate_limits.append(text)
+        self._rate_limits_var.set("Rate limits: " + " | ".join(rate_limits))
+
         # Trades and logs
         for client in [self.binance, self.bitmex]:
             try:
@@ -108,6 +137,8 @@ class Root(tk.Tk):
 
         # Watchlist
         try:
+            binance_streams = []
+            bitmex_topics = []
             for k, v in self._watchlist_frame.body_widgets["symbol"].items():
                 symbol = self._watchlist_frame.body_widgets["symbol"][k].cget("text")
                 exchange = self._watchlist_frame.body_widgets["exchange"][k].cget("text")
@@ -115,8 +146,7 @@ class Root(tk.Tk):
                 if exchange == "Binance":
                     if symbol not in self.binance.contracts:
                         continue
-                    if symbol not in self.binance.ws_subscriptions["bookTicker"] and self.binance.ws_connected:
-                        self.binance.subscribe_channel([self.binance.contracts[symbol]], "bookTicker")
+                    binance_streams.append(self.binance.stream_name(symbol, "bookTicker"))
                     if symbol not in self.binance.prices:
                         self.binance.get_bid_ask(self.binance.contracts[symbol])
                         continue
@@ -127,8 +157,8 @@ class Root(tk.Tk):
                 elif exchange == "Bitmex":
                     if symbol not in self.bitmex.contracts:
                         continue
+                    bitmex_topics.append(f"quote:{symbol}")
                     if symbol not in self.bitmex.prices:
-                        self.binance.get_bid_ask(self.binance.contracts[symbol])
                         continue
 
                     precision = self.bitmex.contracts[symbol].price_decimals
@@ -137,12 +167,15 @@ class Root(tk.Tk):
                 else:
                     continue
 
-                if prices["bid"] is not None:
-                    price_str = "{0:.{prec}f}".format(prices["bid"], prec=precision)
-                    self._watchlist_frame.body_widgets["bid_var"][k].set(price_str)
-                if prices["ask"] is not None:
-                    price_str = "{0:.{prec}f}".format(prices["ask"], prec=precision)
-                    self._watchlist_frame.body_widgets["ask_var"][k].set(price_str)
+                # An empty side of the book is shown empty, not at its last price
+                bid_str = "{0:.{prec}f}".format(prices.bid, prec=precision) if prices.bid is not None else ""
+                self._watchlist_frame.body_widgets["bid_var"][k].set(bid_str)
+                ask_str = "{0:.{prec}f}".format(prices.ask, prec=precision) if prices.ask is not None else ""
+                self._watchlist_frame.body_widgets["ask_var"][k].set(ask_str)
+
+            # Symbols removed from the watchlist are unsubscribed
+            self.binance.subscriptions.replace("watchlist", binance_streams)
+            self.bitmex.subscriptions.replace("watchlist", bitmex_topics)
         except RuntimeError as e:
             logger.error("Error while looping through the watchlist dictionary: %s", e)
 
@@ -4,8 +4,8 @@ from tkinter import ttk
 
 from connectors.binance_futures import BinanceFuturesClient
 from connectors.bitmex import BitmexClient
-from database.database import WorkspaceData
-from helpers.Exchange import Exchange
+from constants import CANDLES_WARMUP_SIZE
+from database.database import WorkspaceData, CandleCache
 from helpers.Strategies import Strategies
 from helpers.validators import check_integer_format, check_float_format
 from strategies.BreakoutStrategy import BreakoutStrategy
@@ -34,6 +34,7 @@ class StrategyEditor(tk.Frame):
         super().__init__(*args, **kwargs)
 
         self.db = WorkspaceData()
+        self._candle_cache = CandleCache()
 
         self.root = root
 
@@ -385,15 +386,13 @@ class StrategyEditor(tk.Frame):
             else:
                 return
 
-            new_strategy.candles = self._exchanges[exchange].get_historical_candles(contract, timeframe)
+            new_strategy.candles.extend(
+                self._candle_cache.load(self._exchanges[exchange], contract, timeframe, CANDLES_WARMUP_SIZE[exchange])
+            )
             if len(new_strategy.candles) == 0:
                 self.root.logging_frame.add_log(f"No historical data retrieved for {contract.symbol}")
                 return
-            if exchange == Exchange.binance.value:
-                self._exchanges[exchange].subscribe_channel([contract], "aggTrade")
-                self._exchanges[exchange].subscribe_channel([contract], "bookTicker")
-
-            self._exchanges[exchange].strategies[b_index] = new_strategy
+            self._exchanges[exchange].add_strategy(b_index, new_strategy)
 
             for param in self._base_params:
                 code_name = param["code_name"]
@@ -402,7 +401,7 @@ class StrategyEditor(tk.Frame):
             self.body_widgets["activation"][b_index].config(bg=BUTTON_GREEN, text="ON")
             self.root.logging_frame.add_log(f"{strategy_selected} strategy on {symbol} / " f"{timeframe} started")
         else:
-            del self._exchanges[exchange].strategies[b_index]
+            self._exchanges[exchange].remove_strategy(b_index)
 
             for param in self._base_params:
                 code_name = param["code_name"]
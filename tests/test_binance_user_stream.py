@@ -0,0 +1,75 @@
+import time
+
+import pytest
+
+from connectors.binance_futures import BinanceFuturesClient
+from mock_exchange.binance import MockBinanceServer
+from models.Trade import Trade
+from strategies.BreakoutStrategy import BreakoutStrategy
+
+
+def wait_for(condition, timeout: float = 10):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.02)
+    return True
+
+
+@pytest.fixture
+def server():
+    server = MockBinanceServer(trades_per_second=0).start()
+    yield server
+    server.stop()
+
+
+@pytest.fixture
+def client(server):
+    client = BinanceFuturesClient("key", "secret", testnet=True, base_url=server.base_url, wss_url=server.wss_url)
+    assert wait_for(lambda: client.private_ws_connected)
+    yield client
+
+    client.reconnect = False
+    client.ws.close()
+    client._user_ws.close()
+    client.subscriptions.stop()
+    client.ingest.stop()
+
+
+def test_fill_missed_while_disconnected_is_reconciled(server, client):
+    contract = client.contracts["BTCUSDT"]
+    strategy = BreakoutStrategy(client, contract, "Binance", "1m", 10, 1, 1, {"min_volume": float("inf")})
+    client.add_strategy(0, strategy)
+
+    # An entry still resting when it is placed, its fill only comes from the user data stream
+    price = server.market.prices["BTCUSDT"]
+    entry = client.place_order(contract, "LIMIT", 0.01, "buy", price=price - 100, time_in_force="GTC")
+    assert entry.status == "new"
+
+    trade = Trade(
+        {
+            "time": 0,
+            "entry_price": None,
+            "contract": contract,
+            "strategy": strategy.strategy_name,
+            "side": "long",
+            "status": "open",
+            "pnl": 0,
+            "quantity": 0.01,
+            "entry_id": entry.order_id,
+        }
+    )
+    strategy.trades.append(trade)
+    strategy.ongoing_position = True
+
+    # The entry is filled while the stream is down, its ORDER_TRADE_UPDATE is lost
+    server.disconnect_websockets()
+    assert wait_for(lambda: not client.private_ws_connected)
+    server.engine.update_trade("BTCUSDT", price - 200, int(time.time() * 1000))
+    assert server.engine.orders[entry.order_id].status == "filled"
+
+    assert wait_for(lambda: trade.entry_price is not None)
+    assert trade.entry_price == pytest.approx(price - 100)
+    assert wait_for(lambda: len(trade.protective_ids) == 2)
+    assert client.orders[entry.order_id].status == "filled"
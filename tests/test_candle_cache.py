@@ -0,0 +1,94 @@
+import time
+
+import pytest
+
+from database.database import CandleCache
+from helpers.Exchange import Exchange
+from models.Candle import Candle
+from models.Contract import Contract
+
+CONTRACT = {"symbol": "BTCUSDT", "baseAsset": "BTC", "quoteAsset": "USDT", "pricePrecision": 2, "quantityPrecision": 3}
+MINUTE = 60000
+
+
+class FakeClient:
+    def __init__(self, fail: bool = False, holes=()):
+        self.ranges = []
+        self.fail = fail
+        # Candles the exchange leaves out of its answer
+        self.holes = set(holes)
+
+    def get_historical_candles_range(self, contract, timeframe, start, end):
+        self.ranges.append((start, end))
+        if self.fail:
+            return None
+        now = int(time.time() * 1000)
+        first = start - start % MINUTE + (MINUTE if start % MINUTE else 0)
+        return [
+            Candle({"ts": ts, "open": 1, "high": 1, "low": 1, "close": 1, "volume": 1}, timeframe, "past_trade")
+            for ts in range(first, min(end, now + 1), MINUTE)
+            if ts not in self.holes
+        ]
+
+
+@pytest.fixture
+def cache(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    return CandleCache()
+
+
+def test_cold_start_fetches_the_window_once(cache):
+    client = FakeClient()
+    candles = cache.load(client, Contract(CONTRACT, Exchange.binance), "1m", 300)
+
+    assert len(candles) == 300
+    assert len(client.ranges) == 1
+
+
+def test_short_cache_fetches_the_missing_head(cache):
+    contract = Contract(CONTRACT, Exchange.binance)
+    cache.load(FakeClient(), contract, "1m", 100)
+
+    client = FakeClient()
+    candles = cache.load(client, contract, "1m", 300)
+
+    assert len(candles) == 300
+    assert len(client.ranges) == 2
+    assert [b.timestamp - a.timestamp for a, b in zip(candles, candles[1:])] == [MINUTE] * 299
+
+
+def test_failed_fetch_returns_and_caches_nothing(cache):
+    contract = Contract(CONTRACT, Exchange.binance)
+    assert cache.load(FakeClient(fail=True), contract, "1m", 300) == []
+    assert cache.get(contract.exchange.name, contract.symbol, "1m", 300) == []
+
+
+def test_hole_in_the_fetched_candles_is_fetched_again(cache):
+    contract = Contract(CONTRACT, Exchange.binance)
+    window = cache.load(FakeClient(), contract, "1m", 300)
+    cache.cursor.execute("DELETE FROM candles")
+
+    # An interior candle is missing from the first answer, only the candles before it are cached
+    hole = window[150].timestamp
+    candles = cache.load(FakeClient(holes=[hole]), contract, "1m", 300)
+    assert hole not in [c.timestamp for c in candles]
+    assert max(c.timestamp for c in cache.get(contract.exchange.name, contract.symbol, "1m", 300)) < hole
+
+    client = FakeClient()
+    candles = cache.load(client, contract, "1m", 300)
+    assert client.ranges[-1][0] < hole
+    assert [b.timestamp - a.timestamp for a, b in zip(candles, candles[1:])] == [MINUTE] * 299
+
+
+def test_hole_left_in_the_cache_is_fetched_again(cache):
+    contract = Contract(CONTRACT, Exchange.binance)
+    window = cache.load(FakeClient(), contract, "1m", 300)
+
+    # Cached before the candles were checked for holes
+    hole = window[150].timestamp
+    cache.cursor.execute("DELETE FROM candles WHERE timestamp = ?", (hole,))
+
+    client = FakeClient()
+    candles = cache.load(client, contract, "1m", 300)
+    assert client.ranges[-1][0] == window[149].timestamp
+    assert [b.timestamp - a.timestamp for a, b in zip(candles, candles[1:])] == [MINUTE] * 299
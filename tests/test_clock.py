@@ -0,0 +1,83 @@
+import pytest
+
+from helpers.clock import Clock, ReplayClock, SimulatedClock
+
+
+def test_clock_is_abstract():
+    with pytest.raises(TypeError):
+        Clock()
+
+
+def test_due_callbacks_run_in_time_order():
+    clock = SimulatedClock(100)
+    calls = []
+
+    clock.call_later(3, lambda: calls.append(("c", clock.time())))
+    clock.call_later(1, lambda: calls.append(("a", clock.time())))
+    clock.call_later(2, lambda: calls.append(("b1", clock.time())))
+    clock.call_later(2, lambda: calls.append(("b2", clock.time())))
+
+    clock.advance(102.5)
+    # Each callback sees the time it was scheduled for, the ones due at the same time run in scheduling order
+    assert calls == [("a", 101), ("b1", 102), ("b2", 102)]
+    assert clock.time() == 102.5
+    assert clock.pending == 1
+
+    clock.advance(110)
+    assert calls[-1] == ("c", 103)
+    assert clock.time() == 110
+    assert clock.pending == 0
+
+
+def test_cancelled_calls_do_not_run():
+    clock = SimulatedClock()
+    calls = []
+
+    call = clock.call_later(1, lambda: calls.append("cancelled"))
+    clock.call_later(2, lambda: calls.append("kept"))
+    call.cancel()
+    assert clock.pending == 1
+
+    clock.advance(5)
+    assert calls == ["kept"]
+
+
+def test_callbacks_can_schedule_new_calls():
+    clock = SimulatedClock()
+    calls = []
+
+    def poll():
+        calls.append(clock.time())
+        if len(calls) < 5:
+            clock.call_later(2, poll)
+
+    clock.call_later(2, poll)
+
+    # The calls scheduled by a callback are due within the same advance and run from the callback's time
+    clock.advance(7)
+    assert calls == [2, 4, 6]
+    assert clock.pending == 1
+
+    clock.advance(100)
+    assert calls == [2, 4, 6, 8, 10]
+
+
+def test_time_never_goes_back():
+    clock = SimulatedClock(10)
+    clock.advance(5)
+    assert clock.time() == 10
+
+
+def test_replay_clock_starts_at_the_first_frame():
+    clock = ReplayClock()
+    calls = []
+
+    clock.update(1700000000000)
+    assert clock.time_ms() == 1700000000000
+
+    clock.call_later(2, lambda: calls.append(clock.time_ms()))
+    clock.update(1700000001000)
+    assert calls == []
+    clock.update(1700000002500)
+    assert calls == [1700000002000]
+    assert clock.time_ms() == 1700000002500
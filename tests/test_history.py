@@ -0,0 +1,52 @@
+from connectors.history import fetch_candles_range
+from models.Candle import Candle
+
+MINUTE = 60000
+START = 1700000000000 - 1700000000000 % MINUTE
+
+
+class FlakyPages:
+    def __init__(self, failures: int, failing_pages: int = 2):
+        # The first pages fail `failures` times before they are answered
+        self.failures = failures
+        self.failing_pages = failing_pages
+        self.calls = dict()
+
+    def __call__(self, start: int, end: int):
+        self.calls[start] = self.calls.get(start, 0) + 1
+        if start < START + self.failing_pages * 10 * MINUTE and self.calls[start] <= self.failures:
+            return None
+
+        return [
+            Candle({"ts": ts, "open": 1, "high": 1, "low": 1, "close": 1, "volume": 1}, "1m", "past_trade")
+            for ts in range(start, end + 1, MINUTE)
+        ]
+
+
+def test_failed_pages_are_retried():
+    fetch_page = FlakyPages(failures=2)
+    candles = fetch_candles_range(fetch_page, "1m", START, START + 100 * MINUTE, 10, 4, retries=2, retry_delay=0)
+
+    assert [c.timestamp for c in candles] == list(range(START, START + 100 * MINUTE, MINUTE))
+    assert fetch_page.calls[START] == 3
+    assert fetch_page.calls[START + 20 * MINUTE] == 1
+
+
+def test_range_with_a_missing_page_is_not_returned():
+    fetch_page = FlakyPages(failures=10, failing_pages=1)
+    candles = fetch_candles_range(fetch_page, "1m", START, START + 100 * MINUTE, 10, 4, retries=2, retry_delay=0)
+
+    assert candles is None
+    assert fetch_page.calls[START] == 3
+
+
+def test_empty_pages_are_not_failures():
+    # Nothing was traded before the listing, those pages are empty and not asked again
+    calls = []
+
+    def fetch_page(start: int, end: int):
+        calls.append(start)
+        return []
+
+    assert fetch_candles_range(fetch_page, "1m", START, START + 30 * MINUTE, 10, 2, retries=2, retry_delay=0) == []
+    assert len(calls) == 3
@@ -0,0 +1,109 @@
+import math
+from types import SimpleNamespace
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from helpers.clock import SimulatedClock
+from helpers.Exchange import Exchange
+from models.CandleBuffer import CandleBuffer
+from models.Contract import Contract
+from strategies.indicators import Ema, Macd, Rsi
+from strategies.TechnicalStrategy import TechnicalStrategy
+
+CONTRACT = {"symbol": "BTCUSDT", "baseAsset": "BTC", "quoteAsset": "USDT", "pricePrecision": 2, "quantityPrecision": 3}
+
+
+@pytest.fixture
+def closes() -> np.ndarray:
+    rng = np.random.default_rng(42)
+    return np.round(30000 * np.exp(np.cumsum(rng.normal(0, 0.002, 3000))), 2)
+
+
+def pandas_macd(closes: np.ndarray, fast: int, slow: int, signal: int):
+    closes = pd.Series(closes)
+    macd_line = closes.ewm(span=fast).mean() - closes.ewm(span=slow).mean()
+    return macd_line.to_numpy(), macd_line.ewm(span=signal).mean().to_numpy()
+
+
+def pandas_rsi(closes: np.ndarray, length: int) -> np.ndarray:
+    # The implementation TechnicalStrategy had before the incremental indicators
+    delta = pd.Series(closes).diff().dropna()
+
+    up, down = delta.copy(), delta.copy()
+    up[up < 0] = 0
+    down[down > 0] = 0
+
+    avg_gain = up.ewm(com=(length - 1), min_periods=length).mean()
+    avg_loss = down.abs().ewm(com=(length - 1), min_periods=length).mean()
+
+    rsi = (100 - 100 / (1 + avg_gain / avg_loss)).round(2)
+    return np.concatenate(([math.nan], rsi.to_numpy()))
+
+
+@pytest.mark.parametrize("span, com, min_periods", [(12, None, 0), (26, None, 0), (None, 13, 14), (None, 4, 5)])
+def test_ema_matches_pandas(closes, span, com, min_periods):
+    ema = Ema(span=span, com=com, min_periods=min_periods)
+    values = [ema.update(c) for c in closes.tolist()]
+
+    expected = pd.Series(closes).ewm(span=span, com=com, min_periods=min_periods).mean().to_numpy()
+    np.testing.assert_allclose(values, expected, rtol=1e-12, equal_nan=True)
+
+
+def test_ema_needs_span_or_com():
+    with pytest.raises(ValueError):
+        Ema()
+
+
+@pytest.mark.parametrize("fast, slow, signal", [(12, 26, 9), (5, 35, 5)])
+def test_macd_matches_pandas(closes, fast, slow, signal):
+    macd = Macd(fast, slow, signal)
+    values = np.array([macd.update(c) for c in closes.tolist()])
+
+    macd_line, macd_signal = pandas_macd(closes, fast, slow, signal)
+    np.testing.assert_allclose(values[:, 0], macd_line, rtol=1e-9, atol=1e-9)
+    np.testing.assert_allclose(values[:, 1], macd_signal, rtol=1e-9, atol=1e-9)
+
+
+@pytest.mark.parametrize("length", [14, 5, 30])
+def test_rsi_matches_pandas(closes, length):
+    rsi = Rsi(length)
+    values = [rsi.update(c) for c in closes.tolist()]
+
+    expected = pandas_rsi(closes, length)
+    # The warm-up region is NaN on both sides
+    assert all(math.isnan(v) for v in values[:length])
+    np.testing.assert_allclose(values, expected, atol=1e-9, equal_nan=True)
+
+
+def test_rsi_without_losses():
+    rsi = Rsi(3)
+    values = [rsi.update(c) for c in [1.0, 1.0, 2.0, 3.0, 4.0, 5.0]]
+
+    np.testing.assert_allclose(values, pandas_rsi(np.array([1.0, 1.0, 2.0, 3.0, 4.0, 5.0]), 3), equal_nan=True)
+
+
+def test_technical_strategy_indicators_across_buffer_wrap(closes):
+    # The candle buffer is much smaller than the series, its ring wraps several times while the indicators keep
+    # being fed the closed candles
+    client = SimpleNamespace(clock=SimulatedClock())
+    contract = Contract(CONTRACT, Exchange.binance)
+    params = {"ema_fast": 12, "ema_slow": 26, "ema_signal": 9, "rsi_length": 14}
+    strategy = TechnicalStrategy(client, contract, "Binance", "1m", 10, None, None, params)
+    strategy.candles = CandleBuffer(500)
+
+    macd_line, macd_signal = pandas_macd(closes, 12, 26, 9)
+    rsi = pandas_rsi(closes, 14)
+
+    for i, close in enumerate(closes.tolist()):
+        strategy.candles.append(i * 60000, close, close, close, close, 1)
+        if i == 0:
+            continue
+
+        # Only the candles before the running one are closed
+        strategy._update_indicators()
+        line, signal = strategy._macd()
+        assert line == pytest.approx(macd_line[i - 1], rel=1e-9, abs=1e-9)
+        assert signal == pytest.approx(macd_signal[i - 1], rel=1e-9, abs=1e-9)
+        assert strategy._rsi() == pytest.approx(rsi[i - 1], abs=1e-9, nan_ok=True)
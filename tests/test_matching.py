@@ -0,0 +1,118 @@
+import pytest
+
+from mock_exchange.matching import MARKET, STOP_MARKET, TAKE_PROFIT_MARKET, MatchingEngine, OrderRejected
+
+
+def linear_engine(fee_rate: float = 0.0) -> MatchingEngine:
+    engine = MatchingEngine(
+        1000.0,
+        lambda symbol, quantity, entry, exit_price: quantity * (exit_price - entry),
+        lambda symbol, quantity, price: abs(quantity * price),
+        fee_rate,
+    )
+    engine.update_quote("BTCUSDT", 100.0, 100.0)
+    engine.update_trade("BTCUSDT", 100.0, 0)
+    return engine
+
+
+def test_reduce_only_without_position_expires():
+    engine = linear_engine()
+    order = engine.submit("BTCUSDT", "sell", MARKET, 1, 0, reduce_only=True)
+
+    assert order.status == "expired"
+    assert "BTCUSDT" not in engine.positions or engine.positions["BTCUSDT"].quantity == 0
+
+
+def test_reduce_only_in_the_position_direction_expires():
+    engine = linear_engine()
+    engine.submit("BTCUSDT", "buy", MARKET, 1, 0)
+    order = engine.submit("BTCUSDT", "buy", MARKET, 1, 0, reduce_only=True)
+
+    assert order.status == "expired"
+    assert engine.positions["BTCUSDT"].quantity == 1
+
+
+def test_reduce_only_is_capped_to_the_position():
+    engine = linear_engine()
+    engine.submit("BTCUSDT", "buy", MARKET, 1, 0)
+    order = engine.submit("BTCUSDT", "sell", MARKET, 3, 0, reduce_only=True)
+
+    assert order.status == "filled"
+    assert order.filled == 1
+    assert engine.positions["BTCUSDT"].quantity == 0
+
+
+def test_resting_reduce_only_stop_expires_once_the_position_is_closed():
+    engine = linear_engine()
+    engine.submit("BTCUSDT", "buy", MARKET, 1, 0)
+    stop = engine.submit("BTCUSDT", "sell", STOP_MARKET, 1, 0, stop_price=90, reduce_only=True)
+    engine.submit("BTCUSDT", "sell", MARKET, 1, 0)
+
+    engine.update_trade("BTCUSDT", 89, 1)
+    assert stop.status == "expired"
+    assert engine.positions["BTCUSDT"].quantity == 0
+
+
+@pytest.mark.parametrize(
+    "side, order_type, stop_price, untriggered, triggered",
+    [
+        ("sell", STOP_MARKET, 90, 95, 90),
+        ("buy", STOP_MARKET, 110, 105, 110),
+        ("sell", TAKE_PROFIT_MARKET, 110, 105, 111),
+        ("buy", TAKE_PROFIT_MARKET, 90, 95, 89),
+    ],
+)
+def test_stop_trigger_direction(side, order_type, stop_price, untriggered, triggered):
+    engine = linear_engine()
+    order = engine.submit("BTCUSDT", side, order_type, 1, 0, stop_price=stop_price)
+
+    engine.update_trade("BTCUSDT", untriggered, 1)
+    assert order.status == "new"
+
+    engine.update_quote("BTCUSDT", triggered, triggered)
+    engine.update_trade("BTCUSDT", triggered, 2)
+    assert order.status == "filled"
+    assert order.avg_price == triggered
+
+
+@pytest.mark.parametrize("side, order_type, stop_price", [("sell", STOP_MARKET, 101), ("sell", TAKE_PROFIT_MARKET, 99)])
+def test_stop_that_would_trigger_immediately_is_rejected(side, order_type, stop_price):
+    engine = linear_engine()
+    with pytest.raises(OrderRejected):
+        engine.submit("BTCUSDT", side, order_type, 1, 0, stop_price=stop_price)
+
+
+def test_pnl_on_flips():
+    engine = linear_engine()
+    engine.submit("BTCUSDT", "buy", MARKET, 1, 0)
+
+    # Long 1 at 100 flipped to short 2 at 110: the closed unit realizes 10
+    engine.update_quote("BTCUSDT", 110, 110)
+    engine.submit("BTCUSDT", "sell", MARKET, 3, 1)
+    position = engine.positions["BTCUSDT"]
+    assert (position.quantity, position.entry_price) == (-2, 110)
+    assert engine.balance == pytest.approx(1010)
+
+    # Short 2 at 110 flipped to long 1 at 105: 2 * 5 realized
+    engine.update_quote("BTCUSDT", 105, 105)
+    engine.submit("BTCUSDT", "buy", MARKET, 3, 2)
+    assert (position.quantity, position.entry_price) == (1, 105)
+    assert engine.balance == pytest.approx(1020)
+
+
+def test_inverse_pnl_and_fees_on_flips():
+    # Bitmex inverse contract, 1 USD per contract and the balance in XBT
+    engine = MatchingEngine(
+        1.0,
+        lambda symbol, quantity, entry, exit_price: quantity * (1 / entry - 1 / exit_price),
+        lambda symbol, quantity, price: abs(quantity / price),
+        0.001,
+    )
+    engine.update_quote("XBTUSD", 20000, 20000)
+    engine.submit("XBTUSD", "buy", MARKET, 1000, 0)
+    engine.update_quote("XBTUSD", 25000, 25000)
+    engine.submit("XBTUSD", "sell", MARKET, 2000, 1)
+
+    fees = 0.001 * (1000 / 20000 + 2000 / 25000)
+    assert engine.balance == pytest.approx(1.0 + 1000 * (1 / 20000 - 1 / 25000) - fees)
+    assert (engine.positions["XBTUSD"].quantity, engine.positions["XBTUSD"].entry_price) == (-1000, 25000)
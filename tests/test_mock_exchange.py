@@ -0,0 +1,101 @@
+import time
+
+import pytest
+
+from connectors.binance_futures import BinanceFuturesClient
+from connectors.bitmex import BitmexClient
+from constants import MOCK_BINANCE_BALANCE
+from mock_exchange.binance import MockBinanceServer
+from mock_exchange.bitmex import MockBitmexServer
+from mock_exchange.server import MockExchangeServer
+
+
+def wait_for(condition, timeout: float = 10):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.02)
+    return True
+
+
+def test_server_needs_the_market_callbacks():
+    with pytest.raises(TypeError):
+        MockExchangeServer({}, {}, {})
+
+
+@pytest.fixture
+def binance():
+    server = MockBinanceServer(trades_per_second=50).start()
+    client = BinanceFuturesClient("key", "secret", testnet=True, base_url=server.base_url, wss_url=server.wss_url)
+    yield server, client
+
+    client.reconnect = False
+    client.ws.close()
+    client._user_ws.close()
+    client.subscriptions.stop()
+    client.ingest.stop()
+    server.stop()
+
+
+@pytest.fixture
+def bitmex():
+    server = MockBitmexServer(trades_per_second=50).start()
+    client = BitmexClient("key", "secret", testnet=True, base_url=server.base_url, wss_url=server.wss_url)
+    client.subscriptions.replace("watchlist", ["quote:XBTUSD"])
+    yield server, client
+
+    client.reconnect = False
+    client.ws.close()
+    client.subscriptions.stop()
+    client.ingest.stop()
+    server.stop()
+
+
+def test_binance_client_end_to_end(binance):
+    server, client = binance
+    contract = client.contracts["BTCUSDT"]
+    assert wait_for(lambda: client.private_ws_connected and "BTCUSDT" in client.prices)
+
+    order = client.place_order(contract, "MARKET", 0.01, "buy")
+    assert order.status == "filled"
+    assert wait_for(lambda: order.order_id in client.orders)
+    # The fee is taken from the balance, the user data stream pushes the new one
+    assert server.engine.balance < MOCK_BINANCE_BALANCE
+    assert wait_for(lambda: client.balances["USDT"].wallet_balance == pytest.approx(server.engine.balance))
+    assert server.engine.positions["BTCUSDT"].quantity == pytest.approx(0.01)
+
+    # The exchange drops every connection: market data and the user data stream come back on their own
+    server.disconnect_websockets()
+    assert wait_for(lambda: not client.private_ws_connected)
+    assert wait_for(lambda: client.private_ws_connected)
+    seq = client.prices["BTCUSDT"].seq
+    assert wait_for(lambda: client.prices["BTCUSDT"].seq > seq)
+
+    order = client.place_order(contract, "MARKET", 0.01, "sell", reduce_only=True)
+    assert order.status == "filled"
+    assert wait_for(lambda: order.order_id in client.orders)
+    assert server.engine.positions["BTCUSDT"].quantity == pytest.approx(0)
+
+
+def test_bitmex_client_end_to_end(bitmex):
+    server, client = bitmex
+    contract = client.contracts["XBTUSD"]
+    assert wait_for(lambda: client.private_ws_connected and "XBTUSD" in client.prices)
+
+    order = client.place_order(contract, "MARKET", 100, "buy")
+    assert order.status == "filled"
+    # The row is inserted as New, then updated by the fill
+    assert wait_for(lambda: client.tables["order"].get((order.order_id,), {}).get("ordStatus") == "Filled")
+    assert server.engine.positions["XBTUSD"].quantity == 100
+
+    server.disconnect_websockets()
+    assert wait_for(lambda: not client.private_ws_connected)
+    assert wait_for(lambda: client.private_ws_connected)
+    seq = client.prices["XBTUSD"].seq
+    assert wait_for(lambda: client.prices["XBTUSD"].seq > seq)
+
+    order = client.place_order(contract, "MARKET", 100, "sell", reduce_only=True)
+    assert order.status == "filled"
+    assert wait_for(lambda: client.get_order_status(contract, order.order_id).status == "filled")
+    assert server.engine.positions["XBTUSD"].quantity == 0
@@ -0,0 +1,35 @@
+import json
+
+import numpy as np
+
+from backtesting.optimizer import optimize
+from helpers.Strategies import Strategies
+
+
+def test_numpy_param_space_is_written_to_the_results_file(tmp_path):
+    rng = np.random.default_rng(0)
+    closes = 30000 * np.exp(np.cumsum(rng.normal(0, 0.002, 2000)))
+    candles = {
+        "timestamp": np.arange(2000, dtype=np.int64) * 60000,
+        "open": closes,
+        "high": closes * 1.001,
+        "low": closes * 0.999,
+        "close": closes,
+        "volume": rng.uniform(0, 100, 2000),
+    }
+    param_space = {"min_volume": np.arange(10, 50, 10), "take_profit": np.arange(0.5, 1.5, 0.5), "stop_loss": [0.5]}
+    results_path = str(tmp_path / "results.jsonl")
+
+    results = optimize(Strategies.breakout, candles, param_space, processes=2, results_path=results_path)
+    assert len(results) == 8
+
+    with open(results_path) as f:
+        written = [json.loads(line) for line in f]
+    assert sorted(json.dumps(r["params"], sort_keys=True) for r in written) == sorted(
+        json.dumps(r["params"], sort_keys=True) for r in results
+    )
+
+    # A second run finds every combination in the file
+    assert len(optimize(Strategies.breakout, candles, param_space, processes=2, results_path=results_path)) == 8
+    with open(results_path) as f:
+        assert len(f.readlines()) == 8
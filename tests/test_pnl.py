@@ -0,0 +1,136 @@
+from types import SimpleNamespace
+
+import pytest
+
+from helpers.Exchange import Exchange
+from models.Contract import Contract
+from models.Trade import Trade
+from portfolio.pnl import PnlEngine
+
+BTCUSDT = {"symbol": "BTCUSDT", "baseAsset": "BTC", "quoteAsset": "USDT", "pricePrecision": 2, "quantityPrecision": 3}
+XBTUSD = {
+    "symbol": "XBTUSD",
+    "rootSymbol": "XBT",
+    "quoteCurrency": "USD",
+    "tickSize": 0.5,
+    "lotSize": 100,
+    "multiplier": -100000000,
+    "isQuanto": False,
+    "isInverse": True,
+    "settlCurrency": "XBt",
+}
+ETHUSD = {
+    "symbol": "ETHUSD",
+    "rootSymbol": "ETH",
+    "quoteCurrency": "USD",
+    "tickSize": 0.05,
+    "lotSize": 1,
+    "multiplier": 100,
+    "isQuanto": True,
+    "isInverse": False,
+    "settlCurrency": "XBt",
+}
+XBTUSDT = {
+    "symbol": "XBTUSDT",
+    "rootSymbol": "XBT",
+    "quoteCurrency": "USDT",
+    "tickSize": 0.5,
+    "lotSize": 1000,
+    "multiplier": 1,
+    "isQuanto": False,
+    "isInverse": False,
+    "settlCurrency": "USDt",
+}
+
+
+class FakePrices:
+    def __init__(self, quotes):
+        self.quotes = quotes
+
+    def snapshot(self):
+        return {symbol: SimpleNamespace(bid=bid, ask=ask) for symbol, (bid, ask) in self.quotes.items()}
+
+
+def make_client(exchange, quotes, trades):
+    strategy = SimpleNamespace(trades=trades, trades_version=1)
+    return SimpleNamespace(exchange=exchange, prices=FakePrices(quotes), strategies={0: strategy})
+
+
+def make_trade(contract, side, entry_price, quantity):
+    return Trade(
+        {
+            "time": 0,
+            "entry_price": entry_price,
+            "contract": contract,
+            "strategy": "Test",
+            "side": side,
+            "status": "open",
+            "pnl": 0,
+            "quantity": quantity,
+            "entry_id": 1,
+        }
+    )
+
+
+def trade_pnl(trade, bid, ask):
+    # One position at a time, closed at the bid if long and at the ask if short
+    contract = trade.contract
+    price = bid if trade.side == "long" else ask
+    side = 1 if trade.side == "long" else -1
+    if contract.exchange == Exchange.binance:
+        return side * (price - trade.entry_price) * trade.quantity
+    if contract.inverse:
+        return side * (1 / trade.entry_price - 1 / price) * contract.multiplier * trade.quantity
+    return side * (price - trade.entry_price) * contract.multiplier * trade.quantity
+
+
+def test_revaluation_matches_the_per_trade_pnl():
+    btcusdt = Contract(BTCUSDT, Exchange.binance)
+    xbtusd = Contract(XBTUSD, Exchange.bitmex)
+    ethusd = Contract(ETHUSD, Exchange.bitmex)
+    xbtusdt = Contract(XBTUSDT, Exchange.bitmex)
+
+    binance_quotes = {"BTCUSDT": (30100.0, 30101.0)}
+    bitmex_quotes = {"XBTUSD": (29500.0, 29500.5), "ETHUSD": (2100.0, 2100.05), "XBTUSDT": (31000.0, 31000.5)}
+    binance_trades = [make_trade(btcusdt, "long", 30000.0, 0.5), make_trade(btcusdt, "short", 30050.0, 0.2)]
+    bitmex_trades = [
+        make_trade(xbtusd, "long", 30000.0, 3000),
+        make_trade(xbtusd, "short", 29000.0, 1000),
+        make_trade(ethusd, "long", 2000.0, 10),
+        make_trade(xbtusdt, "short", 30000.0, 2000000),
+    ]
+
+    engine = PnlEngine(
+        [
+            make_client(Exchange.binance, binance_quotes, binance_trades),
+            make_client(Exchange.bitmex, bitmex_quotes, bitmex_trades),
+        ],
+        interval=None,
+    )
+    total = engine.revalue()
+
+    for trade in binance_trades:
+        assert trade.pnl == pytest.approx(trade_pnl(trade, *binance_quotes[trade.contract.symbol]))
+    for trade in bitmex_trades:
+        assert trade.pnl == pytest.approx(trade_pnl(trade, *bitmex_quotes[trade.contract.symbol]))
+
+    # Inverse and quanto contracts settle in XBT, the linear one in USDT like Binance
+    assert xbtusdt.settlement_currency == "USDT"
+    # 2 XBT short, closed at the ask, 1000.5 higher
+    assert bitmex_trades[3].pnl == pytest.approx(-2 * 1000.5)
+    assert total == pytest.approx(
+        {
+            "USDT": sum(t.pnl for t in binance_trades) + bitmex_trades[3].pnl,
+            "XBT": sum(t.pnl for t in bitmex_trades[:3]),
+        }
+    )
+    assert engine.per_exchange == pytest.approx(
+        {"Binance": sum(t.pnl for t in binance_trades), "Bitmex": sum(t.pnl for t in bitmex_trades)}
+    )
+
+
+def test_contract_settlement_currency_without_the_bitmex_field():
+    info = dict(XBTUSD)
+    del info["settlCurrency"]
+    assert Contract(info, Exchange.bitmex).settlement_currency == "XBT"
+    assert Contract(info, Exchange.bitmex).multiplier == pytest.approx(1)
@@ -0,0 +1,60 @@
+import json
+
+from connectors.bitmex import BitmexClient
+from helpers.Exchange import Exchange
+from models.Contract import Contract
+from models.PriceBoard import PriceBoard
+
+XBTUSD = {
+    "symbol": "XBTUSD",
+    "rootSymbol": "XBT",
+    "quoteCurrency": "USD",
+    "tickSize": 0.5,
+    "lotSize": 100,
+    "multiplier": -100000000,
+    "isQuanto": False,
+    "isInverse": True,
+}
+
+
+def test_partial_update_keeps_the_other_side():
+    prices = PriceBoard()
+    prices.update("XBTUSD", bid=30000.0)
+    assert prices["XBTUSD"].bid == 30000.0
+    assert prices["XBTUSD"].ask is None
+
+    prices.update("XBTUSD", ask=30000.5)
+    prices.update("XBTUSD", bid=30001.0)
+    assert (prices["XBTUSD"].bid, prices["XBTUSD"].ask) == (30001.0, 30000.5)
+
+
+def test_empty_side_is_not_left_at_its_last_price():
+    prices = PriceBoard()
+    prices.update("XBTUSD", 30000.0, 30000.5)
+
+    seq = prices.seq
+    prices.update("XBTUSD", bid=None)
+    assert prices["XBTUSD"].bid is None
+    assert prices["XBTUSD"].ask == 30000.5
+    assert prices["XBTUSD"].seq > seq
+
+
+def test_bitmex_quote_with_a_null_side():
+    contract = Contract(XBTUSD, Exchange.bitmex)
+    client = BitmexClient(None, None, testnet=True, contracts={contract.symbol: contract}, connect=False)
+
+    def quote(**sides):
+        data = dict(symbol="XBTUSD", timestamp="2023-11-14T22:13:20.000Z", **sides)
+        client._on_message(None, json.dumps({"table": "quote", "action": "insert", "data": [data]}))
+
+    try:
+        quote(bidPrice=30000.0, askPrice=30000.5)
+        quote(askPrice=30001.0)
+        assert (client.prices["XBTUSD"].bid, client.prices["XBTUSD"].ask) == (30000.0, 30001.0)
+
+        # The bids were all pulled
+        quote(bidPrice=None)
+        assert (client.prices["XBTUSD"].bid, client.prices["XBTUSD"].ask) == (None, 30001.0)
+    finally:
+        client.subscriptions.stop()
+        client.ingest.stop()
@@ -0,0 +1,147 @@
+import threading
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from connectors.binance_futures import BinanceFuturesClient
+from connectors.bitmex import BitmexClient
+from connectors.rate_limiter import RateLimiter
+from constants import BINANCE_CONTRACTS_URL, BINANCE_ORDER_URL, BITMEX_CONTRACTS_URL
+from helpers.Methods import Methods
+
+
+class FakeMonotonic:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def make_limiter(capacity: float = 10, window: float = 10, priority_reserve: float = 0.1):
+    monotonic = FakeMonotonic()
+    return RateLimiter("Test", capacity, window, priority_reserve, monotonic), monotonic
+
+
+def test_token_bucket_refills_with_time():
+    limiter, monotonic = make_limiter(priority_reserve=0)
+
+    assert limiter.acquire(4, blocking=False)
+    assert limiter.acquire(6, blocking=False)
+    assert not limiter.acquire(1, blocking=False)
+    assert limiter.usage["used_pct"] == 100
+
+    # One token a second, up to the capacity
+    monotonic.now += 3
+    assert limiter.usage["available"] == pytest.approx(3)
+    assert not limiter.acquire(4, blocking=False)
+    assert limiter.acquire(3, blocking=False)
+
+    monotonic.now += 60
+    assert limiter.usage["available"] == pytest.approx(10)
+
+
+def test_priority_reserve_is_kept_for_orders():
+    limiter, monotonic = make_limiter()
+
+    for _ in range(9):
+        assert limiter.acquire(blocking=False)
+    # The last token is only for priority requests
+    assert not limiter.acquire(blocking=False)
+    assert limiter.acquire(priority=True, blocking=False)
+    assert not limiter.acquire(priority=True, blocking=False)
+
+
+def test_market_data_steps_aside_while_an_order_waits():
+    limiter, monotonic = make_limiter(capacity=100, window=1)
+    assert limiter.acquire(100, priority=True, blocking=False)
+
+    acquired = []
+    order = threading.Thread(target=lambda: acquired.append(limiter.acquire(50, priority=True)), daemon=True)
+    order.start()
+    deadline = time.monotonic() + 5
+    while limiter.usage["waiting"] == 0 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert limiter.usage["waiting"] == 1
+
+    # Enough for a market data request past the reserve, not for the order
+    monotonic.now += 0.3
+    assert not limiter.acquire(1, blocking=False)
+
+    monotonic.now += 0.5
+    order.join(5)
+    assert acquired == [True]
+    assert limiter.acquire(1, blocking=False)
+
+
+def test_sync_only_lowers_the_local_budget():
+    limiter, monotonic = make_limiter(capacity=100)
+
+    # Other clients of the same key or IP used most of the budget
+    limiter.sync(used=80)
+    assert limiter.usage["available"] == pytest.approx(20)
+
+    limiter.sync(remaining=50)
+    assert limiter.usage["available"] == pytest.approx(20)
+    limiter.sync(remaining=5)
+    assert limiter.usage["available"] == pytest.approx(5)
+
+    # A new capacity scales the priority reserve with it
+    limiter.sync(remaining=200, capacity=200)
+    assert limiter.capacity == 200
+    monotonic.now += 5
+    assert limiter.usage["available"] == pytest.approx(105)
+    assert not limiter.acquire(86, blocking=False)
+    assert limiter.acquire(85, blocking=False)
+
+
+def test_block_pauses_every_request():
+    limiter, monotonic = make_limiter()
+
+    limiter.block(30)
+    assert limiter.usage["blocked_for"] == 30
+    assert not limiter.acquire(priority=True, blocking=False)
+
+    monotonic.now += 29
+    assert not limiter.acquire(priority=True, blocking=False)
+    monotonic.now += 1
+    assert limiter.acquire(priority=True, blocking=False)
+    assert limiter.usage["blocked_for"] == 0
+
+
+def make_client(client_class, status_code: int, headers):
+    # Only the request path is exercised, without connecting anywhere
+    client = object.__new__(client_class)
+    client.rate_limiter, monotonic = make_limiter(capacity=100, window=60)
+    client._private_key = "secret"
+    client._public_key = "key"
+    client.clock = SimpleNamespace(time=lambda: 1700000000)
+    response = SimpleNamespace(status_code=status_code, headers=headers, json=lambda: {"msg": "error"})
+    client._transport = SimpleNamespace(request=lambda *args: response)
+    return client, monotonic
+
+
+def test_binance_weight_header_and_ban():
+    client, monotonic = make_client(BinanceFuturesClient, 200, {"X-MBX-USED-WEIGHT-1M": "90"})
+    client._make_request(Methods.GET, BINANCE_CONTRACTS_URL, None)
+    assert client.rate_limiter.usage["available"] == pytest.approx(10)
+
+    for status_code in (418, 429):
+        client, monotonic = make_client(BinanceFuturesClient, status_code, {"Retry-After": "120"})
+        assert client._make_request(Methods.GET, BINANCE_ORDER_URL, None) is None
+        assert client.rate_limiter.usage["blocked_for"] == 120
+        assert client._make_request(Methods.GET, BINANCE_ORDER_URL, None, blocking=False) is None
+
+
+def test_bitmex_remaining_header_and_ban():
+    client, monotonic = make_client(BitmexClient, 200, {"x-ratelimit-remaining": "30", "x-ratelimit-limit": "120"})
+    client._make_request(Methods.GET, BITMEX_CONTRACTS_URL, dict())
+    assert client.rate_limiter.capacity == 120
+    assert client.rate_limiter.usage["available"] == pytest.approx(30)
+
+    client, monotonic = make_client(BitmexClient, 429, {"Retry-After": "5"})
+    assert client._make_request(Methods.GET, BITMEX_CONTRACTS_URL, dict()) is None
+    assert client.rate_limiter.usage["blocked_for"] == 5
+    monotonic.now += 5
+    assert client.rate_limiter.acquire(priority=True, blocking=False)
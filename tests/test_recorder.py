@@ -0,0 +1,139 @@
+import json
+import os
+import shutil
+import time
+
+from connectors.bitmex import BitmexClient
+from helpers.Exchange import Exchange
+from models.Contract import Contract
+from recording.recorder import INDEX_FILE, MarketDataRecorder, load_index
+from recording.replay import iter_frames
+
+START = 1700000000000
+
+XBTUSD = {
+    "symbol": "XBTUSD",
+    "rootSymbol": "XBT",
+    "quoteCurrency": "USD",
+    "tickSize": 0.5,
+    "lotSize": 100,
+    "multiplier": -100000000,
+    "isQuanto": False,
+    "isInverse": True,
+}
+
+
+def frame(i: int) -> str:
+    return json.dumps({"e": "aggTrade", "s": "BTCUSDT", "a": i, "p": "30000.0", "q": "0.010", "T": START + i})
+
+
+def wait_for(condition, timeout: float = 10):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.02)
+    return True
+
+
+def test_segments_are_rotated_and_indexed(tmp_path):
+    directory = str(tmp_path)
+    recorder = MarketDataRecorder(directory, segment_bytes=1000, segment_seconds=60)
+    for i in range(30):
+        recorder.record("binance", frame(i), START + i * 1000)
+    # More than a minute after the start of the segment
+    recorder.record("bitmex", frame(30), START + 200000)
+    recorder.stop()
+
+    index = load_index(directory)
+    assert index == recorder.index
+    assert len(index) > 2
+    assert sorted(os.listdir(directory)) == sorted([INDEX_FILE] + [s["file"] for s in index])
+    assert all(s["bytes"] >= 1000 for s in index[:-2])
+    assert index[-1]["start"] == index[-1]["end"] == START + 200000
+    assert index[-1]["sources"] == ["bitmex"]
+    assert sum(s["frames"] for s in index) == 31
+
+    frames = list(iter_frames(directory))
+    assert [f for _, _, f in frames] == [frame(i) for i in range(31)]
+    assert [s for _, s, _ in frames] == ["binance"] * 30 + ["bitmex"]
+    assert [t for t, _, _ in iter_frames(directory, START + 10000, START + 12000)] == [
+        START + 10000,
+        START + 11000,
+        START + 12000,
+    ]
+
+
+def test_oldest_segments_are_deleted_past_the_disk_budget(tmp_path):
+    directory = str(tmp_path)
+    recorder = MarketDataRecorder(directory, segment_bytes=1000, max_bytes=2000)
+    for i in range(200):
+        recorder.record("binance", frame(i), START + i)
+    recorder.stop()
+
+    index = load_index(directory)
+    assert sum(s["size"] for s in index) <= 2000
+    assert sorted(os.listdir(directory)) == sorted([INDEX_FILE] + [s["file"] for s in index])
+
+    # The newest frames are kept
+    frames = list(iter_frames(directory))
+    assert len(frames) < 200
+    assert [f for _, _, f in frames] == [frame(i) for i in range(200 - len(frames), 200)]
+
+
+def test_segment_left_open_by_a_crash_is_recovered(tmp_path):
+    directory = str(tmp_path / "live")
+    recorder = MarketDataRecorder(directory, flush_interval=0.05)
+    for i in range(10):
+        recorder.record("binance", frame(i), START + i)
+    assert wait_for(lambda: recorder.recorded == 10)
+    time.sleep(0.3)
+
+    # The process dies: the segment was flushed but never closed nor indexed
+    copy = str(tmp_path / "copy")
+    shutil.copytree(directory, copy)
+    assert load_index(copy) == []
+
+    recovered = MarketDataRecorder(copy)
+    recovered.stop()
+    recorder.stop()
+
+    index = load_index(copy)
+    assert len(index) == 1
+    assert index[0]["start"] == START
+    assert index[0]["end"] == START + 9
+    assert index[0]["frames"] == 10
+    assert [f for _, _, f in iter_frames(copy)] == [frame(i) for i in range(10)]
+
+
+def test_bitmex_private_tables_are_not_recorded(tmp_path):
+    recorder = MarketDataRecorder(str(tmp_path))
+    contract = Contract(XBTUSD, Exchange.bitmex)
+    client = BitmexClient(
+        None, None, testnet=True, recorder=recorder, contracts={contract.symbol: contract}, connect=False
+    )
+
+    quote = json.dumps(
+        {
+            "table": "quote",
+            "action": "insert",
+            "data": [{"symbol": "XBTUSD", "bidPrice": 30000.0, "askPrice": 30000.5, "timestamp": "2023-11-14"}],
+        }
+    )
+    private = [
+        json.dumps({"success": True, "request": {"op": "authKeyExpires", "args": ["key", 1700000000, "signature"]}}),
+        json.dumps({"table": "margin", "action": "partial", "keys": ["account", "currency"], "data": []}),
+        json.dumps({"table": "order", "action": "partial", "keys": ["orderID"], "data": []}),
+        json.dumps({"table": "execution", "action": "partial", "keys": ["execID"], "data": []}),
+        json.dumps({"table": "position", "action": "partial", "keys": ["account", "symbol", "currency"], "data": []}),
+    ]
+
+    try:
+        for msg in private + [quote]:
+            client._on_message(None, msg)
+    finally:
+        recorder.stop()
+        client.subscriptions.stop()
+        client.ingest.stop()
+
+    assert [f for _, _, f in iter_frames(str(tmp_path))] == [quote]
@@ -0,0 +1,43 @@
+import json
+import logging
+
+from connectors.binance_futures import BinanceFuturesClient
+from helpers.clock import ReplayClock
+from helpers.Exchange import Exchange
+from models.Contract import Contract
+from recording.replay import ReplayEngine
+from strategies.BreakoutStrategy import BreakoutStrategy
+
+CONTRACT = {"symbol": "BTCUSDT", "baseAsset": "BTC", "quoteAsset": "USDT", "pricePrecision": 2, "quantityPrecision": 3}
+START = 1700000000000
+
+
+def _frames(count: int):
+    # Received at the time they were traded, like a recording of a fast feed
+    for i in range(count):
+        timestamp = START + i * 10
+        frame = {"e": "aggTrade", "s": "BTCUSDT", "a": i, "p": str(30000 + i % 200), "q": "0.010", "T": timestamp}
+        yield timestamp, "binance", json.dumps(frame)
+
+
+def test_replay_clock_follows_the_processed_trades(caplog):
+    contract = Contract(CONTRACT, Exchange.binance)
+    clock = ReplayClock()
+    client = BinanceFuturesClient(
+        None, None, testnet=True, contracts={contract.symbol: contract}, connect=False, clock=clock
+    )
+
+    strategy = BreakoutStrategy(client, contract, "Binance", "1m", 10, None, None, {"min_volume": float("inf")})
+    strategy.candles.append(START - START % 60000, 30000, 30000, 30000, 30000, 0)
+    client.add_strategy(0, strategy)
+
+    try:
+        with caplog.at_level(logging.WARNING):
+            report = ReplayEngine({"binance": client}, speed=None, clock=clock).run(_frames(20000))
+    finally:
+        client.subscriptions.stop()
+        client.ingest.stop()
+
+    assert report["errors"] == 0
+    assert report["ingest"]["binance"]["processed"] == 20000
+    assert not [r for r in caplog.records if "milliseconds of difference" in r.getMessage()]
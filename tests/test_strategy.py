@@ -0,0 +1,107 @@
+from helpers.clock import SimulatedClock
+from helpers.Exchange import Exchange
+from models.Contract import Contract
+from models.OrderStatus import OrderStatus
+from strategies.BreakoutStrategy import BreakoutStrategy
+
+CONTRACT = {"symbol": "BTCUSDT", "baseAsset": "BTC", "quoteAsset": "USDT", "pricePrecision": 2, "quantityPrecision": 3}
+
+
+class FakeClient:
+    def __init__(self):
+        self.clock = SimulatedClock(1700000000)
+        self.private_ws_connected = False
+        self.placed = []
+        self.reduce_only = []
+        # Order types the exchange refuses, their levels are then watched locally
+        self.rejected = set()
+        self.canceled = []
+
+    def get_trade_size(self, contract, price, balance_pct):
+        return 0.01
+
+    def place_order(self, contract, order_type, quantity, side, price=None, time_in_force=None, **kwargs):
+        if order_type in self.rejected:
+            return None
+        self.placed.append(order_type)
+        self.reduce_only.append(kwargs.get("reduce_only", False))
+        return OrderStatus({"orderId": len(self.placed), "status": "NEW", "avgPrice": "0"}, Exchange.binance)
+
+    def cancel_order(self, contract, order_id):
+        self.canceled.append(order_id)
+        return OrderStatus({"orderId": order_id, "status": "CANCELED", "avgPrice": "0"}, Exchange.binance)
+
+    def get_order_status(self, contract, order_id):
+        return OrderStatus({"orderId": order_id, "status": "FILLED", "avgPrice": "30000"}, Exchange.binance)
+
+
+def make_strategy(client: FakeClient) -> BreakoutStrategy:
+    strategy = BreakoutStrategy(
+        client, Contract(CONTRACT, Exchange.binance), "Binance", "1m", 10, 1, 1, {"min_volume": 0}
+    )
+    strategy.candles.append(1699999940000, 30000, 30000, 30000, 30000, 1)
+    strategy.candles.append(1700000000000, 30000, 30100, 30000, 30100, 1)
+    return strategy
+
+
+def test_polled_fill_after_stream_update_protects_once():
+    client = FakeClient()
+    strategy = make_strategy(client)
+
+    # The stream is down when the entry is placed, the fill is polled
+    strategy._open_position(1)
+    assert client.placed == ["MARKET"]
+
+    # The stream reconnects and delivers the fill before the poll runs
+    client.private_ws_connected = True
+    strategy.on_order_update(OrderStatus({"orderId": 1, "status": "FILLED", "avgPrice": "30000"}, Exchange.binance))
+    assert client.placed == ["MARKET", "TAKE_PROFIT_MARKET", "STOP_MARKET"]
+
+    client.clock.advance(client.clock.time() + 2)
+    assert client.placed == ["MARKET", "TAKE_PROFIT_MARKET", "STOP_MARKET"]
+    assert len(strategy._triggers) == 0
+
+
+def test_local_exit_next_to_a_resting_protective_order_is_reduce_only():
+    client = FakeClient()
+    client.private_ws_connected = True
+    client.rejected.add("TAKE_PROFIT_MARKET")
+    strategy = make_strategy(client)
+
+    strategy._open_position(1)
+    strategy.on_order_update(OrderStatus({"orderId": 1, "status": "FILLED", "avgPrice": "30000"}, Exchange.binance))
+
+    # The stop loss rests on the exchange, the take profit could not be placed and is watched locally
+    trade = strategy.trades[0]
+    assert list(trade.protective_ids) == ["stop_loss"]
+    assert len(strategy._triggers) == 1
+
+    # Both can fire: the local exit must not open a reverse position once the stop closed the trade
+    strategy.parse_trades(30400, 0.01, 1700000010000)
+    assert client.placed == ["MARKET", "STOP_MARKET", "MARKET"]
+    assert client.reduce_only == [False, True, True]
+    assert client.canceled == [2]
+    assert trade.status == "closed"
+
+
+def test_local_take_profit_and_stop_loss_levels_are_on_the_right_side():
+    for signal, exit_price, exit_kind in ((1, 30300, "Take profit"), (-1, 30300, "Stop loss")):
+        client = FakeClient()
+        client.private_ws_connected = True
+        client.rejected.update(["TAKE_PROFIT_MARKET", "STOP_MARKET"])
+        strategy = make_strategy(client)
+
+        strategy._open_position(signal)
+        strategy.on_order_update(OrderStatus({"orderId": 1, "status": "FILLED", "avgPrice": "30000"}, Exchange.binance))
+        trade = strategy.trades[0]
+        assert len(strategy._triggers) == 2
+
+        # Both levels are 1% away from the entry, the price moving in between doesn't exit
+        for price in (30000, 30100, 29900, 30299, 29701):
+            strategy.parse_trades(price, 0.01, 1700000010000)
+            assert trade.status == "open"
+
+        strategy.parse_trades(exit_price, 0.01, 1700000010000)
+        assert trade.status == "closed"
+        assert client.placed == ["MARKET", "MARKET"]
+        assert strategy.logs[-2]["log"].startswith(exit_kind)
@@ -0,0 +1,162 @@
+import numpy as np
+import pytest
+
+from backtesting.tick import run_tick_backtest, trade_chunks
+from backtesting.vectorized import run_backtest
+from helpers.Exchange import Exchange
+from helpers.Strategies import Strategies
+from models.Candle import Candle
+from models.Contract import Contract
+
+BINANCE_CONTRACT = {
+    "symbol": "BTCUSDT",
+    "baseAsset": "BTC",
+    "quoteAsset": "USDT",
+    "pricePrecision": 2,
+    "quantityPrecision": 3,
+}
+BITMEX_CONTRACT = {
+    "symbol": "XBTUSD",
+    "rootSymbol": "XBT",
+    "quoteCurrency": "USD",
+    "tickSize": 0.5,
+    "lotSize": 100,
+    "multiplier": -100000000,
+    "isQuanto": False,
+    "isInverse": True,
+}
+START = 1700000040000
+
+
+def trades(*rows):
+    # (milliseconds after the start, price, size)
+    rows = np.array(rows, dtype=np.float64)
+    return trade_chunks(START + rows[:, 0].astype(np.int64), rows[:, 1], rows[:, 2])
+
+
+def history(high: float, low: float):
+    # One closed candle before the trades, the breakout level of the first one
+    return [Candle([START - 60000, low, high, low, low, 0], "1m", Exchange.binance)]
+
+
+def aggregate(timestamps, prices, sizes):
+    minutes = timestamps - timestamps % 60000
+    open_times, first = np.unique(minutes, return_index=True)
+    last = np.append(first[1:], len(timestamps)) - 1
+    return {
+        "timestamp": open_times,
+        "open": prices[first],
+        "high": np.maximum.reduceat(prices, first),
+        "low": np.minimum.reduceat(prices, first),
+        "close": prices[last],
+        "volume": np.add.reduceat(sizes, first),
+    }
+
+
+def test_technical_strategy_matches_the_vectorized_backtest():
+    rng = np.random.default_rng(1)
+    count = 18000
+    timestamps = START + np.arange(count, dtype=np.int64) * 10000
+    prices = np.round(30000 * np.exp(np.cumsum(rng.normal(0, 0.0008, count))), 2)
+    sizes = np.full(count, 0.1)
+    params = {"ema_fast": 12, "ema_slow": 26, "ema_signal": 9, "rsi_length": 14}
+
+    tick = run_tick_backtest(
+        Strategies.technical,
+        Contract(BINANCE_CONTRACT, Exchange.binance),
+        "1m",
+        trade_chunks(timestamps, prices, sizes),
+        1.0,
+        1.0,
+        params,
+        warmup_candles=0,
+    )
+    vectorized = run_backtest(Strategies.technical, aggregate(timestamps, prices, sizes), 1.0, 1.0, params)
+
+    assert len(tick.trades) > 3
+    assert len(tick.trades) == len(vectorized.trades)
+    for t, v in zip(tick.trades, vectorized.trades):
+        # Entries at the first trade of the candle after the signal, the open of the vectorized candles
+        assert t["entry_time"] == v["entry_time"]
+        assert t["side"] == v["side"]
+        assert t["entry_price"] == v["entry_price"]
+        assert t["exit_time"] - t["exit_time"] % 60000 == v["exit_time"]
+        assert t["exit_reason"] == v["exit_reason"]
+
+        # The stop orders are filled at the trade that crossed their level, at or past the vectorized price
+        if (t["side"] == "long") == (t["exit_reason"] == "take_profit"):
+            assert t["exit_price"] >= v["exit_price"] - 0.01
+        else:
+            assert t["exit_price"] <= v["exit_price"] + 0.01
+
+
+def test_take_profit_and_stop_loss_exits_follow_the_trades():
+    result = run_tick_backtest(
+        Strategies.breakout,
+        Contract(BINANCE_CONTRACT, Exchange.binance),
+        "1m",
+        trades((0, 99.5, 1), (1000, 100.0, 1), (2000, 100.4, 1), (3000, 101.2, 1), (4000, 100.0, 1), (5000, 100.3, 1)),
+        1.0,
+        1.0,
+        {"min_volume": 0},
+        history=history(99.9, 99.0),
+        warmup_candles=0,
+    )
+
+    # Long on the breakout, take profit at 101.0 crossed by the 101.2 trade, the breakout still holds so the
+    # position is opened again, its stop loss at 100.19 is crossed by the 100.0 trade, and the last one is closed
+    # at the end of the data
+    assert [(t["entry_price"], t["exit_price"], t["exit_reason"]) for t in result.trades] == [
+        (100.0, 101.2, "take_profit"),
+        (101.2, 100.0, "stop_loss"),
+        (100.0, 100.3, "end_of_data"),
+    ]
+    assert [t["exit_time"] for t in result.trades] == [START + 3000, START + 4000, START + 5000]
+    assert result.notes == []
+
+
+def test_orders_in_flight_at_the_end_are_canceled_and_reported():
+    result = run_tick_backtest(
+        Strategies.breakout,
+        Contract(BINANCE_CONTRACT, Exchange.binance),
+        "1m",
+        trades((0, 99.5, 1), (1000, 100.0, 1), (2000, 100.2, 1)),
+        1.0,
+        1.0,
+        {"min_volume": 0},
+        latency=0.5,
+        history=history(99.9, 99.0),
+        warmup_candles=0,
+    )
+
+    # The entry sent on the 100.0 trade reaches the exchange after it and is filled at the next one, whose update
+    # sends the protective orders, still in flight when the data ends
+    assert len(result.trades) == 1
+    assert result.trades[0]["entry_price"] == 100.2
+    assert result.trades[0]["exit_reason"] == "end_of_data"
+    assert len(result.notes) == 1
+    assert "[2, 3]" in result.notes[0]
+
+
+def test_inverse_bitmex_contract_pnl_is_in_xbt():
+    result = run_tick_backtest(
+        Strategies.breakout,
+        Contract(BITMEX_CONTRACT, Exchange.bitmex),
+        "1m",
+        # The take profit is crossed on a new candle without enough volume to break out again
+        trades((0, 30000, 10), (60000, 30300, 1), (61000, 30400, 1)),
+        1.0,
+        None,
+        {"min_volume": 5},
+        initial_balance=1,
+        history=history(29990, 29900),
+        warmup_candles=0,
+    )
+
+    assert len(result.trades) == 1
+    trade = result.trades[0]
+    assert trade["exit_reason"] == "take_profit"
+    assert trade["quantity"] == 30000
+    # One XBT of balance buys 30000 USD contracts, each one worth 1 / price XBT
+    assert trade["pnl"] == pytest.approx(30000 * (1 / 30000 - 1 / 30300))
+    assert result.equity_curve[-1] == pytest.approx(1 + trade["pnl"])
@@ -0,0 +1,66 @@
+from types import SimpleNamespace
+
+from strategies.triggers import ABOVE, BELOW, TriggerIndex
+
+
+def test_levels_are_crossed_from_the_closest():
+    index = TriggerIndex()
+    trades = [SimpleNamespace(name=i) for i in range(5)]
+    index.add(101, ABOVE, trades[0], "take_profit")
+    index.add(105, ABOVE, trades[1], "take_profit")
+    index.add(102, ABOVE, trades[2], "stop_loss")
+    index.add(99, BELOW, trades[3], "stop_loss")
+    index.add(98, BELOW, trades[4], "take_profit")
+    assert len(index) == 5
+
+    assert index.pop_crossed(100) == []
+
+    # At or past the level
+    assert index.pop_crossed(102) == [(trades[0], "take_profit"), (trades[2], "stop_loss")]
+    assert len(index) == 3
+    assert index.pop_crossed(102) == []
+
+    assert index.pop_crossed(97.5) == [(trades[3], "stop_loss"), (trades[4], "take_profit")]
+    assert index.pop_crossed(200) == [(trades[1], "take_profit")]
+    assert len(index) == 0
+
+
+def test_removed_trades_are_not_crossed():
+    index = TriggerIndex()
+    kept = SimpleNamespace()
+    removed = SimpleNamespace()
+    index.add(110, ABOVE, removed, "take_profit")
+    index.add(90, BELOW, removed, "stop_loss")
+    index.add(110, ABOVE, kept, "take_profit")
+    index.add(90, BELOW, kept, "stop_loss")
+
+    index.remove(removed)
+    assert len(index) == 2
+    assert index.pop_crossed(110) == [(kept, "take_profit")]
+
+    # The other level of a crossed trade stays until the trade is removed
+    assert len(index) == 1
+    index.remove(kept)
+    assert len(index) == 0
+    assert index.pop_crossed(90) == []
+
+    # Removing twice, or a trade never added, changes nothing
+    index.remove(kept)
+    index.remove(SimpleNamespace())
+    assert len(index) == 0
+
+
+def test_removed_levels_that_are_never_crossed_are_dropped():
+    index = TriggerIndex()
+    trades = [SimpleNamespace() for _ in range(1000)]
+    for i, trade in enumerate(trades):
+        index.add(1000 + i, ABOVE, trade, "take_profit")
+        index.add(1 + i, BELOW, trade, "stop_loss")
+
+    for trade in trades[1:]:
+        index.remove(trade)
+
+    assert len(index) == 2
+    assert len(index._heaps[ABOVE]) + len(index._heaps[BELOW]) < 200
+    assert index.pop_crossed(1) == [(trades[0], "stop_loss")]
+    assert index.pop_crossed(1000) == [(trades[0], "take_profit")]
@@ -0,0 +1,137 @@
+import numpy as np
+import pytest
+
+from backtesting.vectorized import BacktestResult, _find_exit, run_backtest
+from helpers.Strategies import Strategies
+
+
+def candles(*rows):
+    # (open, high, low, close, volume), one minute apart
+    rows = np.array(rows, dtype=np.float64)
+    return {
+        "timestamp": np.arange(len(rows), dtype=np.int64) * 60000,
+        "open": rows[:, 0],
+        "high": rows[:, 1],
+        "low": rows[:, 2],
+        "close": rows[:, 3],
+        "volume": rows[:, 4],
+    }
+
+
+def test_find_exit_long_and_short():
+    highs = np.array([100, 101, 103, 102], dtype=np.float64)
+    lows = np.array([99, 99.5, 101, 97], dtype=np.float64)
+
+    assert _find_exit(highs, lows, 0, 1, 102, 98) == (2, 102, "take_profit")
+    assert _find_exit(highs, lows, 0, 1, 104, 98) == (3, 98, "stop_loss")
+    assert _find_exit(highs, lows, 0, -1, 98, 102.5) == (2, 102.5, "stop_loss")
+    assert _find_exit(highs, lows, 3, -1, 98, 110) == (3, 98, "take_profit")
+
+    # Searched from the start only
+    assert _find_exit(highs, lows, 3, 1, 102, 96) == (3, 102, "take_profit")
+
+
+def test_find_exit_without_exit():
+    highs = np.full(1000, 101.0)
+    lows = np.full(1000, 99.0)
+
+    exit_index, exit_price, exit_reason = _find_exit(highs, lows, 0, 1, 102, 98)
+    assert exit_index is None
+    assert np.isnan(exit_price)
+    assert exit_reason == "end_of_data"
+
+    # Past the first chunks, the search windows keep growing
+    highs[900] = 105
+    assert _find_exit(highs, lows, 0, 1, 102, 98) == (900, 102, "take_profit")
+
+
+def test_stop_loss_is_assumed_first_within_a_candle():
+    highs = np.array([100, 103], dtype=np.float64)
+    lows = np.array([100, 97], dtype=np.float64)
+
+    assert _find_exit(highs, lows, 0, 1, 102, 98) == (1, 98, "stop_loss")
+    assert _find_exit(highs, lows, 0, -1, 98, 102) == (1, 102, "stop_loss")
+
+
+def test_breakout_entry_is_filled_at_the_broken_level():
+    result = run_backtest(
+        Strategies.breakout,
+        candles(
+            (100, 101, 99, 100, 1),
+            # Crosses 101 and closes at 104, the entry is at 101
+            (100, 104, 100, 104, 1),
+            (105, 106, 104, 105, 1),
+            (105, 105, 98, 101, 1),
+        ),
+        None,
+        2.0,
+        {"min_volume": 0},
+    )
+
+    assert [(t["entry_price"], t["exit_price"], t["exit_reason"]) for t in result.trades] == [(101, 98.98, "stop_loss")]
+
+    # Opens past the previous high, the entry is at the open
+    result = run_backtest(
+        Strategies.breakout,
+        candles((100, 101, 99, 100, 1), (105, 106, 104, 105, 1), (105, 105, 104, 104, 1)),
+        None,
+        None,
+        {"min_volume": 0},
+    )
+    assert result.trades[0]["entry_price"] == 105
+    assert result.trades[0]["exit_reason"] == "end_of_data"
+
+
+def test_equity_curve_marks_the_open_position_to_market():
+    result = run_backtest(
+        Strategies.breakout,
+        candles(
+            (100, 100, 99, 100, 1),
+            (100, 101, 100, 101, 1),
+            (101, 101, 91, 91, 1),
+            (91, 111, 91, 111, 1),
+        ),
+        10.0,
+        None,
+        {"min_volume": 0},
+        initial_balance=100,
+    )
+
+    # Long 1 at 100 until the take profit at 110, 9 below the entry at the close of the third candle
+    assert len(result.trades) == 1
+    assert result.trades[0]["pnl"] == pytest.approx(10)
+    assert result.equity_curve.tolist() == pytest.approx([100, 101, 91, 110])
+    assert result.metrics["max_drawdown_pct"] == pytest.approx((101 - 91) / 101 * 100)
+    assert len(result.notes) > 0
+
+
+def test_metrics():
+    trades = [{"pnl": pnl, "return_pct": pnl} for pnl in (10, -5, 20, -5)]
+    result = BacktestResult(trades, np.array([100, 110, 105, 125, 120], dtype=np.float64), 100)
+
+    returns = np.array([10, -5, 20, -5], dtype=np.float64)
+    assert result.metrics == pytest.approx(
+        {
+            "trades": 4,
+            "total_pnl": 20,
+            "return_pct": 20,
+            "win_rate": 50,
+            "profit_factor": 3,
+            "max_drawdown_pct": 5 / 110 * 100,
+            "sharpe": returns.mean() / returns.std() * 2,
+        }
+    )
+
+
+def test_metrics_without_trades():
+    result = BacktestResult([], np.array([100], dtype=np.float64), 100)
+
+    assert result.metrics == {
+        "trades": 0,
+        "total_pnl": 0.0,
+        "return_pct": 0.0,
+        "win_rate": 0.0,
+        "profit_factor": np.inf,
+        "max_drawdown_pct": 0.0,
+        "sharpe": 0.0,
+    }
@@ -0,0 +1,82 @@
+import json
+import time
+
+import pytest
+
+from connectors.ws_pool import ShardedWebsocket
+from mock_exchange.binance import MockBinanceServer
+
+
+def wait_for(condition, timeout: float = 10):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.02)
+    return True
+
+
+@pytest.fixture
+def server():
+    server = MockBinanceServer(trades_per_second=0).start()
+    yield server
+    server.stop()
+
+
+def test_subscribe_is_all_or_nothing(server):
+    pool = ShardedWebsocket("Test", server.wss_url, lambda ws, msg: None, max_streams=2, max_connections=2)
+    try:
+        assert pool.subscribe(["a@aggTrade", "b@aggTrade", "c@aggTrade"])
+        assert pool.streams == {"a@aggTrade", "b@aggTrade", "c@aggTrade"}
+
+        # Only one slot is left: nothing of the batch is assigned
+        assert not pool.subscribe(["d@aggTrade", "e@aggTrade"])
+        assert pool.streams == {"a@aggTrade", "b@aggTrade", "c@aggTrade"}
+
+        # Streams already subscribed don't take a slot
+        assert pool.subscribe(["a@aggTrade", "d@aggTrade", "d@aggTrade"])
+        assert pool.streams == {"a@aggTrade", "b@aggTrade", "c@aggTrade", "d@aggTrade"}
+    finally:
+        pool.close()
+
+
+def test_moved_stream_loses_and_repeats_no_trade():
+    server = MockBinanceServer(trades_per_second=400).start()
+    trade_ids = []
+
+    def on_message(ws, msg):
+        data = json.loads(msg)
+        if data.get("e") == "aggTrade":
+            trade_ids.append(data["a"])
+
+    pool = ShardedWebsocket(
+        "Test",
+        server.wss_url,
+        on_message,
+        max_streams=2,
+        max_connections=2,
+        messages_per_second=20,
+        rebalance_threshold=1,
+    )
+    try:
+        assert pool.subscribe(["btcusdt@aggTrade", "ethusdt@aggTrade"])
+        assert pool.subscribe(["filler@aggTrade"])
+        assert wait_for(lambda: all(m["connected"] and m["pending"] == 0 for m in pool.metrics))
+        assert wait_for(lambda: len(trade_ids) > 100)
+
+        # The second connection is left empty, one of the live streams is moved to it
+        pool.unsubscribe(["filler@aggTrade"])
+        assert [m["streams"] for m in pool.metrics] == [1, 1]
+        assert len(pool.moving) == 1
+        assert wait_for(lambda: len(pool.moving) == 0)
+        time.sleep(0.5)
+
+        server.market.stop()
+        time.sleep(0.5)
+    finally:
+        pool.close()
+        server.stop()
+
+    # Both symbols share the trade ids of the exchange, every one of them arrived once. The two connections
+    # deliver them in their own order
+    assert sorted(trade_ids) == list(range(min(trade_ids), min(trade_ids) + len(trade_ids)))